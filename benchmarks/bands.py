@@ -0,0 +1,181 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from market_maker_keeper.band import Bands
+from market_maker_keeper.feed import EmptyFeed, FixedFeed
+from market_maker_keeper.limit import History
+from market_maker_keeper.price_feed import Price
+from market_maker_keeper.reloadable_config import ReloadableConfig
+from pymaker.numeric import Wad
+
+
+class BenchmarkOrder:
+    def __init__(self, order_id: int, is_sell: bool, amount: Wad, price: Wad):
+        self.order_id = order_id
+        self.is_sell = is_sell
+        self.amount = amount
+        self.price = price
+
+    @property
+    def sell_to_buy_price(self) -> Wad:
+        return self.price
+
+    @property
+    def buy_to_sell_price(self) -> Wad:
+        return self.price
+
+    @property
+    def remaining_sell_amount(self) -> Wad:
+        return self.amount
+
+
+class BandsBenchmark:
+    """Measures the cost of one keeper tick spent in band arithmetic.
+
+    Each tick runs `cancellable_orders()` and `new_orders()` over a ladder of `--bands` buy and sell
+    bands, with `--orders` of our own orders spread across them, and a target price moving slightly
+    between ticks (so no per-price state survives from one tick to the next). Reported are the CPU
+    time per tick, the number of `Wad` objects created per tick and the peak memory allocated
+    during a tick. To compare two versions of `band.py`, run it against each of them with the same
+    arguments.
+
+    Example:
+
+        python benchmarks/bands.py --bands 20 --orders 200 --ticks 500
+        python benchmarks/bands.py --bands 20 --orders 200 --ticks 500 --vectorized
+    """
+
+    def __init__(self, args: list):
+        parser = argparse.ArgumentParser(prog='bands-benchmark')
+
+        parser.add_argument("--bands", type=int, default=10,
+                            help="Number of buy and sell bands each (default: 10)")
+
+        parser.add_argument("--orders", type=int, default=100,
+                            help="Number of our buy and sell orders each (default: 100)")
+
+        parser.add_argument("--ticks", type=int, default=1000,
+                            help="Number of ticks to measure (default: 1000)")
+
+        parser.add_argument("--vectorized", dest='vectorized', action='store_true',
+                            help="Use the NumPy-vectorized band engine (requires NumPy)")
+
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Seed of the random order generator (default: 0)")
+
+        self.arguments = parser.parse_args(args)
+        self.random = random.Random(self.arguments.seed)
+
+    def _band_config(self) -> dict:
+        def bands(min_amount: float):
+            return [{"minMargin": round(0.01 * index, 2),
+                     "avgMargin": round(0.01 * index + 0.005, 3),
+                     "maxMargin": round(0.01 * index + 0.01, 2),
+                     "minAmount": min_amount,
+                     "avgAmount": min_amount * 2,
+                     "maxAmount": min_amount * 3,
+                     "dustCutoff": 0.0} for index in range(self.arguments.bands)]
+
+        return {"vectorized": self.arguments.vectorized, "buyBands": bands(50.0), "sellBands": bands(0.5)}
+
+    def _orders(self, is_sell: bool, target_price: float, amount: float) -> list:
+        def price(margin: float):
+            return Wad.from_number(round(target_price * (1 + margin if is_sell else 1 - margin), 6))
+
+        max_margin = 0.01 * self.arguments.bands
+        return [BenchmarkOrder(order_id=order_id,
+                               is_sell=is_sell,
+                               amount=Wad.from_number(round(self.random.uniform(0.2, 1.0) * amount, 6)),
+                               price=price(self.random.uniform(0.0, max_margin)))
+                for order_id in range(self.arguments.orders)]
+
+    def _prices(self) -> list:
+        return [Price(buy_price=Wad.from_number(round(100 - 0.01 * (tick % 7), 2)),
+                      sell_price=Wad.from_number(round(101 + 0.01 * (tick % 7), 2)))
+                for tick in range(self.arguments.ticks)]
+
+    @staticmethod
+    def _tick(bands: Bands, buy_orders: list, sell_orders: list, price: Price):
+        bands.cancellable_orders(buy_orders, sell_orders, price)
+        bands.new_orders(buy_orders, sell_orders, Wad.from_number(1000000), Wad.from_number(1000000), price)
+
+    @staticmethod
+    def _count_wads(function) -> int:
+        original_init = Wad.__init__
+        counter = [0]
+
+        def counting_init(self, value):
+            counter[0] += 1
+            original_init(self, value)
+
+        Wad.__init__ = counting_init
+        try:
+            function()
+        finally:
+            Wad.__init__ = original_init
+
+        return counter[0]
+
+    def main(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as config_file:
+            json.dump(self._band_config(), config_file)
+
+        try:
+            bands = Bands.read(ReloadableConfig(config_file.name), EmptyFeed(), FixedFeed({'canBuy': True, 'canSell': True}), History())
+        finally:
+            os.remove(config_file.name)
+
+        buy_orders = self._orders(False, 100, 50.0)
+        sell_orders = self._orders(True, 101, 0.5)
+        prices = self._prices()
+
+        # warm up, then measure the CPU time
+        for price in prices[:10]:
+            self._tick(bands, buy_orders, sell_orders, price)
+
+        started = time.process_time()
+        for price in prices:
+            self._tick(bands, buy_orders, sell_orders, price)
+        cpu_per_tick = (time.process_time() - started) / len(prices)
+
+        # allocations get measured separately, as tracing them slows everything down
+        wads_per_tick = self._count_wads(lambda: self._tick(bands, buy_orders, sell_orders, prices[-1]))
+
+        tracemalloc.start()
+        self._tick(bands, buy_orders, sell_orders, prices[0])
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"engine:        {type(bands).__name__}")
+        print(f"bands:         {self.arguments.bands} buy + {self.arguments.bands} sell")
+        print(f"orders:        {self.arguments.orders} buy + {self.arguments.orders} sell")
+        print(f"cpu per tick:  {cpu_per_tick * 1000:.3f} ms")
+        print(f"wads per tick: {wads_per_tick}")
+        print(f"peak memory:   {peak_memory / 1024:.1f} KiB")
+
+
+if __name__ == '__main__':
+    BandsBenchmark(sys.argv[1:]).main()
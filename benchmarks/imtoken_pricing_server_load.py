@@ -0,0 +1,139 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+class ImtokenPricingServerLoadTest:
+    """Load test of a running `imtoken-pricing-server`.
+
+    Fires `--requests` price requests at the server from `--concurrency` parallel clients (each one
+    with its own keep-alive session), then reports the throughput and the latency distribution.
+    To compare two versions of the server, run it against each of them with the same arguments.
+
+    Example:
+
+        python benchmarks/imtoken_pricing_server_load.py --url http://localhost:8777 --base ETH --quote DAI
+
+    Results of precomputing the quotes (`ImtokenQuoteTable`), single server process, one ETH/DAI
+    market with a `fixed:200` price feed and two bands per side, 5000 requests per run (best of
+    three runs at concurrency 16), Python 3.6, tornado 4.5.3, load generator on the same host:
+
+                                   before                      after
+        /indicativePrice, c=16     294 req/s, p99 139 ms       325 req/s, p99 69 ms
+        /price, c=16               269 req/s, p99 141 ms       364 req/s, p99 62 ms
+        /indicativePrice, c=1      310 req/s, p50 3.20 ms      323 req/s, p50 2.96 ms
+        /price, c=1                278 req/s, p50 3.63 ms      313 req/s, p50 3.08 ms
+
+    Time spent in the server per request (from the tornado access log, c=1) went down from
+    p50 0.93 ms / p99 3.56 ms to p50 0.47 ms / p99 2.69 ms for `/indicativePrice`, and from
+    p50 1.04 ms / p99 3.75 ms to p50 0.55 ms / p99 2.99 ms for `/price`. Throughput is bound by
+    the load generator itself at these rates, the tail latency at concurrency 16 is where the
+    change shows most. The bands config was plain JSON and the jsonnet evaluation was stubbed out,
+    so the `before` numbers understate the per-request cost of reading the bands.
+    """
+
+    def __init__(self, args: list):
+        parser = argparse.ArgumentParser(prog='imtoken-pricing-server-load')
+
+        parser.add_argument("--url", type=str, default='http://localhost:8777',
+                            help="Address of the Imtoken Pricing server (default: 'http://localhost:8777')")
+
+        parser.add_argument("--endpoint", type=str, default='indicativePrice', choices=['indicativePrice', 'price'],
+                            help="Endpoint to load (default: 'indicativePrice')")
+
+        parser.add_argument("--base", type=str, required=True,
+                            help="Base token of the requested pair")
+
+        parser.add_argument("--quote", type=str, required=True,
+                            help="Quote token of the requested pair")
+
+        parser.add_argument("--side", type=str, default='BUY', choices=['BUY', 'SELL'],
+                            help="Side of the requests (default: 'BUY')")
+
+        parser.add_argument("--amount", type=float, default=1.0,
+                            help="Amount of the requests (default: 1.0)")
+
+        parser.add_argument("--requests", type=int, default=10000,
+                            help="Total number of requests to send (default: 10000)")
+
+        parser.add_argument("--concurrency", type=int, default=16,
+                            help="Number of parallel clients (default: 16)")
+
+        parser.add_argument("--warmup", type=int, default=100,
+                            help="Number of requests sent before measuring (default: 100)")
+
+        self.arguments = parser.parse_args(args)
+        self._sessions = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._sessions, 'session'):
+            self._sessions.session = requests.Session()
+
+        return self._sessions.session
+
+    def _request(self, _) -> (float, bool):
+        params = {'base': self.arguments.base,
+                  'quote': self.arguments.quote,
+                  'side': self.arguments.side,
+                  'amount': self.arguments.amount,
+                  'uniqId': str(uuid.uuid4())}
+
+        started = time.perf_counter()
+        try:
+            response = self._session().get(f"{self.arguments.url}/{self.arguments.endpoint}", params=params, timeout=10)
+            ok = response.ok and response.json().get('result', False)
+        except Exception:
+            ok = False
+
+        return time.perf_counter() - started, ok
+
+    @staticmethod
+    def percentile(sorted_values: list, percent: float) -> float:
+        index = min(len(sorted_values) - 1, int(round(percent / 100.0 * (len(sorted_values) - 1))))
+        return sorted_values[index]
+
+    def main(self):
+        with ThreadPoolExecutor(max_workers=self.arguments.concurrency) as executor:
+            list(executor.map(self._request, range(self.arguments.warmup)))
+
+            started = time.perf_counter()
+            results = list(executor.map(self._request, range(self.arguments.requests)))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency * 1000 for latency, _ in results)
+        failures = sum(1 for _, ok in results if not ok)
+
+        print(f"requests:    {len(results)} ({failures} failed)")
+        print(f"concurrency: {self.arguments.concurrency}")
+        print(f"throughput:  {len(results) / elapsed:.1f} req/s")
+        print(f"latency:     p50 {self.percentile(latencies, 50):.2f} ms"
+              f" | p90 {self.percentile(latencies, 90):.2f} ms"
+              f" | p99 {self.percentile(latencies, 99):.2f} ms"
+              f" | p99.9 {self.percentile(latencies, 99.9):.2f} ms"
+              f" | max {latencies[-1]:.2f} ms")
+
+
+if __name__ == '__main__':
+    ImtokenPricingServerLoadTest(sys.argv[1:]).main()
@@ -21,12 +21,17 @@ import sys
 import time
 import requests
 import json
+import uuid
 
 from typing import Tuple, Optional
 
+import tornado.ioloop
 from web3 import Web3, HTTPProvider
 from flask import Flask, jsonify, request
 
+from market_maker_keeper.airswap_server import create_airswap_application
+from market_maker_keeper.background_cache import BackgroundCache
+from market_maker_keeper.balance_ledger import BalanceLedger
 from market_maker_keeper.price_feed import Price
 from market_maker_keeper.feed import Feed
 from market_maker_keeper.limit import SideLimits, History
@@ -116,6 +121,12 @@ class AirswapMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -134,6 +145,30 @@ class AirswapMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
+        parser.add_argument("--async-server", dest='async_server', action='store_true',
+                            help="Serve requests from a single event loop, with bands cached in background")
+
+        parser.add_argument("--cache-refresh-interval", type=float, default=1.0,
+                            help="Frequency of refreshing cached balances and bands (in seconds, default: 1.0)")
+
+        parser.add_argument("--cache-expiry", type=int, default=30,
+                            help="Maximum age of cached balances and bands (in seconds, default: 30)")
+
+        parser.add_argument("--reservation-ttl", type=int, default=300,
+                            help="Time for which balance promised by a signed order stays reserved (in seconds, default: 300)")
+
+        parser.add_argument("--signing-workers", type=int, default=10,
+                            help="Maximum number of orders signed concurrently (default: 10)")
+
         parser.add_argument("--debug", dest='debug', action='store_true',
                             help="Enable debug output")
 
@@ -163,10 +198,30 @@ class AirswapMarketMakerKeeper:
         self.order_history_reporter = create_order_history_reporter(self.arguments)
 
         self.history = History()
+        self.state_cache = None
+        self.balance_ledger = None
 
     def main(self):
         self.startup()
-        app.run(host=self.arguments.orderserver_host, port=self.arguments.orderserver_port)
+
+        self.balance_ledger = BalanceLedger({self.token_buy.address: lambda: self.token_buy.balance_of(self.our_address),
+                                             self.eth_token_sell.address: lambda: self.eth_token_sell.balance_of(self.our_address),
+                                             self.weth_token_sell.address: lambda: self.weth_token_sell.balance_of(self.our_address)},
+                                            refresh_interval=self.arguments.cache_refresh_interval,
+                                            expiry=self.arguments.cache_expiry,
+                                            reservation_ttl=self.arguments.reservation_ttl)
+
+        if self.arguments.async_server:
+            self.state_cache = BackgroundCache({'bands': self.read_bands},
+                                               refresh_interval=self.arguments.cache_refresh_interval,
+                                               expiry=self.arguments.cache_expiry)
+
+            application = create_airswap_application(self, self.arguments.signing_workers)
+            application.listen(port=int(self.arguments.orderserver_port), address=self.arguments.orderserver_host)
+            tornado.ioloop.IOLoop.current().start()
+
+        else:
+            app.run(host=self.arguments.orderserver_host, port=self.arguments.orderserver_port)
 
     def startup(self):
         #approvals are a bit tricky as the call below is made to the airswap API but the actual approval takes place on the blockchain. They only need to be run once so double check on etherscan that this has been executed for all token pairs.
@@ -184,8 +239,35 @@ class AirswapMarketMakerKeeper:
    # not implemented, will be added when cancel order is finished
 
     def our_total_balance(self, token) -> Wad:
+        # balance not promised to takers by orders we have already signed
+        if self.balance_ledger is not None:
+            return self.balance_ledger.available(token.address)
+
         return token.balance_of(self.our_address)
 
+    def _reserve_for_order(self, order: dict) -> Optional[str]:
+        if self.balance_ledger is None:
+            return None
+
+        reservation_id = str(uuid.uuid4())
+        if not self.balance_ledger.reserve(reservation_id, Address(order['maker_token']), Wad(int(order['maker_amount']))):
+            raise CustomException("Not enough balance available to sign the order", self.logger)
+
+        return reservation_id
+
+    def _release_reservation(self, reservation_id: Optional[str]):
+        if self.balance_ledger is not None and reservation_id is not None:
+            self.balance_ledger.release(reservation_id)
+
+    def read_bands(self):
+        return AirswapBands.read(self.bands_config, self.spread_feed, self.control_feed, self.history)
+
+    def our_bands(self):
+        if self.state_cache is not None:
+            return self.state_cache.get('bands')
+
+        return self.read_bands()
+
     def _error_handler(self, err):
         return err.dont_respond()
 
@@ -193,14 +275,19 @@ class AirswapMarketMakerKeeper:
         req = request.get_json()
         logging.info(f"receiving getOrder: {req}")
         order = self._order_handler(req)
+        reservation_id = self._reserve_for_order(order)
 
         # build & sign order with our private key
-        signed_order = self.airswap_api.sign_order(order['maker_address'],
-                                                   order['maker_token'],
-                                                   order['maker_amount'],
-                                                   order['taker_address'],
-                                                   order['taker_token'],
-                                                   order['taker_amount'])
+        try:
+            signed_order = self.airswap_api.sign_order(order['maker_address'],
+                                                       order['maker_token'],
+                                                       order['maker_amount'],
+                                                       order['taker_address'],
+                                                       order['taker_token'],
+                                                       order['taker_amount'])
+        except:
+            self._release_reservation(reservation_id)
+            raise
 
         # send signed order back to the taker
         logging.info(f"Sending signed order: {signed_order}")
@@ -216,7 +303,7 @@ class AirswapMarketMakerKeeper:
         return json.dumps(order)
 
     def _order_handler(self, req):
-        bands = AirswapBands.read(self.bands_config, self.spread_feed, self.control_feed, self.history)
+        bands = self.our_bands()
 
         assert('makerAddress' in req)
         assert('takerAddress' in req)
@@ -0,0 +1,107 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.escape
+import tornado.web
+from tornado import gen
+
+
+class AirswapRequestHandler(tornado.web.RequestHandler):
+
+    def initialize(self, keeper):
+        self.keeper = keeper
+
+    def _order(self) -> dict:
+        req = tornado.escape.json_decode(self.request.body)
+        logging.info(f"receiving {self.request.path}: {req}")
+
+        return self.keeper._order_handler(req)
+
+    def _dont_respond(self, error: Exception):
+        # Airswap team instructed us to return nothing when error occurs
+        logging.info(f"Unable to respond to {self.request.path} ({getattr(error, 'message', None) or repr(error)})")
+
+        self.set_status(400)
+        self.finish()
+
+
+class GetQuoteHandler(AirswapRequestHandler):
+
+    @gen.coroutine
+    def post(self):
+        try:
+            order = self._order()
+        except Exception as e:
+            return self._dont_respond(e)
+
+        # send quote order back to the taker
+        logging.info(f"Sending quote order: {order}")
+        self.write(json.dumps(order))
+
+
+class GetOrderHandler(AirswapRequestHandler):
+
+    def initialize(self, keeper, signing_executor: ThreadPoolExecutor):
+        super().initialize(keeper)
+        self.signing_executor = signing_executor
+
+    @gen.coroutine
+    def post(self):
+        try:
+            order = self._order()
+            reservation_id = self.keeper._reserve_for_order(order)
+        except Exception as e:
+            return self._dont_respond(e)
+
+        # build & sign order with our private key, without blocking other requests while waiting for the API
+        try:
+            signed_order = yield self.signing_executor.submit(self.keeper.airswap_api.sign_order,
+                                                              order['maker_address'],
+                                                              order['maker_token'],
+                                                              order['maker_amount'],
+                                                              order['taker_address'],
+                                                              order['taker_token'],
+                                                              order['taker_amount'])
+        except Exception as e:
+            self.keeper._release_reservation(reservation_id)
+            return self._dont_respond(e)
+
+        # send signed order back to the taker
+        logging.info(f"Sending signed order: {signed_order}")
+        self.write(signed_order)
+
+
+def create_airswap_application(keeper, signing_workers: int) -> tornado.web.Application:
+    """Creates the Tornado application serving `/getOrder` and `/getQuote` on a single event loop.
+
+    Quotes and orders are built from memory by `keeper._order_handler()`, so the only blocking
+    operation left is signing orders through the Airswap API, which runs on `signing_workers`
+    threads so many orders can be signed concurrently.
+    """
+    assert(isinstance(signing_workers, int))
+
+    signing_executor = ThreadPoolExecutor(max_workers=signing_workers)
+
+    return tornado.web.Application([
+        (r"/getOrder", GetOrderHandler, dict(keeper=keeper,
+                                             signing_executor=signing_executor)),
+        (r"/getQuote", GetQuoteHandler, dict(keeper=keeper)),
+    ])
@@ -0,0 +1,81 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+import time
+
+
+class BackgroundCache:
+    """Serves the latest results of a set of (potentially blocking) functions from memory.
+
+    All functions get called periodically in a background thread, so `get()` returns immediately
+    instead of i.e. doing a JSON-RPC call to read a token balance. If the last successful call of
+    a function happened more than `expiry` seconds ago, its value is considered stale and `get()`
+    raises an exception rather than returning it.
+
+    Attributes:
+        functions: Dictionary of functions to cache the results of, keyed by arbitrary keys.
+        refresh_interval: Frequency (in seconds) of how often the functions get called.
+        expiry: Maximum age (in seconds) of the cached values.
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, functions: dict, refresh_interval: float, expiry: int):
+        assert(isinstance(functions, dict))
+        assert(isinstance(refresh_interval, (int, float)))
+        assert(isinstance(expiry, int))
+
+        self.functions = functions
+        self.refresh_interval = refresh_interval
+        self.expiry = expiry
+
+        self._values = {}
+        self._timestamps = {}
+        self._lock = threading.Lock()
+        self._refreshed = threading.Event()
+
+        threading.Thread(target=self._background_run, daemon=True).start()
+
+    def refresh(self):
+        for key, function in self.functions.items():
+            try:
+                value = function()
+
+                with self._lock:
+                    self._values[key] = value
+                    self._timestamps[key] = time.time()
+            except Exception as e:
+                self.logger.warning(f"Failed to refresh cached value of '{key}' ({e})")
+
+        self._refreshed.set()
+
+    def _background_run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.refresh_interval)
+
+    def get(self, key):
+        """Returns the latest value of `key`, waiting for the first refresh to finish if necessary."""
+        self._refreshed.wait()
+
+        with self._lock:
+            if key not in self._values or time.time() - self._timestamps[key] > self.expiry:
+                raise Exception(f"No recent value of '{key}' available")
+
+            return self._values[key]
@@ -0,0 +1,115 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+import logging
+import threading
+import time
+
+from market_maker_keeper.background_cache import BackgroundCache
+from pymaker.numeric import Wad
+
+
+class BalanceLedger:
+    """Keeps track of our token balances minus amounts promised by quotes which are still in flight.
+
+    Balances are read in background (see `BackgroundCache`), so they can be checked from memory on
+    each request. Whenever a firm quote or a signed order gets issued, the amount we would have to
+    pay is reserved under the id of the quote, so concurrent quotes cannot all promise the same
+    balance. Reservations get released either explicitly (i.e. when the quote gets processed or
+    rejected) or when they expire after `reservation_ttl` seconds, like the quotes themselves do.
+
+    Attributes:
+        balance_functions: Dictionary of functions returning our balances, keyed by token.
+        refresh_interval: Frequency (in seconds) of how often balances get refreshed.
+        expiry: Maximum age (in seconds) of balances we are willing to quote against.
+        reservation_ttl: Time (in seconds) after which reservations get released automatically.
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, balance_functions: dict, refresh_interval: float, expiry: int, reservation_ttl: int):
+        assert(isinstance(balance_functions, dict))
+        assert(isinstance(reservation_ttl, int))
+
+        self.reservation_ttl = reservation_ttl
+        self.balances = BackgroundCache(balance_functions, refresh_interval, expiry)
+
+        self._reservations = {}
+        self._expiries = []
+        self._reserved = {}
+        self._lock = threading.Lock()
+
+    def tracks(self, token) -> bool:
+        return token in self.balances.functions
+
+    def _release(self, reservation_id):
+        token, amount, _ = self._reservations.pop(reservation_id)
+        self._reserved[token] = self._reserved[token] - amount
+
+    def _expire_reservations(self):
+        now = time.time()
+        while len(self._expiries) > 0 and self._expiries[0][0] <= now:
+            expires, reservation_id = heapq.heappop(self._expiries)
+
+            # the reservation may have been released or renewed in the meantime
+            if reservation_id in self._reservations and self._reservations[reservation_id][2] == expires:
+                self._release(reservation_id)
+
+    def _available(self, token) -> Wad:
+        self._expire_reservations()
+
+        available = self.balances.get(token) - self._reserved.get(token, Wad(0))
+        return Wad.max(available, Wad(0))
+
+    def available(self, token) -> Wad:
+        """Returns our balance of `token` not reserved by any quote in flight."""
+        with self._lock:
+            return self._available(token)
+
+    def reserve(self, reservation_id, token, amount: Wad) -> bool:
+        """Reserves `amount` of `token` under `reservation_id`, if enough of it is available.
+
+        Returns `True` if the reservation has been made, `False` if there is not enough balance
+        available or our balance is not known at the moment.
+        """
+        assert(isinstance(amount, Wad))
+
+        with self._lock:
+            try:
+                if self._available(token) < amount:
+                    return False
+
+            except Exception as e:
+                self.logger.warning(f"Unable to check available balance of {token} ({e})")
+                return False
+
+            if reservation_id in self._reservations:
+                self._release(reservation_id)
+
+            expires = time.time() + self.reservation_ttl
+            self._reservations[reservation_id] = (token, amount, expires)
+            self._reserved[token] = self._reserved.get(token, Wad(0)) + amount
+            heapq.heappush(self._expiries, (expires, reservation_id))
+
+            return True
+
+    def release(self, reservation_id):
+        """Releases the reservation made under `reservation_id`, if it still exists."""
+        with self._lock:
+            if reservation_id in self._reservations:
+                self._release(reservation_id)
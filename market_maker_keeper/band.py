@@ -17,13 +17,16 @@
 
 import itertools
 import logging
-import operator
-from functools import reduce
 from pprint import pformat
 from typing import Tuple, Optional
 
 import time
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from market_maker_keeper.feed import Feed
 from market_maker_keeper.limit import SideLimits, History
 from market_maker_keeper.price_feed import Price
@@ -69,12 +72,43 @@ class Band:
         assert(self.avg_margin <= self.max_margin)
         assert(self.min_margin < self.max_margin)
 
+        # `Wad` multipliers of our margins get converted once, as `Wad.from_number()` is expensive,
+        # and the band boundaries get calculated only once for each target price
+        self._margin_multipliers = {margin: self._margin_multiplier(margin) for margin in [min_margin, avg_margin, max_margin]}
+        self._boundaries = None
+
+    @staticmethod
+    def _margin_multiplier(margin: float) -> Wad:
+        raise NotImplemented()
+
+    def _apply_margin(self, price: Wad, margin: float) -> Wad:
+        multiplier = self._margin_multipliers.get(margin)
+        if multiplier is None:
+            multiplier = self._margin_multiplier(margin)
+
+        return price * multiplier
+
+    def _price_boundaries(self, target_price: Wad) -> Tuple[int, int]:
+        """Returns raw values of prices with `min_margin` and `max_margin` applied to `target_price`."""
+        boundaries = self._boundaries
+        if boundaries is None or boundaries[0] != target_price.value:
+            boundaries = (target_price.value,
+                          self._apply_margin(target_price, self.min_margin).value,
+                          self._apply_margin(target_price, self.max_margin).value)
+            self._boundaries = boundaries
+
+        return boundaries[1], boundaries[2]
+
     def order_price(self, order) -> Wad:
         raise NotImplemented()
 
     def includes(self, order, target_price: Wad) -> bool:
         raise NotImplemented()
 
+    def interval(self, target_price: Wad) -> Tuple[int, int]:
+        """Returns raw values of prices `(low, high)` such that an order is in the band if `low < price <= high`."""
+        raise NotImplemented()
+
     def type(self) -> str:
         raise NotImplemented()
 
@@ -85,28 +119,34 @@ class Band:
         orders_in_band = [order for order in orders if self.includes(order, target_price)]
         orders_total = Bands.total_amount(orders_in_band)
 
+        if orders_total <= self.max_amount:
+            return set()
+
         # The sorting in which we remove orders depends on which band we are in.
         # * In the first band we start cancelling with orders closest to the target price.
         # * In the last band we start cancelling with orders furthest from the target price.
         # * In remaining cases we remove orders starting from the smallest one.
         if is_first_band:
-            sorting = lambda order: abs(self.order_price(order) - target_price)
+            sorting = lambda order: abs(self.order_price(order).value - target_price.value)
             reverse = True
 
         elif is_last_band:
-            sorting = lambda order: abs(self.order_price(order) - target_price)
+            sorting = lambda order: abs(self.order_price(order).value - target_price.value)
             reverse = False
 
         else:
-            sorting = lambda order: order.remaining_sell_amount
+            sorting = lambda order: order.remaining_sell_amount.value
             reverse = True
 
-        # Keep removing orders until their total amount stops being greater than `maxAmount`.
-        orders_to_leave = sorted(orders_in_band, key=sorting, reverse=reverse)
-        while Bands.total_amount(orders_to_leave) > self.max_amount:
-            orders_to_leave.pop()
+        # Keep removing orders from the end until their total amount stops being greater than `maxAmount`.
+        sorted_orders = sorted(orders_in_band, key=sorting, reverse=reverse)
+        total_to_leave = orders_total.value
+        leave_count = len(sorted_orders)
+        while total_to_leave > self.max_amount.value:
+            leave_count -= 1
+            total_to_leave -= sorted_orders[leave_count].remaining_sell_amount.value
 
-        result = set(orders_in_band) - set(orders_to_leave)
+        result = set(sorted_orders[leave_count:]).difference(sorted_orders[:leave_count])
 
         if len(result) > 0:
             logger = logging.getLogger()
@@ -132,11 +172,14 @@ class BuyBand(Band):
         return order.sell_to_buy_price
 
     def includes(self, order, target_price: Wad) -> bool:
-        price = self.order_price(order)
-        price_min = self._apply_margin(target_price, self.min_margin)
-        price_max = self._apply_margin(target_price, self.max_margin)
+        price = self.order_price(order).value
+        price_min, price_max = self._price_boundaries(target_price)
         return (price > price_max) and (price <= price_min)
 
+    def interval(self, target_price: Wad) -> Tuple[int, int]:
+        price_min, price_max = self._price_boundaries(target_price)
+        return price_max, price_min
+
     def type(self) -> str:
         return "buy"
 
@@ -144,8 +187,8 @@ class BuyBand(Band):
         return self._apply_margin(target_price, self.avg_margin)
 
     @staticmethod
-    def _apply_margin(price: Wad, margin: float) -> Wad:
-        return price * Wad.from_number(1 - margin)
+    def _margin_multiplier(margin: float) -> Wad:
+        return Wad.from_number(1 - margin)
 
 
 class SellBand(Band):
@@ -163,11 +206,13 @@ class SellBand(Band):
         return order.buy_to_sell_price
 
     def includes(self, order, target_price: Wad) -> bool:
-        price = self.order_price(order)
-        price_min = self._apply_margin(target_price, self.min_margin)
-        price_max = self._apply_margin(target_price, self.max_margin)
+        price = self.order_price(order).value
+        price_min, price_max = self._price_boundaries(target_price)
         return (price > price_min) and (price <= price_max)
 
+    def interval(self, target_price: Wad) -> Tuple[int, int]:
+        return self._price_boundaries(target_price)
+
     def type(self) -> str:
         return "sell"
 
@@ -175,8 +220,8 @@ class SellBand(Band):
         return self._apply_margin(target_price, self.avg_margin)
 
     @staticmethod
-    def _apply_margin(price: Wad, margin: float) -> Wad:
-        return price * Wad.from_number(1 + margin)
+    def _margin_multiplier(margin: float) -> Wad:
+        return Wad.from_number(1 + margin)
 
 
 class NewOrder:
@@ -214,6 +259,8 @@ class Bands:
         assert(isinstance(control_feed, Feed))
         assert(isinstance(history, History))
 
+        bands_class = Bands
+
         try:
             config = reloadable_config.get_config(spread_feed.get()[0])
             control_feed_value = control_feed.get()[0]
@@ -223,6 +270,12 @@ class Bands:
             sell_bands = list(map(SellBand, config['sellBands']))
             sell_limits = SideLimits(config['sellLimits'] if 'sellLimits' in config else [], history.sell_history)
 
+            if config.get('vectorized', False):
+                if numpy is not None:
+                    bands_class = VectorizedBands
+                else:
+                    logging.getLogger().warning("Vectorized bands require NumPy, which is not installed. Using the default ones.")
+
             if 'canBuy' not in control_feed_value or 'canSell' not in control_feed_value:
                 logging.getLogger().warning("Control feed expired. Assuming no buy bands and no sell bands.")
 
@@ -246,7 +299,7 @@ class Bands:
             sell_bands = []
             sell_limits = SideLimits([], history.buy_history)
 
-        return Bands(buy_bands=buy_bands, buy_limits=buy_limits, sell_bands=sell_bands, sell_limits=sell_limits)
+        return bands_class(buy_bands=buy_bands, buy_limits=buy_limits, sell_bands=sell_bands, sell_limits=sell_limits)
 
     def __init__(self, buy_bands: list, buy_limits: SideLimits, sell_bands: list, sell_limits: SideLimits):
         assert(isinstance(buy_bands, list))
@@ -265,26 +318,14 @@ class Bands:
             self.buy_bands = []
             self.sell_bands = []
 
-    def _excessive_sell_orders(self, our_sell_orders: list, target_price: Wad):
-        """Return sell orders which need to be cancelled to bring total amounts within all sell bands below maximums."""
-        assert(isinstance(our_sell_orders, list))
-        assert(isinstance(target_price, Wad))
-
-        bands = self.sell_bands
-
-        for band in bands:
-            for order in band.excessive_orders(our_sell_orders, target_price, band == bands[0], band == bands[-1]):
-                yield order
-
-    def _excessive_buy_orders(self, our_buy_orders: list, target_price: Wad):
-        """Return buy orders which need to be cancelled to bring total amounts within all buy bands below maximums."""
-        assert(isinstance(our_buy_orders, list))
+    def _excessive_orders(self, orders: list, bands: list, target_price: Wad):
+        """Return buy or sell orders which need to be cancelled to bring total amounts within all bands below maximums."""
+        assert(isinstance(orders, list))
+        assert(isinstance(bands, list))
         assert(isinstance(target_price, Wad))
 
-        bands = self.buy_bands
-
         for band in bands:
-            for order in band.excessive_orders(our_buy_orders, target_price, band == bands[0], band == bands[-1]):
+            for order in band.excessive_orders(orders, target_price, band == bands[0], band == bands[-1]):
                 yield order
 
     def _outside_any_band_orders(self, orders: list, bands: list, target_price: Wad):
@@ -299,6 +340,15 @@ class Bands:
 
                 yield order
 
+    def _cancellable_side_orders(self, orders: list, bands: list, target_price: Wad) -> list:
+        """Return buy or sell orders which need to be cancelled, either being excessive or not falling into any band."""
+        return list(itertools.chain(self._excessive_orders(orders, bands, target_price),
+                                    self._outside_any_band_orders(orders, bands, target_price)))
+
+    def _band_totals(self, orders: list, bands: list, target_price: Wad) -> list:
+        """Return total amounts of buy or sell orders in each of the `bands`."""
+        return [self.total_amount([order for order in orders if band.includes(order, target_price)]) for band in bands]
+
     def cancellable_orders(self, our_buy_orders: list, our_sell_orders: list, target_price: Price) -> list:
         assert(isinstance(our_buy_orders, list))
         assert(isinstance(our_sell_orders, list))
@@ -309,16 +359,14 @@ class Bands:
             buy_orders_to_cancel = our_buy_orders
 
         else:
-            buy_orders_to_cancel = list(itertools.chain(self._excessive_buy_orders(our_buy_orders, target_price.buy_price),
-                                                        self._outside_any_band_orders(our_buy_orders, self.buy_bands, target_price.buy_price)))
+            buy_orders_to_cancel = self._cancellable_side_orders(our_buy_orders, self.buy_bands, target_price.buy_price)
 
         if target_price.sell_price is None:
             self.logger.warning("Cancelling all sell orders as no sell price is available.")
             sell_orders_to_cancel = our_sell_orders
 
         else:
-            sell_orders_to_cancel = list(itertools.chain(self._excessive_sell_orders(our_sell_orders, target_price.sell_price),
-                                                         self._outside_any_band_orders(our_sell_orders, self.sell_bands, target_price.sell_price)))
+            sell_orders_to_cancel = self._cancellable_side_orders(our_sell_orders, self.sell_bands, target_price.sell_price)
 
         return buy_orders_to_cancel + sell_orders_to_cancel
 
@@ -343,6 +391,42 @@ class Bands:
         else:
             return [], Wad(0), Wad(0)
 
+    def cancel_and_top_up_orders(self, our_buy_orders: list, our_sell_orders: list, our_buy_balance: Wad, our_sell_balance: Wad, target_price: Price) -> Tuple[list, list, Wad, Wad]:
+        """Plans cancellations and top-ups of the bands for the current price in one go.
+
+        This is not a full target ladder. Orders to cancel are the same as returned by
+        `cancellable_orders()` and new orders are the same as returned by `new_orders()`, which
+        only tops up bands whose total amount is below `minAmount` (up to `avgAmount`). Bands with
+        amounts between `minAmount` and `maxAmount` are left as they are. The only difference to
+        calling both separately is that new orders get calculated as if the cancelled orders were
+        already gone, so bands emptied by the cancellation get refilled straight away instead of
+        one tick later. Both lists are meant to be submitted together, using
+        `OrderBookManager.replace_orders()`.
+
+        The balances are used as passed, so funds locked in orders being cancelled do not get
+        reused until they really get released and show up in the balances.
+
+        Returns:
+            A tuple of orders to cancel, new orders to place, missing buy amount and missing sell amount.
+        """
+        assert(isinstance(our_buy_orders, list))
+        assert(isinstance(our_sell_orders, list))
+        assert(isinstance(our_buy_balance, Wad))
+        assert(isinstance(our_sell_balance, Wad))
+        assert(isinstance(target_price, Price))
+
+        orders_to_cancel = self.cancellable_orders(our_buy_orders, our_sell_orders, target_price)
+        cancelled = set(map(id, orders_to_cancel))
+
+        new_orders, missing_buy_amount, missing_sell_amount = \
+            self.new_orders(our_buy_orders=[order for order in our_buy_orders if id(order) not in cancelled],
+                            our_sell_orders=[order for order in our_sell_orders if id(order) not in cancelled],
+                            our_buy_balance=our_buy_balance,
+                            our_sell_balance=our_sell_balance,
+                            target_price=target_price)
+
+        return orders_to_cancel, new_orders, missing_buy_amount, missing_sell_amount
+
     def _new_sell_orders(self, our_sell_orders: list, our_sell_balance: Wad, target_price: Wad):
         """Return sell orders which need to be placed to bring total amounts within all sell bands above minimums."""
         assert(isinstance(our_sell_orders, list))
@@ -353,9 +437,7 @@ class Bands:
         limit_amount = self.sell_limits.available_limit(time.time())
         missing_amount = Wad(0)
 
-        for band in self.sell_bands:
-            orders = [order for order in our_sell_orders if band.includes(order, target_price)]
-            total_amount = self.total_amount(orders)
+        for band, total_amount in zip(self.sell_bands, self._band_totals(our_sell_orders, self.sell_bands, target_price)):
             if total_amount < band.min_amount:
                 price = band.avg_price(target_price)
                 pay_amount = Wad.min(band.avg_amount - total_amount, our_sell_balance, limit_amount)
@@ -389,9 +471,7 @@ class Bands:
         limit_amount = self.buy_limits.available_limit(time.time())
         missing_amount = Wad(0)
 
-        for band in self.buy_bands:
-            orders = [order for order in our_buy_orders if band.includes(order, target_price)]
-            total_amount = self.total_amount(orders)
+        for band, total_amount in zip(self.buy_bands, self._band_totals(our_buy_orders, self.buy_bands, target_price)):
             if total_amount < band.min_amount:
                 price = band.avg_price(target_price)
                 pay_amount = Wad.min(band.avg_amount - total_amount, our_buy_balance, limit_amount)
@@ -417,7 +497,7 @@ class Bands:
 
     @staticmethod
     def total_amount(orders):
-        return reduce(operator.add, map(lambda order: order.remaining_sell_amount, orders), Wad(0))
+        return Wad(sum(order.remaining_sell_amount.value for order in orders))
 
     @staticmethod
     def _bands_overlap(bands: list):
@@ -429,3 +509,111 @@ class Bands:
                 return True
 
         return False
+
+
+class VectorizedBands(Bands):
+    """`Bands` evaluated with NumPy, for ladders with many bands and many orders.
+
+    Behaves exactly like `Bands`, which stays the reference implementation. The difference is only in
+    how orders get assigned to bands: prices and amounts of our orders on each side get converted to
+    arrays once, each order is assigned to its band with one `searchsorted()` over the sorted band
+    boundaries (bands never overlap, so they form a sorted list of intervals) and per-band totals
+    are calculated with `bincount()`, instead of testing each order against each band.
+
+    Prices and amounts are raw `Wad` values, which do not fit into 64 bits, so prices are kept in
+    arrays of Python integers. Amounts get split into 26-bit limbs, each of them summed with
+    `bincount()` as floating point numbers, which stays exact for up to 2^27 orders. So totals
+    come out identical to the ones calculated with `Wad` arithmetic.
+
+    Enabled with `"vectorized": true` in the bands configuration file. Requires NumPy to be installed.
+    """
+
+    LIMB_BITS = 26
+
+    def __init__(self, buy_bands: list, buy_limits: SideLimits, sell_bands: list, sell_limits: SideLimits):
+        assert(numpy is not None)
+
+        super().__init__(buy_bands=buy_bands, buy_limits=buy_limits, sell_bands=sell_bands, sell_limits=sell_limits)
+
+    def _assign(self, orders: list, bands: list, target_price: Wad):
+        """Returns an array with the index of the band each order belongs to (-1 if none) and per-band totals.
+
+        Returns `None` if band intervals overlap, in which case orders can not be assigned with `searchsorted()`.
+        """
+        if len(orders) == 0 or len(bands) == 0:
+            return numpy.full(len(orders), -1, dtype=numpy.int64), [0] * len(bands)
+
+        # band intervals sorted by price, boundaries of adjacent bands can be equal
+        intervals = sorted((band.interval(target_price), index) for index, band in enumerate(bands))
+        boundaries = [value for (low, high), _ in intervals for value in (low, high)]
+        if any(boundary1 > boundary2 for boundary1, boundary2 in zip(boundaries, boundaries[1:])):
+            return None
+
+        edges = numpy.array(boundaries, dtype=object)
+        band_indices = numpy.array([index for _, index in intervals] + [-1], dtype=numpy.int64)
+
+        # order price `p` is in the n-th interval `(low, high]` if exactly 2n+1 boundaries are lower than `p`
+        prices = numpy.array([bands[0].order_price(order).value for order in orders], dtype=object)
+        positions = numpy.searchsorted(edges, prices, side='left').astype(numpy.int64)
+        assigned = numpy.where(positions % 2 == 1, band_indices[positions // 2], -1)
+
+        amounts = numpy.array([order.remaining_sell_amount.value for order in orders], dtype=object)
+        in_band = assigned >= 0
+        totals = self._limb_totals(assigned[in_band], amounts[in_band], len(bands))
+
+        return assigned, totals
+
+    def _limb_totals(self, indices, amounts, count: int) -> list:
+        totals = [0] * count
+        if len(amounts) == 0:
+            return totals
+
+        if min(amounts) < 0:
+            for index, amount in zip(indices, amounts):
+                totals[index] += amount
+
+            return totals
+
+        mask = (1 << self.LIMB_BITS) - 1
+        bits = int(max(amounts)).bit_length()
+        for shift in range(0, bits, self.LIMB_BITS):
+            limbs = ((amounts >> shift) & mask).astype(numpy.float64)
+            sums = numpy.bincount(indices, weights=limbs, minlength=count)
+            for index in range(count):
+                totals[index] += int(sums[index]) << shift
+
+        return totals
+
+    def _cancellable_side_orders(self, orders: list, bands: list, target_price: Wad) -> list:
+        assert(isinstance(orders, list))
+        assert(isinstance(bands, list))
+        assert(isinstance(target_price, Wad))
+
+        assignment = self._assign(orders, bands, target_price)
+        if assignment is None:
+            return super()._cancellable_side_orders(orders, bands, target_price)
+
+        assigned, totals = assignment
+        result = []
+
+        # only bands above their maximum can have excessive orders, so only these get looked at
+        for index, band in enumerate(bands):
+            if totals[index] > band.max_amount.value:
+                orders_in_band = [orders[position] for position in numpy.flatnonzero(assigned == index)]
+                result.extend(band.excessive_orders(orders_in_band, target_price, index == 0, index == len(bands) - 1))
+
+        for position in numpy.flatnonzero(assigned < 0):
+            order = orders[position]
+            self.logger.info(f"Order #{order.order_id} doesn't belong to any band, scheduling it for cancellation")
+
+            result.append(order)
+
+        return result
+
+    def _band_totals(self, orders: list, bands: list, target_price: Wad) -> list:
+        assignment = self._assign(orders, bands, target_price)
+        if assignment is None:
+            return super()._band_totals(orders, bands, target_price)
+
+        _, totals = assignment
+        return [Wad(total) for total in totals]
@@ -0,0 +1,59 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BatchExecutor:
+    """Runs one step of processing (i.e. signing or submission) for a whole batch of orders concurrently.
+
+    Used by keepers placing orders in batches (see `OrderBookManager.place_orders_in_batches_with()`),
+    so each step takes about one round-trip time regardless of the number of orders in the batch.
+    Failures are isolated: if the function fails for one item, the result for this item is `None`
+    and the remaining items are not affected. `None` items are passed through without calling the
+    function, so results of one step can be fed directly into the next one.
+
+    Attributes:
+        max_workers: Maximum number of items processed at the same time.
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, max_workers: int = 20):
+        assert(isinstance(max_workers, int))
+
+        self.max_workers = max_workers
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def map(self, function, items: list) -> list:
+        """Calls `function` for each of `items` concurrently, returning results in the same order."""
+        assert(callable(function))
+        assert(isinstance(items, list))
+
+        def safe_function(item):
+            if item is None:
+                return None
+
+            try:
+                return function(item)
+            except Exception as exception:
+                self.logger.exception(exception)
+                return None
+
+        return list(self._executor.map(safe_function, items))
@@ -66,6 +66,12 @@ class BitinkaMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -84,6 +90,15 @@ class BitinkaMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--refresh-frequency", type=int, default=3,
                             help="Order book refresh frequency (in seconds, default: 3)")
 
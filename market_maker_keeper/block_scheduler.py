@@ -0,0 +1,90 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+
+
+class BlockScheduler:
+    """Runs a keeper callback once per new block, passing the block header to it.
+
+    Meant to be registered with `Lifecycle.on_block()`. `Lifecycle` fetches the header of each new
+    block before it runs the callback, but does not pass it on. `BlockScheduler` adds a middleware to
+    `web3` which remembers the newest block header fetched through it, so the callback gets the header
+    `Lifecycle` has just fetched, without asking the node again. The callback can use it for all block
+    number (and timestamp) reads it does within that tick. The latest block header gets fetched
+    only if none has been seen yet.
+
+    `Lifecycle` never runs the callback concurrently and skips blocks which arrive while it is still
+    running, so there is nothing to catch up with here. A block is never processed twice though,
+    and blocks older than the last processed one are ignored.
+
+    Attributes:
+        web3: An instance of `Web3`.
+        callback: Function to be called with the block header (an `AttributeDict`) as the only argument.
+    """
+
+    logger = logging.getLogger()
+
+    BLOCK_METHODS = ['eth_getBlockByHash', 'eth_getBlockByNumber']
+
+    def __init__(self, web3, callback):
+        assert(callable(callback))
+
+        self.web3 = web3
+        self.callback = callback
+
+        self._lock = threading.Lock()
+        self._latest_block = None
+        self._last_block_number = None
+
+        self.web3.middleware_stack.add(self._block_middleware)
+
+    def _block_middleware(self, make_request, web3):
+        def middleware(method, params):
+            response = make_request(method, params)
+
+            if method in self.BLOCK_METHODS and response.get('result') is not None:
+                self._remember(response['result'])
+
+            return response
+
+        return middleware
+
+    def _remember(self, block):
+        # pending blocks have no hash yet, we are only interested in mined ones
+        if block.get('hash') is None or block.get('number') is None:
+            return
+
+        with self._lock:
+            if self._latest_block is None or block['number'] > self._latest_block['number']:
+                self._latest_block = block
+
+    def on_block(self):
+        with self._lock:
+            block = self._latest_block
+
+        if block is None:
+            block = self.web3.eth.getBlock('latest')
+
+        block_number = block['number']
+        if self._last_block_number is not None and block_number <= self._last_block_number:
+            self.logger.debug(f"Block #{block_number} is not newer than the last processed one, ignoring it")
+            return
+
+        self._last_block_number = block_number
+        self.callback(block)
@@ -0,0 +1,136 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import operator
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import reduce
+from typing import Optional
+
+from pymaker.numeric import Wad
+
+
+class CrossPairOrderCache:
+    """Keeps track of amounts locked in our open orders on other pairs of the same exchange.
+
+    Keepers operating on exchanges which do not lower balances when orders get placed have to take
+    orders on all other pairs sharing a token into account when calculating the available balance.
+    Instead of fetching these orders for every pair on each keeper tick, this cache refreshes them
+    in background, fetching all pairs concurrently. Totals get updated incrementally, each time orders
+    for one pair arrive, so reading them is instant.
+
+    For each pair whose name contains `buy_token`, amounts of its buy orders are added to the locked
+    buy amount. For each pair whose name contains `sell_token`, amounts of its sell orders are added
+    to the locked sell amount. If fetching orders for a pair fails, last known orders are used.
+
+    Attributes:
+        get_orders_function: Function returning our open orders for a pair passed as its only argument.
+        pairs: Names of the pairs to track, should not include the pair the keeper operates on.
+        buy_token: Name of the token bought by the keeper.
+        sell_token: Name of the token sold by the keeper.
+        refresh_frequency: Frequency (in seconds) of refreshing the orders.
+        max_workers: Maximum number of pairs fetched at the same time.
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, get_orders_function, pairs: list, buy_token: str, sell_token: str, refresh_frequency: int, max_workers: int = 10):
+        assert(callable(get_orders_function))
+        assert(isinstance(pairs, list))
+        assert(isinstance(buy_token, str))
+        assert(isinstance(sell_token, str))
+        assert(isinstance(refresh_frequency, int))
+        assert(isinstance(max_workers, int))
+
+        self.get_orders_function = get_orders_function
+        self.pairs = pairs
+        self.buy_token = buy_token
+        self.sell_token = sell_token
+        self.refresh_frequency = refresh_frequency
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._available = threading.Event()
+        self._pair_totals = {}
+        self._locked_buy_amount = Wad(0)
+        self._locked_sell_amount = Wad(0)
+
+        if len(pairs) == 0:
+            self._available.set()
+
+        threading.Thread(target=self._background_run, daemon=True).start()
+
+    @staticmethod
+    def _total_amount(orders: list) -> Wad:
+        return reduce(operator.add, map(lambda order: order.remaining_sell_amount, orders), Wad(0))
+
+    def locked_amounts(self, timeout: float = 10) -> Optional[tuple]:
+        """Returns amounts locked in our orders on other pairs, as a `(buy_amount, sell_amount)` tuple.
+
+        Waits up to `timeout` seconds for all pairs to be fetched at least once. If some of them still
+        have not been fetched by then, returns `None`, as the locked amounts are not known yet.
+        """
+        assert(isinstance(timeout, (int, float)))
+
+        if not self._available.wait(timeout=timeout):
+            with self._lock:
+                missing_pairs = [pair for pair in self.pairs if pair not in self._pair_totals]
+
+            self.logger.warning(f"Orders on other pairs are still not available after {timeout} seconds"
+                                f" (missing: {', '.join(missing_pairs)})")
+            return None
+
+        with self._lock:
+            return self._locked_buy_amount, self._locked_sell_amount
+
+    def _update_pair(self, pair: str, orders: list):
+        buy_total = self._total_amount(list(filter(lambda order: not order.is_sell, orders))) \
+            if self.buy_token in pair.lower() else Wad(0)
+        sell_total = self._total_amount(list(filter(lambda order: order.is_sell, orders))) \
+            if self.sell_token in pair.lower() else Wad(0)
+
+        with self._lock:
+            old_buy_total, old_sell_total = self._pair_totals.get(pair, (Wad(0), Wad(0)))
+
+            self._pair_totals[pair] = (buy_total, sell_total)
+            self._locked_buy_amount = self._locked_buy_amount - old_buy_total + buy_total
+            self._locked_sell_amount = self._locked_sell_amount - old_sell_total + sell_total
+
+            if len(self._pair_totals) == len(self.pairs):
+                self._available.set()
+
+    def _refresh(self):
+        futures = {self._executor.submit(self.get_orders_function, pair): pair for pair in self.pairs}
+
+        for future in as_completed(futures):
+            pair = futures[future]
+
+            try:
+                self._update_pair(pair, future.result())
+            except Exception as e:
+                self.logger.info(f"Failed to fetch orders for {pair} ({e})")
+
+    def _background_run(self):
+        while True:
+            try:
+                self._refresh()
+            except Exception as e:
+                self.logger.info(f"Failed to refresh orders on other pairs ({e})")
+
+            time.sleep(self.refresh_frequency)
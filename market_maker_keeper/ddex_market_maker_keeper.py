@@ -31,13 +31,13 @@ from market_maker_keeper.order_history_reporter import create_order_history_repo
 from market_maker_keeper.price_feed import PriceFeedFactory
 from market_maker_keeper.reloadable_config import ReloadableConfig
 from market_maker_keeper.spread_feed import create_spread_feed
+from market_maker_keeper.state_reader import StateReader, StateCall
 from market_maker_keeper.util import setup_logging
 from pyexchange.ddex import DdexApi, Order
 from pymaker import Address
 from pymaker.approval import directly
 from pymaker.keys import register_keys
 from pymaker.lifecycle import Lifecycle
-from pymaker.numeric import Wad
 from pymaker.token import ERC20Token
 from pymaker.util import eth_balance
 from pymaker.zrx import ZrxExchange
@@ -78,6 +78,9 @@ class DdexMarketMakerKeeper:
         parser.add_argument("--pair", type=str, required=True,
                             help="Token pair (sell/buy) on which the keeper will operate")
 
+        parser.add_argument("--multicall-address", type=str, required=False,
+                            help="Ethereum address of the Multicall contract, used to batch on-chain state reads")
+
         parser.add_argument("--buy-token-address", type=str, required=True,
                             help="Ethereum address of the buy token")
 
@@ -93,6 +96,12 @@ class DdexMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -111,6 +120,15 @@ class DdexMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--gas-price", type=int, default=0,
                             help="Gas price (in Wei)")
 
@@ -141,6 +159,9 @@ class DdexMarketMakerKeeper:
 
         self.token_buy = ERC20Token(web3=self.web3, address=Address(self.arguments.buy_token_address))
         self.token_sell = ERC20Token(web3=self.web3, address=Address(self.arguments.sell_token_address))
+        self.state_reader = StateReader(web3=self.web3,
+                                        multicall_address=Address(self.arguments.multicall_address)
+                                            if self.arguments.multicall_address else None)
         self.bands_config = ReloadableConfig(self.arguments.config)
         self.price_max_decimals = None
         self.amount_max_decimals = None
@@ -186,8 +207,11 @@ class DdexMarketMakerKeeper:
     def approve(self):
         self.zrx_exchange.approve([self.token_sell, self.token_buy], directly(gas_price=self.gas_price))
 
-    def our_total_balance(self, token: ERC20Token) -> Wad:
-        return token.balance_of(self.our_address)
+    def our_total_balances(self) -> tuple:
+        state = self.state_reader.read({'buy_balance': StateCall.balance_of(self.token_buy.address, self.our_address),
+                                        'sell_balance': StateCall.balance_of(self.token_sell.address, self.our_address)})
+
+        return state['buy_balance'], state['sell_balance']
 
     def our_sell_orders(self, our_orders: list) -> list:
         return list(filter(lambda order: order.is_sell, our_orders))
@@ -213,10 +237,11 @@ class DdexMarketMakerKeeper:
             self.logger.debug("Order book is in progress, not placing new orders")
             return
 
-        # In case of Ddex, balances returned by `our_total_balance` still contain amounts "locked"
+        # In case of Ddex, balances returned by `our_total_balances` still contain amounts "locked"
         # by currently open orders, so we need to explicitly subtract these amounts.
-        our_buy_balance = self.our_total_balance(self.token_buy) - Bands.total_amount(self.our_buy_orders(order_book.orders))
-        our_sell_balance = self.our_total_balance(self.token_sell) - Bands.total_amount(self.our_sell_orders(order_book.orders))
+        our_total_buy_balance, our_total_sell_balance = self.our_total_balances()
+        our_buy_balance = our_total_buy_balance - Bands.total_amount(self.our_buy_orders(order_book.orders))
+        our_sell_balance = our_total_sell_balance - Bands.total_amount(self.our_sell_orders(order_book.orders))
 
         # Place new orders
         self.place_orders(bands.new_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
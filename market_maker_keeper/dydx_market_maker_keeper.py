@@ -28,6 +28,7 @@ from pymaker.numeric import Wad
 
 from market_maker_keeper.cex_api import CEXKeeperAPI
 from market_maker_keeper.band import Bands
+from market_maker_keeper.cross_pair_orders import CrossPairOrderCache
 
 
 def total_amount(orders: list) -> Wad:
@@ -62,6 +63,12 @@ class DyDxMarketMakerKeeper(CEXKeeperAPI):
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -80,6 +87,15 @@ class DyDxMarketMakerKeeper(CEXKeeperAPI):
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--refresh-frequency", type=int, default=3,
                             help="Order book refresh frequency (in seconds, default: 3)")
 
@@ -95,6 +111,13 @@ class DyDxMarketMakerKeeper(CEXKeeperAPI):
 
         super().__init__(self.arguments, self.dydx_api)
 
+        other_pairs = [pair for pair in self.market_info.keys() if pair.lower() != self.pair().lower()]
+        self.cross_pair_orders = CrossPairOrderCache(get_orders_function=self.dydx_api.get_orders,
+                                                     pairs=other_pairs,
+                                                     buy_token=self.token_buy(),
+                                                     sell_token=self.token_sell(),
+                                                     refresh_frequency=self.arguments.refresh_frequency)
+
     def pair(self):
         return self.arguments.pair
 
@@ -170,17 +193,15 @@ class DyDxMarketMakerKeeper(CEXKeeperAPI):
         is adjusted for the potential new order.
         """
 
-        total_in_buy_orders = total_amount(self.our_buy_orders(order_book.orders))
-        total_in_sell_orders = total_amount(self.our_sell_orders(order_book.orders))
-        for pair in self.market_info.keys():
-            other_pair_orders = []
-            if self.pair().lower() != pair.lower():
-                other_pair_orders = self.dydx_api.get_orders(pair)
-
-            if self.token_buy() in pair.lower():
-                total_in_buy_orders += total_amount(self.our_buy_orders(other_pair_orders))
-            if self.token_sell() in pair.lower():
-                total_in_sell_orders += total_amount(self.our_sell_orders(other_pair_orders))
+        # Orders on other pairs are refreshed in background by `CrossPairOrderCache`.
+        locked_amounts = self.cross_pair_orders.locked_amounts()
+        if locked_amounts is None:
+            self.logger.warning("Orders on other pairs are not known yet, not placing new orders")
+            return
+
+        other_pairs_buy_amount, other_pairs_sell_amount = locked_amounts
+        total_in_buy_orders = total_amount(self.our_buy_orders(order_book.orders)) + other_pairs_buy_amount
+        total_in_sell_orders = total_amount(self.our_sell_orders(order_book.orders)) + other_pairs_sell_amount
 
         our_buy_orders = self.our_buy_orders(order_book.orders)
         our_sell_orders = self.our_sell_orders(order_book.orders)
@@ -82,109 +82,21 @@ class ErisXLifecycle(Lifecycle):
 class ErisXOrderBookManager(OrderBookManager):
 
     """
-    Due to nature of FIX engine, there is a single socket connection controlled by a single event loop.
-    ThreadExecutor as used in the standard OrderBookManager thereby doesn't work.
-    Subclassing enables order actions to be made synchronously without interfering with the FIX event loop.
+    Due to nature of FIX engine, there is a single socket connection controlled by a single event loop,
+    so requests must not be sent over it concurrently. All FIX requests (order placement, order cancellation
+    and order book refresh) are therefore put on one outbound queue, drained by a single worker thread
+    in the order in which they were requested. Placed orders are correlated with their execution reports
+    by ClOrdID within the FIX engine.
+
+    Neither keeper nor `get_order_book()` readers wait for FIX requests to complete, and the internal lock
+    is never held while a request is in progress, so a slow exchange does not block the keeper.
     """
-    def place_order(self, place_order_function):
-        """Places new order. Order placement will happen in a background thread.
+    def __init__(self, refresh_frequency: int):
+        super().__init__(refresh_frequency=refresh_frequency, max_workers=1)
 
-        Args:
-            place_order_function: Function used to place the order.
-        """
-        assert (callable(place_order_function))
-
-        with self._lock:
-            self._currently_placing_orders += 1
-
-        self._report_order_book_updated()
-
-        try:
-            with self._lock:
-                new_order = place_order_function()
-
-                if new_order is not None:
-                    self._orders_placed.append(new_order)
-        except BaseException as exception:
-            self.logger.exception(exception)
-        finally:
-            with self._lock:
-                self._currently_placing_orders -= 1
-            self._report_order_book_updated()
-
-    def cancel_orders(self, orders: list):
-        """Cancels existing orders. Order cancellation will happen in a background thread.
-
-        Args:
-            orders: List of orders to cancel.
-        """
-        assert (isinstance(orders, list))
-        assert (callable(self.cancel_order_function))
-
-        with self._lock:
-            for order in orders:
-                self._order_ids_cancelling.add(order.order_id)
-
-        self._report_order_book_updated()
-
-        for order in orders:
-            order_id = order.order_id
-            try:
-                with self._lock:
-                    cancel_result = self.cancel_order_function(order)
-
-                    if cancel_result:
-                        self._order_ids_cancelled.add(order_id)
-                        self._order_ids_cancelling.remove(order_id)
-                        self.logger.info(f"Succesfully canceled order: {order_id}")
-            except BaseException as exception:
-                self.logger.exception(f"Failed to cancel {order_id}")
-            finally:
-                try:
-                    self._order_ids_cancelling.remove(order_id)
-                except KeyError:
-                    self.logger.info(f"Failed to remove {order_id}")
-                    pass
-                self._report_order_book_updated()
-
-    def _thread_refresh_order_book(self):
-        while True:
-            try:
-                with self._lock:
-                    orders_already_cancelled_before = set(self._order_ids_cancelled)
-                    orders_already_placed_before = set(self._orders_placed)
-
-                # get orders, get balances
-                with self._lock:
-                    orders = self.get_orders_function()
-
-                balances = self.get_balances_function() if self.get_balances_function is not None else None
-
-                if self.order_history_reporter:
-                    orders_buy = self.buy_filter_function(orders)
-                    orders_sell = self.sell_filter_function(orders)
-
-                    self.order_history_reporter.report_orders(orders_buy, orders_sell)
-
-                with self._lock:
-                    self._order_ids_cancelled = self._order_ids_cancelled - orders_already_cancelled_before
-                    for order in orders_already_placed_before:
-                        self._orders_placed.remove(order)
-
-                    if self._state is None:
-                        self.logger.info("Order book became available")
-
-                    self._state = {'orders': orders, 'balances': balances}
-                    self._refresh_count += 1
-
-                self._report_order_book_updated()
-
-                self.logger.debug(f"Fetched the order book"
-                                  f" (orders: {[order.order_id for order in orders]})")
-            except Exception as e:
-                self.logger.info(f"Failed to fetch the order book ({e})")
-
-            time.sleep(self.refresh_frequency)
+    def _fetch_orders(self) -> list:
+        # Order book refresh goes through the same outbound queue as order placement and cancellation.
+        return self._executor.submit(self.get_orders_function).result()
 
 
 class ErisXMarketMakerKeeper(CEXKeeperAPI):
@@ -239,6 +151,12 @@ class ErisXMarketMakerKeeper(CEXKeeperAPI):
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -257,6 +175,15 @@ class ErisXMarketMakerKeeper(CEXKeeperAPI):
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--refresh-frequency", type=int, default=3,
                             help="Order book refresh frequency (in seconds, default: 3)")
 
@@ -24,7 +24,9 @@ from retry import retry
 from web3 import Web3, HTTPProvider
 
 from market_maker_keeper.band import Bands
+from market_maker_keeper.block_scheduler import BlockScheduler
 from market_maker_keeper.control_feed import create_control_feed
+from market_maker_keeper.etherdelta_publisher import EtherDeltaPublisher
 from market_maker_keeper.gas import GasPriceFactory
 from market_maker_keeper.limit import History
 from market_maker_keeper.order_history_reporter import create_order_history_reporter
@@ -34,7 +36,7 @@ from market_maker_keeper.spread_feed import create_spread_feed
 from market_maker_keeper.util import setup_logging
 from pymaker import Address, synchronize
 from pymaker.approval import directly
-from pymaker.etherdelta import EtherDelta, EtherDeltaApi, Order
+from pymaker.etherdelta import EtherDelta, Order
 from pymaker.keys import register_keys
 from pymaker.lifecycle import Lifecycle
 from pymaker.numeric import Wad
@@ -76,7 +78,7 @@ class EtherDeltaMarketMakerKeeper:
                             help="Ethereum address of the EtherDelta API socket")
 
         parser.add_argument("--etherdelta-number-of-attempts", type=int, default=3,
-                            help="Number of attempts of running the tool to talk to the EtherDelta API socket")
+                            help="Number of attempts of sending each order over the EtherDelta API socket")
 
         parser.add_argument("--etherdelta-retry-interval", type=int, default=10,
                             help="Retry interval for sending orders over the EtherDelta API socket")
@@ -93,6 +95,15 @@ class EtherDeltaMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
+        parser.add_argument("--price-feed-cache-ttl", type=int, default=60,
+                            help="Maximum time between refreshes of the on-chain price feed (in seconds, default: 60)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -111,6 +122,15 @@ class EtherDeltaMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--order-age", type=int, required=True,
                             help="Age of created orders (in blocks)")
 
@@ -184,13 +204,12 @@ class EtherDeltaMarketMakerKeeper:
         assert(self.arguments.order_no_cancel_threshold >= self.arguments.order_expiry_threshold)
 
         self.history = History()
+        self.block_scheduler = BlockScheduler(self.web3, self.synchronize_orders)
         self.etherdelta = EtherDelta(web3=self.web3, address=Address(self.arguments.etherdelta_address))
-        self.etherdelta_api = EtherDeltaApi(client_tool_directory="lib/pymaker/utils/etherdelta-client",
-                                            client_tool_command="node main.js",
-                                            api_server=self.arguments.etherdelta_socket,
-                                            number_of_attempts=self.arguments.etherdelta_number_of_attempts,
-                                            retry_interval=self.arguments.etherdelta_retry_interval,
-                                            timeout=self.arguments.etherdelta_timeout)
+        self.etherdelta_api = EtherDeltaPublisher(api_server=self.arguments.etherdelta_socket,
+                                                  number_of_attempts=self.arguments.etherdelta_number_of_attempts,
+                                                  retry_interval=self.arguments.etherdelta_retry_interval,
+                                                  timeout=self.arguments.etherdelta_timeout)
 
         self.our_orders = list()
 
@@ -198,7 +217,7 @@ class EtherDeltaMarketMakerKeeper:
         with Lifecycle(self.web3) as lifecycle:
             lifecycle.initial_delay(10)
             lifecycle.on_startup(self.startup)
-            lifecycle.on_block(self.synchronize_orders)
+            lifecycle.on_block(self.block_scheduler.on_block)
             lifecycle.on_shutdown(self.shutdown)
 
     def startup(self):
@@ -242,7 +261,10 @@ class EtherDeltaMarketMakerKeeper:
         return list(filter(lambda order: order.buy_token == self.token_sell() and
                                          order.pay_token == self.token_buy(), self.our_orders))
 
-    def synchronize_orders(self):
+    def synchronize_orders(self, block=None):
+        # The block header passed by `BlockScheduler` saves us asking the node for the block number.
+        block_number = block['number'] if block is not None else self.web3.eth.blockNumber
+
         # If keeper balance is below `--min-eth-balance`, cancel all orders but do not terminate
         # the keeper, keep processing blocks as the moment the keeper gets a top-up it should
         # resume activity straight away, without the need to restart it.
@@ -254,12 +276,11 @@ class EtherDeltaMarketMakerKeeper:
                 self.etherdelta.withdraw(self.eth_reserve).transact()
             else:
                 self.logger.warning(f"Keeper ETH balance below minimum, cannot withdraw. Cancelling all orders.")
-                self.cancel_all_orders()
+                self.cancel_orders(self.our_orders, block_number)
 
             return
 
         bands = Bands.read(self.bands_config, self.spread_feed, self.control_feed, self.history)
-        block_number = self.web3.eth.blockNumber
         target_price = self.price_feed.get_price()
 
         # Remove expired orders from the local order list
@@ -298,7 +319,7 @@ class EtherDeltaMarketMakerKeeper:
         # If we managed to deposit something, do not do anything so we can reevaluate new orders to be created.
         # Otherwise, create new orders.
         if not made_deposit:
-            self.place_orders(new_orders)
+            self.place_orders(new_orders, block_number)
 
     @staticmethod
     def is_order_age_above_threshold(order: Order, block_number: int, threshold: int):
@@ -323,22 +344,26 @@ class EtherDeltaMarketMakerKeeper:
     def cancel_all_orders(self):
         self.cancel_orders(self.our_orders, self.web3.eth.blockNumber)
 
-    def place_orders(self, new_orders):
+    def place_orders(self, new_orders, block_number: int):
+        expires = block_number + self.arguments.order_age
+
         # EtherDelta sometimes rejects orders when the amounts are not rounded. Choice of choosing
         # rounding to 9 decimal digits is completely arbitrary as it's not documented anywhere.
+        #
+        # Publishing does not block, orders get sent over the EtherDelta API socket in the background.
         for new_order in new_orders:
             if new_order.is_sell:
                 order = self.etherdelta.create_order(pay_token=self.token_sell(),
                                                      pay_amount=round(new_order.pay_amount, 9),
                                                      buy_token=self.token_buy(),
                                                      buy_amount=round(new_order.buy_amount, 9),
-                                                     expires=self.web3.eth.blockNumber + self.arguments.order_age)
+                                                     expires=expires)
             else:
                 order = self.etherdelta.create_order(pay_token=self.token_buy(),
                                                      pay_amount=round(new_order.pay_amount, 9),
                                                      buy_token=self.token_sell(),
                                                      buy_amount=round(new_order.buy_amount, 9),
-                                                     expires=self.web3.eth.blockNumber + self.arguments.order_age)
+                                                     expires=expires)
 
             self.place_order(order)
 
@@ -0,0 +1,179 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+import websocket
+
+from pymaker.etherdelta import Order
+
+
+class EtherDeltaPublisher:
+    """Publishes orders to the EtherDelta API socket over one long-lived connection.
+
+    Replaces `EtherDeltaApi`, which starts a new `node main.js` process for each published order.
+    Here one background thread keeps a socket.io connection to the EtherDelta API open (reconnecting
+    if it drops), and another one takes orders from a local queue and sends them. `publish_order()`
+    and `publish_orders()` never block, and all orders queued at the same time are sent back-to-back
+    without waiting for the API to respond to each of them.
+
+    If an order cannot be sent, it gets retried every `retry_interval` seconds, up to
+    `number_of_attempts` times, unless it has been waiting for more than `timeout` seconds.
+
+    Attributes:
+        api_server: URL of the EtherDelta API socket, i.e. `https://socket.etherdelta.com`.
+        number_of_attempts: Number of attempts of sending each order.
+        retry_interval: Delay between attempts of sending an order (in seconds).
+        timeout: Maximum time an order can wait to be sent (in seconds).
+        reconnect_delay: Delay before reconnecting after the connection drops (in seconds).
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, api_server: str, number_of_attempts: int, retry_interval: int, timeout: int, reconnect_delay: int = 5):
+        assert(isinstance(api_server, str))
+        assert(isinstance(number_of_attempts, int))
+        assert(isinstance(retry_interval, int))
+        assert(isinstance(timeout, int))
+        assert(isinstance(reconnect_delay, int))
+
+        self.api_server = api_server
+        self.number_of_attempts = number_of_attempts
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+
+        self._ws = None
+        self._connected = threading.Event()
+        self._ping_interval = 25.0
+        self._last_ping = time.time()
+        self._queue = queue.Queue()
+
+        threading.Thread(target=self._connection_run, daemon=True).start()
+        threading.Thread(target=self._publishing_run, daemon=True).start()
+
+    @staticmethod
+    def socket_url(api_server: str) -> str:
+        parsed_url = urlparse(api_server)
+        scheme = 'ws' if parsed_url.scheme in ['http', 'ws'] else 'wss'
+
+        return f"{scheme}://{parsed_url.netloc}/socket.io/?EIO=3&transport=websocket"
+
+    def publish_order(self, order: Order):
+        """Queues `order` to be published. Returns immediately."""
+        assert(isinstance(order, Order))
+
+        self._queue.put((order, 1, time.time()))
+
+    def publish_orders(self, orders: list):
+        """Queues all `orders` to be published in one go. Returns immediately."""
+        assert(isinstance(orders, list))
+
+        for order in orders:
+            self.publish_order(order)
+
+    def _connection_run(self):
+        while True:
+            self._ws = websocket.WebSocketApp(url=self.socket_url(self.api_server),
+                                              on_message=self._on_message,
+                                              on_error=self._on_error,
+                                              on_close=self._on_close)
+            self._ws.run_forever()
+            self._connected.clear()
+            time.sleep(self.reconnect_delay)
+
+    def _on_message(self, ws, message: str):
+        # Engine.IO `open` packet, carrying the ping interval expected by the server
+        if message.startswith('0'):
+            self._ping_interval = json.loads(message[1:]).get('pingInterval', 25000) / 1000.0
+
+        # Socket.IO `connect` packet, from now on we can emit events
+        elif message == '40':
+            self.logger.info(f"Connected to the EtherDelta API socket '{self.api_server}'")
+            self._connected.set()
+
+        # Socket.IO `event` packet
+        elif message.startswith('42'):
+            try:
+                event, *args = json.loads(message[2:])
+                if event == 'messageResult':
+                    self.logger.debug(f"EtherDelta API responded to a published order: {args}")
+
+            except:
+                self.logger.warning(f"EtherDelta API socket sent an invalid message: '{message}'")
+
+    def _on_error(self, ws, error):
+        self.logger.info(f"EtherDelta API socket error: '{error}'")
+
+    def _on_close(self, ws):
+        self.logger.info(f"Disconnected from the EtherDelta API socket '{self.api_server}'")
+        self._connected.clear()
+
+    def _send(self, message: str):
+        self._ws.send(message)
+
+    def _ping_if_needed(self):
+        if self._connected.is_set() and time.time() - self._last_ping >= self._ping_interval:
+            try:
+                self._send('2')
+                self._last_ping = time.time()
+            except Exception as e:
+                self.logger.info(f"Failed to ping the EtherDelta API socket: {e}")
+
+    def _publish(self, order: Order, attempt: int, queued_at: float):
+        if time.time() - queued_at > self.timeout:
+            self.logger.warning(f"Publishing order {order} timed out, dropping it")
+            return
+
+        if self._connected.wait(self.retry_interval):
+            try:
+                self._send('42' + json.dumps(['message', order.to_json()]))
+                self.logger.info(f"Published order {order}")
+                return
+
+            except Exception as e:
+                self.logger.info(f"Failed to publish order {order}: {e}")
+
+                # the connection is broken, next attempts will wait for it to be established again
+                self._connected.clear()
+
+        if attempt < self.number_of_attempts:
+            self._queue.put((order, attempt + 1, queued_at))
+        else:
+            self.logger.warning(f"Failed to publish order {order} after {attempt} attempts, dropping it")
+
+    def _publishing_run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=1.0)]
+            except queue.Empty:
+                self._ping_if_needed()
+                continue
+
+            # all orders queued in the meantime get sent back-to-back
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            for order, attempt, queued_at in batch:
+                self._publish(order, attempt, queued_at)
+
+            self._ping_if_needed()
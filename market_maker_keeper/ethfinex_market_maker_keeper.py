@@ -64,6 +64,12 @@ class EthfinexMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -82,6 +88,15 @@ class EthfinexMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--refresh-frequency", type=int, default=3,
                             help="Order book refresh frequency (in seconds, default: 3)")
 
@@ -146,25 +161,25 @@ class EthfinexMarketMakerKeeper:
         order_book = self.order_book_manager.get_order_book()
         target_price = self.price_feed.get_price()
 
-        # Cancel orders
-        cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                                      our_sell_orders=self.our_sell_orders(order_book.orders),
-                                                      target_price=target_price)
-        if len(cancellable_orders) > 0:
-            self.order_book_manager.cancel_orders(cancellable_orders)
-            return
-
-        # Do not place new orders if order book state is not confirmed
+        # Do not place new orders if order book state is not confirmed, only cancel orders
         if order_book.orders_being_placed or order_book.orders_being_cancelled:
-            self.logger.debug("Order book is in progress, not placing new orders")
+            cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
+                                                          our_sell_orders=self.our_sell_orders(order_book.orders),
+                                                          target_price=target_price)
+            if len(cancellable_orders) > 0:
+                self.order_book_manager.cancel_orders(cancellable_orders)
+            else:
+                self.logger.debug("Order book is in progress, not placing new orders")
             return
 
-        # Place new orders
-        self.order_book_manager.place_orders(bands.new_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                                              our_sell_orders=self.our_sell_orders(order_book.orders),
-                                                              our_buy_balance=self.our_available_balance(order_book.balances, self.token_buy()),
-                                                              our_sell_balance=self.our_available_balance(order_book.balances, self.token_sell()),
-                                                              target_price=target_price)[0])
+        # Cancel orders and place new ones at the same time
+        orders_to_cancel, new_orders, _, _ = bands.cancel_and_top_up_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
+                                                                            our_sell_orders=self.our_sell_orders(order_book.orders),
+                                                                            our_buy_balance=self.our_available_balance(order_book.balances, self.token_buy()),
+                                                                            our_sell_balance=self.our_available_balance(order_book.balances, self.token_sell()),
+                                                                            target_price=target_price)
+
+        self.order_book_manager.replace_orders(orders_to_cancel, new_orders)
 
     def place_order_function(self, new_order):
         pair = self.pair()
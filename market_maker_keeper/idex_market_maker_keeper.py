@@ -25,6 +25,7 @@ from web3 import Web3, HTTPProvider
 from market_maker_keeper.band import Bands
 from market_maker_keeper.control_feed import create_control_feed
 from market_maker_keeper.gas import GasPriceFactory
+from market_maker_keeper.idex_reconciliation import IdexBalanceReconciliation
 from market_maker_keeper.limit import History
 from market_maker_keeper.order_history_reporter import create_order_history_reporter
 from market_maker_keeper.price_feed import PriceFeedFactory
@@ -87,6 +88,15 @@ class IdexMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
+        parser.add_argument("--price-feed-cache-ttl", type=int, default=60,
+                            help="Maximum time between refreshes of the on-chain price feed (in seconds, default: 60)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -105,6 +115,15 @@ class IdexMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--eth-reserve", type=float, required=True,
                             help="Amount of ETH which will never be deposited so the keeper can cover gas")
 
@@ -160,6 +179,10 @@ class IdexMarketMakerKeeper:
         self.history = History()
         self.idex = IDEX(self.web3, Address(self.arguments.idex_address))
         self.idex_api = IDEXApi(self.idex, self.arguments.idex_api_server, self.arguments.idex_timeout)
+        self.balance_reconciliation = IdexBalanceReconciliation(web3=self.web3,
+                                                                idex_address=self.idex.address,
+                                                                our_address=self.our_address,
+                                                                contract_balances_function=self.contract_balances)
 
     def main(self):
         with Lifecycle(self.web3) as lifecycle:
@@ -308,6 +331,7 @@ class IdexMarketMakerKeeper:
         # If we still can deposit something, and it's at least `min_eth_deposit`, then we do deposit.
         if missing_sell_amount > Wad(0) and missing_sell_amount >= self.min_eth_deposit:
             receipt = self.idex.deposit(missing_sell_amount).transact(gas_price=self.gas_price)
+            self.balance_reconciliation.invalidate()
             return receipt is not None and receipt.successful
         else:
             return False
@@ -325,6 +349,7 @@ class IdexMarketMakerKeeper:
         # If we still can deposit something, and it's at least `min_sai_deposit`, then we do deposit.
         if missing_buy_amount > Wad(0) and missing_buy_amount >= self.min_sai_deposit:
             receipt = self.idex.deposit_token(self.sai.address, missing_buy_amount).transact(gas_price=self.gas_price)
+            self.balance_reconciliation.invalidate()
             return receipt is not None and receipt.successful
         else:
             return False
@@ -350,8 +375,10 @@ class IdexMarketMakerKeeper:
         except KeyError:
             dai_on_orders = Wad(0)
 
-        return self.idex.balance_of(self.our_address) == eth_available + eth_on_orders and \
-               self.idex.balance_of_token(self.sai.address, self.our_address) == dai_available + dai_on_orders
+        return self.balance_reconciliation.balances_match((eth_available + eth_on_orders, dai_available + dai_on_orders))
+
+    def contract_balances(self) -> tuple:
+        return self.idex.balance_of(self.our_address), self.idex.balance_of_token(self.sai.address, self.our_address)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,135 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+import time
+
+from eth_abi import decode_abi
+from web3 import Web3
+
+from pymaker import Address
+
+
+class IdexBalanceReconciliation:
+    """Checks whether our IDEX balances reported by the API match the balances held by the contract.
+
+    Reading the contract balances takes on-chain calls, so the result of a successful check gets
+    cached. It is only checked again if the API balances change, or if a `Deposit` or `Withdraw`
+    event concerning our account has been emitted by the IDEX contract since. These events are watched
+    for in a background thread, so the common case (nothing has changed) makes no calls at all.
+
+    Only matching balances are cached. If balances do not match (i.e. a deposit is still waiting
+    to be credited by IDEX), they get checked again each time. If events can not be watched for,
+    the balances get checked each time as well.
+
+    Attributes:
+        web3: An instance of `Web3`.
+        idex_address: Address of the IDEX contract.
+        our_address: Address of our account.
+        contract_balances_function: Function returning our balances held by the contract, as a tuple
+            comparable with the API balances passed to `balances_match()`.
+        poll_interval: How often (in seconds) to check for new events.
+    """
+
+    logger = logging.getLogger()
+
+    DEPOSIT_TOPIC = Web3.toHex(Web3.sha3(text='Deposit(address,address,uint256,uint256)'))
+    WITHDRAW_TOPIC = Web3.toHex(Web3.sha3(text='Withdraw(address,address,uint256,uint256)'))
+
+    def __init__(self, web3, idex_address: Address, our_address: Address, contract_balances_function, poll_interval: float = 1):
+        assert(isinstance(idex_address, Address))
+        assert(isinstance(our_address, Address))
+        assert(callable(contract_balances_function))
+        assert(isinstance(poll_interval, (int, float)))
+
+        self.web3 = web3
+        self.idex_address = idex_address
+        self.our_address = our_address
+        self.contract_balances_function = contract_balances_function
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._watching = False
+        self._verified_api_balances = None
+        self._generation = 0
+
+        threading.Thread(target=self._background_run, daemon=True).start()
+
+    def invalidate(self):
+        """Makes the next `balances_match()` call check the contract balances again."""
+        with self._lock:
+            self._verified_api_balances = None
+            self._generation += 1
+
+    def balances_match(self, api_balances: tuple) -> bool:
+        """Returns `True` if `api_balances` match our balances held by the contract."""
+        assert(isinstance(api_balances, tuple))
+
+        with self._lock:
+            if self._watching and self._verified_api_balances == api_balances:
+                return True
+
+            generation = self._generation
+
+        match = self.contract_balances_function() == api_balances
+
+        with self._lock:
+            # if an event invalidated the cache while we were reading the contract, we do not cache
+            # the result, as it might have been read before the event happened
+            if generation == self._generation:
+                self._verified_api_balances = api_balances if match else None
+
+        self.logger.debug(f"Checked IDEX balances against the contract (match: {match})")
+
+        return match
+
+    def _is_ours(self, log) -> bool:
+        # both `Deposit` and `Withdraw` events are (token, user, amount, balance)
+        token, user, amount, balance = decode_abi(['address', 'address', 'uint256', 'uint256'], Web3.toBytes(hexstr=log['data']))
+
+        return Address(user) == self.our_address
+
+    def _background_run(self):
+        event_filter = None
+
+        while True:
+            try:
+                if event_filter is None:
+                    event_filter = self.web3.eth.filter({'address': self.idex_address.address,
+                                                         'topics': [[self.DEPOSIT_TOPIC, self.WITHDRAW_TOPIC]]})
+
+                    # events might have been missed while we were not watching
+                    self.invalidate()
+
+                    with self._lock:
+                        self._watching = True
+
+                elif any(map(self._is_ours, event_filter.get_new_entries())):
+                    self.logger.info("Deposit or withdrawal detected on IDEX, balances will be checked again")
+                    self.invalidate()
+
+            except Exception as e:
+                self.logger.warning(f"Failed to watch for IDEX deposits and withdrawals ({e}),"
+                                    f" balances will be checked on each block")
+
+                with self._lock:
+                    self._watching = False
+
+                event_filter = None
+
+            time.sleep(self.poll_interval)
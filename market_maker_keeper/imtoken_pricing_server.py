@@ -17,11 +17,20 @@
 
 import sys
 import argparse
+import atexit
 import logging
+import os
+import tempfile
+import tornado.httpserver
 import tornado.ioloop
+import tornado.netutil
+import tornado.process
 import tornado.web
 import json
-from cachetools import TTLCache
+from web3 import Web3, HTTPProvider
+from market_maker_keeper.balance_ledger import BalanceLedger
+from market_maker_keeper.imtoken_quote_store import InProcessQuoteStore, SqliteQuoteStore
+from market_maker_keeper.imtoken_quotes import ImtokenQuoteTable
 from market_maker_keeper.imtoken_utils import PairsHandler, IndicativePriceHandler,\
     PriceHandler, DealHandler, ImtokenPair, MarketArgs, ExceptionHandler
 
@@ -31,6 +40,8 @@ from market_maker_keeper.price_feed import PriceFeedFactory
 from market_maker_keeper.spread_feed import create_spread_feed
 from market_maker_keeper.control_feed import create_control_feed
 from market_maker_keeper.limit import History
+from pymaker import Address
+from pymaker.token import ERC20Token, EthToken
 
 
 class ImtokenPricingServer:
@@ -46,6 +57,14 @@ class ImtokenPricingServer:
     /deal - Respond with True if our cache is cleared. The order our /price endpoint replied with was excepted and executed. It is now a trade.
     /indicitivePrice - Respond with our price quote for the pair
     /exception - Respond with True if exception is handled False if error. ImToken sends errors when orders have issues being processed
+
+    With `--workers` the server pre-forks multiple processes sharing one listening socket. Quotes are then
+    kept in a `SqliteQuoteStore` shared by all of them, so `/deal` and `/exception` can resolve quotes
+    issued by any process.
+
+    With `--eth-from` (and token addresses listed in the config file) quotes are only exchangeable if we
+    have enough balance to pay them out. Balance promised by each firm quote stays reserved until it gets
+    resolved or expires. Reservations are kept by each worker process separately.
    """
 
     logger = logging.getLogger()
@@ -74,35 +93,128 @@ class ImtokenPricingServer:
         parser.add_argument("--order-cache-ttl", type=int, default=10,
                             help="Orders time to live")
 
+        parser.add_argument("--quote-refresh-interval", type=float, default=0.5,
+                            help="Frequency of checking whether quotes need to be recalculated (in seconds, default: 0.5)")
+
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Number of pre-forked server processes, 0 meaning one per CPU core (default: 1)")
+
+        parser.add_argument("--quote-store", type=str,
+                            help="SQLite file for quotes shared between server processes"
+                                 " (default: in-process store if one worker, a temporary file otherwise)")
+
+        parser.add_argument("--rpc-host", type=str, default="localhost",
+                            help="JSON-RPC host (default: `localhost')")
+
+        parser.add_argument("--rpc-port", type=int, default=8545,
+                            help="JSON-RPC port (default: `8545')")
+
+        parser.add_argument("--rpc-timeout", type=int, default=10,
+                            help="JSON-RPC timeout (in seconds, default: 10)")
+
+        parser.add_argument("--eth-from", type=str,
+                            help="Ethereum account holding our inventory, enables balance checks of quotes")
+
+        parser.add_argument("--balance-refresh-interval", type=float, default=1.0,
+                            help="Frequency of refreshing our balances (in seconds, default: 1.0)")
+
+        parser.add_argument("--balance-expiry", type=int, default=30,
+                            help="Maximum age of balances we quote against (in seconds, default: 30)")
+
         parser.add_argument("--debug", dest='debug', action='store_true',
                             help="Enable debug output")
 
         self.arguments = parser.parse_args(args)
         setup_logging(self.arguments)
 
-        self.cache = TTLCache(maxsize=self.arguments.order_cache_maxsize, ttl=self.arguments.order_cache_ttl)
+        if self.arguments.workers == 1 and self.arguments.quote_store is None:
+            self.cache = InProcessQuoteStore(maxsize=self.arguments.order_cache_maxsize, ttl=self.arguments.order_cache_ttl)
+        else:
+            self.cache = SqliteQuoteStore(filename=self.arguments.quote_store or self._default_quote_store(),
+                                          maxsize=self.arguments.order_cache_maxsize,
+                                          ttl=self.arguments.order_cache_ttl)
+
+            # the default quote store is a temporary file, so we delete it once the server terminates
+            if self.arguments.quote_store is None:
+                atexit.register(self._remove_quote_store, os.getpid())
+
+    @staticmethod
+    def _default_quote_store() -> str:
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        return os.path.join(directory, f"imtoken-pricing-server-quotes-{os.getpid()}.sqlite")
+
+    def _remove_quote_store(self, owner_pid: int):
+        # worker processes inherit the exit handler, but only the parent process may delete
+        # the quote store, as other workers can still be using it
+        if os.getpid() == owner_pid:
+            self.cache.remove()
+
+    def main(self):
+        sockets = tornado.netutil.bind_sockets(port=self.arguments.http_port, address=self.arguments.http_address)
+
+        # everything starting background threads (price feeds, the quote table) must only be
+        # created after forking, so each worker process gets its own copy of it
+        if self.arguments.workers != 1:
+            tornado.process.fork_processes(self.arguments.workers)
 
         with open(self.arguments.config) as json_file:
             data = json.load(json_file)
 
         pairs, configs = self._parse_configs(data=data)
+        quote_table = ImtokenQuoteTable(pairs, configs, self.arguments.quote_refresh_interval)
+        balance_ledger = self._create_balance_ledger(data=data)
 
         application = tornado.web.Application([
             (r"/pairs", PairsHandler, dict(token_pairs=pairs)),
-            (r"/indicativePrice", IndicativePriceHandler, dict(pairs=pairs,
-                                                               configs=configs,
-                                                               cache=self.cache)),
-            (r"/price", PriceHandler, dict(pairs=pairs,
-                                           configs=configs,
-                                           cache=self.cache)),
+            (r"/indicativePrice", IndicativePriceHandler, dict(quote_table=quote_table,
+                                                               cache=self.cache,
+                                                               balance_ledger=balance_ledger)),
+            (r"/price", PriceHandler, dict(quote_table=quote_table,
+                                           cache=self.cache,
+                                           balance_ledger=balance_ledger)),
             (r"/deal", DealHandler, dict(cache=self.cache,
-                                         schema=deal_schema())),
+                                         schema=deal_schema(),
+                                         balance_ledger=balance_ledger)),
             (r"/exception", ExceptionHandler, dict(cache=self.cache,
-                                         schema=deal_schema())),
+                                         schema=deal_schema(),
+                                         balance_ledger=balance_ledger)),
         ])
-        application.listen(port=self.arguments.http_port,address=self.arguments.http_address)
+        server = tornado.httpserver.HTTPServer(application)
+        server.add_sockets(sockets)
         tornado.ioloop.IOLoop.current().start()
 
+    #
+    # Token addresses, needed for balance checks only
+    #
+    # {
+    #     "tokens": {
+    #         "ETH": "0x0000000000000000000000000000000000000000",
+    #         "DAI": "0x89d24a6b4ccb1b6faa2625fe562bdd9a23260359"
+    #     },
+    #     "markets": [...]
+    # }
+    def _create_balance_ledger(self, data: dict):
+        if self.arguments.eth_from is None:
+            return None
+
+        web3 = Web3(HTTPProvider(endpoint_uri=f"http://{self.arguments.rpc_host}:{self.arguments.rpc_port}",
+                                 request_kwargs={"timeout": self.arguments.rpc_timeout}))
+        our_address = Address(self.arguments.eth_from)
+
+        balance_functions = {}
+        for symbol, address in data.get('tokens', {}).items():
+            if address == '0x0000000000000000000000000000000000000000':
+                token = EthToken(web3=web3, address=Address(address))
+            else:
+                token = ERC20Token(web3=web3, address=Address(address))
+
+            balance_functions[symbol] = lambda token=token: token.balance_of(our_address)
+
+        return BalanceLedger(balance_functions,
+                             refresh_interval=self.arguments.balance_refresh_interval,
+                             expiry=self.arguments.balance_expiry,
+                             reservation_ttl=self.arguments.order_cache_ttl)
+
     #
     # Multiple markets configuration sample
     #
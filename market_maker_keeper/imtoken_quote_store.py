@@ -0,0 +1,180 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from cachetools import TTLCache
+
+
+class QuoteStore:
+    """Stores quotes issued by `/price` until they get resolved by `/deal` or `/exception`, or expire."""
+
+    def put(self, quote_id: str, quote: dict):
+        raise NotImplementedError()
+
+    def pop(self, quote_id: str) -> dict:
+        """Removes the quote from the store and returns it. Raises `KeyError` if there is no such quote."""
+        raise NotImplementedError()
+
+
+class InProcessQuoteStore(QuoteStore):
+    """Quote store kept in the memory of the current process.
+
+    Only usable if the pricing server runs as a single process, as quotes issued by one process
+    are not visible to any other one.
+
+    Attributes:
+        maxsize: Maximum number of quotes kept.
+        ttl: Time after which a quote expires (in seconds).
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        assert(isinstance(maxsize, int))
+        assert(isinstance(ttl, int))
+
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def put(self, quote_id: str, quote: dict):
+        assert(isinstance(quote_id, str))
+        assert(isinstance(quote, dict))
+
+        with self._lock:
+            self._cache[quote_id] = quote
+
+    def pop(self, quote_id: str) -> dict:
+        assert(isinstance(quote_id, str))
+
+        with self._lock:
+            return self._cache.pop(quote_id)
+
+
+class SqliteQuoteStore(QuoteStore):
+    """Quote store shared by all processes of a pre-forked pricing server.
+
+    Quotes are kept in an SQLite database in write-ahead logging mode, which lets many processes read
+    and write it concurrently. Placing the file in `/dev/shm` keeps it entirely in shared memory.
+    No connection is kept open after the schema gets created, and each process opens its own
+    connection the first time it uses the store, so the store can be created before the server forks.
+
+    Expired quotes are never returned. They get purged, together with the oldest quotes exceeding
+    `maxsize`, at most once every second.
+
+    Attributes:
+        filename: Filename of the SQLite database.
+        maxsize: Maximum number of quotes kept.
+        ttl: Time after which a quote expires (in seconds).
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, filename: str, maxsize: int, ttl: int):
+        assert(isinstance(filename, str))
+        assert(isinstance(maxsize, int))
+        assert(isinstance(ttl, int))
+
+        self.filename = filename
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._connection = None
+        self._connection_pid = None
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+
+        # SQLite connections must not be carried over `fork()`, so the connection used to create
+        # the schema gets closed straight away and each process opens its own one when needed
+        connection = self._connect()
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS quotes (quote_id TEXT PRIMARY KEY, quote TEXT NOT NULL, expires REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS quotes_expires ON quotes (expires)")
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.filename, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=OFF")
+
+        return connection
+
+    def _db(self) -> sqlite3.Connection:
+        # connections must not be shared with forked processes
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = self._connect()
+            self._connection_pid = os.getpid()
+
+        return self._connection
+
+    def _purge_if_needed(self, db: sqlite3.Connection, now: float):
+        if now - self._last_purge < 1.0:
+            return
+
+        db.execute("DELETE FROM quotes WHERE expires <= ?", (now,))
+        db.execute("DELETE FROM quotes WHERE quote_id IN (SELECT quote_id FROM quotes ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                   (self.maxsize,))
+        self._last_purge = now
+
+    def put(self, quote_id: str, quote: dict):
+        assert(isinstance(quote_id, str))
+        assert(isinstance(quote, dict))
+
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO quotes (quote_id, quote, expires) VALUES (?, ?, ?)",
+                       (quote_id, json.dumps(quote), now + self.ttl))
+            self._purge_if_needed(db, now)
+
+    def pop(self, quote_id: str) -> dict:
+        assert(isinstance(quote_id, str))
+
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT quote FROM quotes WHERE quote_id = ? AND expires > ?", (quote_id, time.time())).fetchone()
+                db.execute("DELETE FROM quotes WHERE quote_id = ?", (quote_id,))
+                db.execute("COMMIT")
+
+            except:
+                db.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            raise KeyError(quote_id)
+
+        return json.loads(row[0])
+
+    def remove(self):
+        """Deletes the database, together with its write-ahead log and shared memory files."""
+        with self._lock:
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._connection.close()
+
+            self._connection = None
+
+            for filename in [self.filename, self.filename + '-wal', self.filename + '-shm']:
+                try:
+                    os.remove(filename)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,154 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from market_maker_keeper.band import Bands
+from pymaker.numeric import Wad
+
+
+class ImtokenQuote:
+    """Price and amount range we are willing to quote for one pair and side."""
+
+    def __init__(self, price: Wad, min_amount: Wad, max_amount: Wad):
+        assert(isinstance(price, Wad))
+        assert(isinstance(min_amount, Wad))
+        assert(isinstance(max_amount, Wad))
+
+        self.price = price
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+
+    def __repr__(self):
+        return f"ImtokenQuote(price={self.price}, min_amount={self.min_amount}, max_amount={self.max_amount})"
+
+
+class ImtokenQuoteTable:
+    """Precomputed quotes for all pairs served by the imToken pricing server.
+
+    Calculating a quote involves reading the price feed, the spread feed, the control feed and the
+    bands config file (stat-ing it and potentially evaluating jsonnet). Instead of doing it on each
+    `/price` and `/indicativePrice` request, a background thread checks these inputs every
+    `refresh_interval` seconds and rebuilds the quotes of a market only if any of them has changed.
+    Requests are then answered with a single dictionary lookup.
+
+    Attributes:
+        pairs: List of `ImtokenPair` objects we serve.
+        configs: Market configurations, keyed by both the base and the counter pair.
+        refresh_interval: Frequency of checking whether the quotes need to be rebuilt (in seconds).
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, pairs: list, configs: dict, refresh_interval: float = 0.5):
+        assert(isinstance(pairs, list))
+        assert(isinstance(configs, dict))
+        assert(isinstance(refresh_interval, float))
+
+        self.pairs = pairs
+        self.configs = configs
+        self.refresh_interval = refresh_interval
+
+        self._inputs = {}
+        self._quotes = {}
+
+        self.refresh()
+        threading.Thread(target=self._background_run, daemon=True).start()
+
+    def supports(self, query_pair: str) -> bool:
+        return query_pair in self.configs
+
+    def get_quote(self, query_pair: str, our_side: str) -> Optional[ImtokenQuote]:
+        """Returns the current quote for `query_pair` and `our_side` (`BUY` or `SELL`).
+
+        Returns `None` if we cannot quote at the moment, i.e. because the price is not available
+        or because there are no bands for this side.
+        """
+        return self._quotes.get((query_pair, our_side))
+
+    @staticmethod
+    def _quote(bands: list, price: Wad, invert: bool) -> Optional[ImtokenQuote]:
+        if len(bands) == 0:
+            return None
+
+        band = bands[0]
+        price = band.avg_price(price)
+
+        if invert:
+            price = Wad.from_number(1) / price
+
+        return ImtokenQuote(price=price, min_amount=band.min_amount, max_amount=band.max_amount)
+
+    def _read_inputs(self, config: dict) -> tuple:
+        target_price = config['price_feed'].get_price()
+        spread_feed_value = config['spread_feed'].get()[0]
+        control_feed_value = config['control_feed'].get()[0]
+        bands_config = config['bands_config'].get_config(spread_feed_value)
+
+        return (target_price.buy_price.value if target_price.buy_price is not None else None,
+                target_price.sell_price.value if target_price.sell_price is not None else None,
+                spread_feed_value,
+                control_feed_value,
+                bands_config), target_price
+
+    def _build_quotes(self, pair, config: dict, target_price) -> dict:
+        if target_price.buy_price is None or target_price.sell_price is None:
+            return {}
+
+        bands = Bands.read(config['bands_config'], config['spread_feed'], config['control_feed'], config['history'])
+
+        return {(pair.counter_pair, 'BUY'): self._quote(bands.buy_bands, target_price.buy_price, False),
+                (pair.counter_pair, 'SELL'): self._quote(bands.sell_bands, target_price.sell_price, False),
+                (pair.base_pair, 'SELL'): self._quote(bands.buy_bands, target_price.sell_price, True),
+                (pair.base_pair, 'BUY'): self._quote(bands.sell_bands, target_price.buy_price, True)}
+
+    def refresh(self):
+        """Rebuilds quotes of the markets whose price, spread, control feed or config has changed."""
+        quotes = dict(self._quotes)
+
+        for pair in self.pairs:
+            config = self.configs[pair.base_pair]
+
+            try:
+                inputs, target_price = self._read_inputs(config)
+                if self._inputs.get(pair.base_pair) == inputs:
+                    continue
+
+                pair_quotes = self._build_quotes(pair, config, target_price)
+                self._inputs[pair.base_pair] = inputs
+
+                self.logger.debug(f"Rebuilt quotes for {pair.base_pair}: {pair_quotes}")
+
+            except Exception as e:
+                self.logger.warning(f"Failed to rebuild quotes for {pair.base_pair}, not quoting it for now: {e}")
+
+                pair_quotes = {}
+                self._inputs.pop(pair.base_pair, None)
+
+            for key in [(pair.counter_pair, 'BUY'), (pair.counter_pair, 'SELL'), (pair.base_pair, 'SELL'), (pair.base_pair, 'BUY')]:
+                quotes[key] = pair_quotes.get(key)
+
+        # replaced in one go, so request handlers never see a half-built table
+        self._quotes = quotes
+
+    def _background_run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh()
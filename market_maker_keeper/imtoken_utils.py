@@ -20,7 +20,6 @@ from tornado import gen
 import uuid
 import logging
 import jsonschema
-from market_maker_keeper.band import Bands
 from pymaker.numeric import Wad
 
 
@@ -64,28 +63,28 @@ class PairsHandler(tornado.web.RequestHandler):
 
 class PriceHandler(tornado.web.RequestHandler):
 
-    def initialize(self, pairs, configs, cache):
-        self.pairs = pairs
-        self.configs = configs
+    def initialize(self, quote_table, cache, balance_ledger=None):
+        self.quote_table = quote_table
         self.cache = cache
+        self.balance_ledger = balance_ledger
 
     @gen.coroutine
     def get(self):
         amount = self.get_query_argument('amount')
-        response = self._get_price_response(amount)
+        quote_id = str(uuid.uuid4())
+        response = self._get_price_response(amount, quote_id)
         uniqId = self.get_query_argument('uniqId')
 
-        quote_id = str(uuid.uuid4())
-        self.cache[quote_id] = {
+        self.cache.put(quote_id, {
             "uniqId": uniqId,
             "price": response['price'],
             "amount": amount
-        }
+        })
 
         response["quoteId"] = quote_id
         return self.write(response)
 
-    def _get_price_response(self, amount):
+    def _get_price_response(self, amount, quote_id=None):
         #TODO: edit order calculation so as order amount increases so does our spread (the quote price).
 
         base = self.get_query_argument('base')
@@ -102,7 +101,7 @@ class PriceHandler(tornado.web.RequestHandler):
             }
 
         query_pair = f"{quote}/{base}"
-        if query_pair not in self.configs:
+        if not self.quote_table.supports(query_pair):
             logging.info(f"Pair {base}/{quote} not supported")
             return {
                 "result": False,
@@ -115,11 +114,11 @@ class PriceHandler(tornado.web.RequestHandler):
             our_side = "BUY"
         else:
             our_side = "SELL"
-        target_price = self.configs[query_pair]['price_feed'].get_price()
 
-        logging.info(f" Feed price: buy {target_price.buy_price} ; sell {target_price.sell_price}")
+        # quotes get precomputed by `ImtokenQuoteTable` whenever the price, the spreads or the bands change
+        quote_for_pair = self.quote_table.get_quote(query_pair, our_side)
 
-        if target_price.buy_price is None or target_price.sell_price is None:
+        if quote_for_pair is None:
             return {
                 "result": False,
                 "exchangeable": False,
@@ -128,44 +127,40 @@ class PriceHandler(tornado.web.RequestHandler):
                 "message": f"internal server error, please retry later"
             }
 
-        logging.info(f"Query pair is {query_pair}")
+        logging.debug(f"Query pair is {query_pair}, price: {str(quote_for_pair.price)}"
+                      f"  minAmount: {str(quote_for_pair.min_amount)}  maxAmount: {str(quote_for_pair.max_amount)}")
 
-        bands = Bands.read(self.configs[query_pair]['bands_config'],
-                           self.configs[query_pair]['spread_feed'],
-                           self.configs[query_pair]['control_feed'],
-                           self.configs[query_pair]['history'])
+        exchangeable = Wad.from_number(amount) <= quote_for_pair.max_amount \
+            and self._has_inventory(base, quote, side, Wad.from_number(amount), quote_for_pair.price, quote_id)
 
-        if not self.is_base_pair(query_pair) and our_side == "BUY":
-            band = bands.buy_bands[0]
-            price = band.avg_price(target_price.buy_price)
+        return {
+            "result": True,
+            "exchangeable": exchangeable,
+            "price": float(quote_for_pair.price),
+            "minAmount": float(quote_for_pair.min_amount),
+            "maxAmount": float(quote_for_pair.max_amount)
+        }
 
-        if not self.is_base_pair(query_pair) and our_side == "SELL":
-            band = bands.sell_bands[0]
-            price = band.avg_price(target_price.sell_price)
 
-        if self.is_base_pair(query_pair) and our_side == "SELL":
-            band = bands.buy_bands[0]
-            price = Wad.from_number(1) / band.avg_price(target_price.sell_price)
+    def _has_inventory(self, base: str, quote: str, side: str, amount: Wad, price: Wad, quote_id) -> bool:
+        if self.balance_ledger is None:
+            return True
 
-        if self.is_base_pair(query_pair) and our_side == "BUY":
-            band = bands.sell_bands[0]
-            price = Wad.from_number(1) / band.avg_price(target_price.buy_price)
+        # the taker buying `base` gets `amount` of it from us, the one selling it gets `amount * price` of `quote`
+        token, payout = (base, amount) if side == "BUY" else (quote, amount * price)
 
-        logging.info(f"price: {str(price)}  minAmount: {str(band.min_amount)}  maxAmount: {str(band.max_amount)}")
+        if not self.balance_ledger.tracks(token):
+            return True
 
-        return {
-            "result": True,
-            "exchangeable": Wad.from_number(amount) <= band.max_amount,
-            "price": float(price),
-            "minAmount": float(band.min_amount),
-            "maxAmount": float(band.max_amount)
-        }
+        # firm quotes reserve the payout until they get processed or expire, indicative ones only check it
+        if quote_id is not None:
+            return self.balance_ledger.reserve(quote_id, token, payout)
 
-    def is_base_pair(self, token_pair: str) -> bool:
-        for pair in self.pairs:
-            if pair.base_pair == token_pair:
-                return True
-        return False
+        try:
+            return self.balance_ledger.available(token) >= payout
+        except Exception as e:
+            logging.warning(f"Unable to check available balance of {token} ({e})")
+            return False
 
 
 class IndicativePriceHandler(PriceHandler):
@@ -176,15 +171,20 @@ class IndicativePriceHandler(PriceHandler):
 
 
 class QuoteProcessHandler(tornado.web.RequestHandler):
-    def initialize(self, cache, schema):
+    def initialize(self, cache, schema, balance_ledger=None):
         self.cache = cache
         self.schema = schema
+        self.balance_ledger = balance_ledger
 
     def delete_quote(self, request_body, type):
 
         quote_id = request_body['quoteId']
-        processed_quote = self.cache[quote_id]
-        self.cache.__delitem__(quote_id)
+
+        # the trade either happened or failed, in both cases the payout is not promised anymore
+        if self.balance_ledger is not None:
+            self.balance_ledger.release(quote_id)
+
+        processed_quote = self.cache.pop(quote_id)
 
         if type == 'EXCEPTION':
             logging.warning(f"{request_body.type} quote removed from cache: {processed_quote}")
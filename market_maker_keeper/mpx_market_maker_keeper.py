@@ -28,10 +28,10 @@ from market_maker_keeper.order_history_reporter import create_order_history_repo
 from market_maker_keeper.price_feed import PriceFeedFactory
 from market_maker_keeper.reloadable_config import ReloadableConfig
 from market_maker_keeper.spread_feed import create_spread_feed
+from market_maker_keeper.state_reader import StateReader, StateCall
 from market_maker_keeper.util import setup_logging
 from market_maker_keeper.gas import GasPriceFactory
 from pymaker.lifecycle import Lifecycle
-from pymaker.numeric import Wad
 from pyexchange.mpx import MpxApi, MpxPair, Order
 from pymaker.keys import register_keys
 from pymaker import Address
@@ -83,6 +83,9 @@ class MpxMarketMakerKeeper:
         parser.add_argument("--sell-token-address", type=str, required=True,
                             help="Ethereum address of the Sell Token")
 
+        parser.add_argument("--multicall-address", type=str, required=False,
+                            help="Ethereum address of the Multicall contract, used to batch on-chain state reads")
+
         parser.add_argument("--buy-token-address", type=str, required=True,
                             help="Ethereum address of the Buy Token")
 
@@ -103,6 +106,12 @@ class MpxMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -121,6 +130,15 @@ class MpxMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--refresh-frequency", type=int, default=3,
                             help="Order book refresh frequency (in seconds, default: 3)")
 
@@ -138,6 +156,9 @@ class MpxMarketMakerKeeper:
 
         self.token_buy = ERC20Token(web3=self.web3, address=Address(self.arguments.buy_token_address))
         self.token_sell = ERC20Token(web3=self.web3, address=Address(self.arguments.sell_token_address))
+        self.state_reader = StateReader(web3=self.web3,
+                                        multicall_address=Address(self.arguments.multicall_address)
+                                            if self.arguments.multicall_address else None)
 
         self.bands_config = ReloadableConfig(self.arguments.config)
         self.price_max_decimals = None
@@ -198,8 +219,11 @@ class MpxMarketMakerKeeper:
         orders = self.mpx_api.get_orders(self.pair)
         return self.zrx_api.get_orders(self.pair, orders)
 
-    def our_total_balance(self, token: ERC20Token) -> Wad:
-        return token.balance_of(self.our_address)
+    def our_total_balances(self) -> tuple:
+        state = self.state_reader.read({'buy_balance': StateCall.balance_of(self.token_buy.address, self.our_address),
+                                        'sell_balance': StateCall.balance_of(self.token_sell.address, self.our_address)})
+
+        return state['buy_balance'], state['sell_balance']
 
     def our_sell_orders(self, our_orders: list) -> list:
         return list(filter(lambda order: order.is_sell, our_orders))
@@ -212,30 +236,31 @@ class MpxMarketMakerKeeper:
         order_book = self.order_book_manager.get_order_book()
         target_price = self.price_feed.get_price()
 
-        # Cancel orders
-        cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                                      our_sell_orders=self.our_sell_orders(order_book.orders),
-                                                      target_price=target_price)
-        if len(cancellable_orders) > 0:
-            self.order_book_manager.cancel_orders(cancellable_orders)
-            return
-
-        # Do not place new orders if order book state is not confirmed
+        # Do not place new orders if order book state is not confirmed, only cancel orders
         if order_book.orders_being_placed or order_book.orders_being_cancelled:
-            self.logger.debug("Order book is in progress, not placing new orders")
+            cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
+                                                          our_sell_orders=self.our_sell_orders(order_book.orders),
+                                                          target_price=target_price)
+            if len(cancellable_orders) > 0:
+                self.order_book_manager.cancel_orders(cancellable_orders)
+            else:
+                self.logger.debug("Order book is in progress, not placing new orders")
             return
 
-        # In case of MPX, balances returned by `our_total_balance` still contain amounts "locked"
+        # In case of MPX, balances returned by `our_total_balances` still contain amounts "locked"
         # by currently open orders, so we need to explicitly subtract these amounts.
-        our_buy_balance = self.our_total_balance(self.token_buy) - Bands.total_amount(self.our_buy_orders(order_book.orders))
-        our_sell_balance = self.our_total_balance(self.token_sell) - Bands.total_amount(self.our_sell_orders(order_book.orders))
-
-        # Place new orders
-        self.order_book_manager.place_orders(bands.new_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                                              our_sell_orders=self.our_sell_orders(order_book.orders),
-                                                              our_buy_balance=our_buy_balance,
-                                                              our_sell_balance=our_sell_balance,
-                                                              target_price=target_price)[0])
+        our_total_buy_balance, our_total_sell_balance = self.our_total_balances()
+        our_buy_balance = our_total_buy_balance - Bands.total_amount(self.our_buy_orders(order_book.orders))
+        our_sell_balance = our_total_sell_balance - Bands.total_amount(self.our_sell_orders(order_book.orders))
+
+        # Cancel orders and place new ones at the same time
+        orders_to_cancel, new_orders, _, _ = bands.cancel_and_top_up_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
+                                                                            our_sell_orders=self.our_sell_orders(order_book.orders),
+                                                                            our_buy_balance=our_buy_balance,
+                                                                            our_sell_balance=our_sell_balance,
+                                                                            target_price=target_price)
+
+        self.order_book_manager.replace_orders(orders_to_cancel, new_orders)
 
     def place_order_function(self, new_order: NewOrder):
         assert(isinstance(new_order, NewOrder))
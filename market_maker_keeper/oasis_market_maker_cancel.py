@@ -21,6 +21,7 @@ import sys
 
 from web3 import Web3, HTTPProvider
 
+from market_maker_keeper.oasis_order_index import OasisOrderIndex
 from pymaker import Address
 from pymaker.gas import FixedGasPrice, DefaultGasPrice
 from pymaker.keys import register_keys
@@ -40,6 +41,8 @@ class OasisMarketMakerCancel:
         parser.add_argument("--eth-key", type=str, nargs='*', help="Ethereum private key(s) to use")
         parser.add_argument("--oasis-address", help="Ethereum address of the OasisDEX contract", required=True, type=str)
         parser.add_argument("--gas-price", help="Gas price in Wei (default: node default)", default=0, type=int)
+        parser.add_argument("--past-blocks", help="Only look for our orders placed in that many recent blocks, instead of"
+                                                  " scanning the whole order book", default=None, type=int)
         self.arguments = parser.parse_args(args)
 
         self.web3 = kwargs['web3'] if 'web3' in kwargs else Web3(HTTPProvider(endpoint_uri=f"http://{self.arguments.rpc_host}:{self.arguments.rpc_port}",
@@ -52,7 +55,16 @@ class OasisMarketMakerCancel:
         logging.basicConfig(format='%(asctime)-15s %(levelname)-8s %(message)s', level=logging.INFO)
 
     def main(self):
-        self.cancel_orders(self.our_orders(self.otc.get_orders()))
+        if self.arguments.past_blocks is not None:
+            order_index = OasisOrderIndex(otc=self.otc,
+                                          our_address=self.our_address,
+                                          full_scan_function=lambda: self.our_orders(self.otc.get_orders()))
+            order_index.seed_from_events(self.arguments.past_blocks)
+
+            self.cancel_orders(order_index.get_orders())
+
+        else:
+            self.cancel_orders(self.our_orders(self.otc.get_orders()))
 
     def our_orders(self, orders: list):
         return list(filter(lambda order: order.maker == self.our_address, orders))
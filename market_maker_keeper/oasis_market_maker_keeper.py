@@ -25,11 +25,13 @@ from market_maker_keeper.band import Bands, NewOrder
 from market_maker_keeper.control_feed import create_control_feed
 from market_maker_keeper.gas import GasPriceFactory
 from market_maker_keeper.limit import History
+from market_maker_keeper.oasis_order_index import OasisOrderIndex
 from market_maker_keeper.order_book import OrderBookManager
 from market_maker_keeper.order_history_reporter import create_order_history_reporter
 from market_maker_keeper.price_feed import PriceFeedFactory
 from market_maker_keeper.reloadable_config import ReloadableConfig
 from market_maker_keeper.spread_feed import create_spread_feed
+from market_maker_keeper.state_reader import StateReader, StateCall
 from market_maker_keeper.util import setup_logging
 from pymaker import Address
 from pymaker.approval import directly
@@ -41,7 +43,6 @@ from pymaker.oasis import Order, MatchingMarket
 from pymaker.sai import Tub
 from pymaker.token import ERC20Token
 from pymaker.transactional import TxManager
-from pymaker.util import eth_balance
 
 
 class OasisMarketMakerKeeper:
@@ -76,6 +77,9 @@ class OasisMarketMakerKeeper:
         parser.add_argument("--oasis-support-address", type=str, required=False,
                             help="Ethereum address of the OasisDEX support contract")
 
+        parser.add_argument("--multicall-address", type=str, required=False,
+                            help="Ethereum address of the Multicall contract, used to batch on-chain state reads")
+
         parser.add_argument("--buy-token-address", type=str, required=True,
                             help="Ethereum address of the buy token")
 
@@ -103,6 +107,15 @@ class OasisMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
+        parser.add_argument("--price-feed-cache-ttl", type=int, default=60,
+                            help="Maximum time between refreshes of the on-chain price feed (in seconds, default: 60)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -121,6 +134,15 @@ class OasisMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--round-places", type=int, default=2,
                             help="Number of decimal places to round order prices to (default=2)")
 
@@ -162,6 +184,9 @@ class OasisMarketMakerKeeper:
         self.buy_token = Token(name=self.arguments.buy_token_name, address=Address(self.arguments.buy_token_address), decimals=self.arguments.buy_token_decimals)
         self.sell_token = Token(name=self.arguments.sell_token_name, address=Address(self.arguments.sell_token_address), decimals=self.arguments.sell_token_decimals)
         self.min_eth_balance = Wad.from_number(self.arguments.min_eth_balance)
+        self.state_reader = StateReader(web3=self.web3,
+                                        multicall_address=Address(self.arguments.multicall_address)
+                                            if self.arguments.multicall_address else None)
         self.bands_config = ReloadableConfig(self.arguments.config)
         self.gas_price = GasPriceFactory().create_gas_price(self.arguments)
         self.price_feed = PriceFeedFactory().create_price_feed(self.arguments, tub)
@@ -170,6 +195,10 @@ class OasisMarketMakerKeeper:
         self.order_history_reporter = create_order_history_reporter(self.arguments)
 
         self.history = History()
+        self.order_index = OasisOrderIndex(otc=self.otc,
+                                           our_address=self.our_address,
+                                           full_scan_function=self.all_orders,
+                                           order_filter=self.is_our_pair)
         self.order_book_manager = OrderBookManager(refresh_frequency=self.arguments.refresh_frequency)
         self.order_book_manager.get_orders_with(lambda: self.our_orders())
         self.order_book_manager.place_orders_with(self.place_order_function)
@@ -194,16 +223,28 @@ class OasisMarketMakerKeeper:
         """Approve OasisDEX to access our balances, so we can place orders."""
         self.otc.approve([self.token_sell, self.token_buy], directly(gas_price=self.gas_price))
 
-    def our_available_balance(self, token: ERC20Token) -> Wad:
-        if token.symbol() == self.buy_token.name:
-            return self.buy_token.normalize_amount(token.balance_of(self.our_address))
+    def our_available_balance(self, token: ERC20Token, balance: Wad) -> Wad:
+        if token.address == self.token_buy.address:
+            return self.buy_token.normalize_amount(balance)
         else:
-            return self.sell_token.normalize_amount(token.balance_of(self.our_address))
+            return self.sell_token.normalize_amount(balance)
+
+    def read_state(self):
+        """Reads all on-chain state needed by `synchronize_orders` in one round-trip, from the same block."""
+        return self.state_reader.read({'is_closed': StateCall.call(self.otc.address, 'isClosed()', 'bool'),
+                                       'eth_balance': StateCall.eth_balance(self.our_address),
+                                       'buy_balance': StateCall.balance_of(self.token_buy.address, self.our_address),
+                                       'sell_balance': StateCall.balance_of(self.token_sell.address, self.our_address)})
+
+    def all_orders(self):
+        return self.otc.get_orders(self.sell_token, self.buy_token) + \
+               self.otc.get_orders(self.buy_token, self.sell_token)
+
+    def is_our_pair(self, order) -> bool:
+        return len(self.our_sell_orders([order]) + self.our_buy_orders([order])) > 0
 
     def our_orders(self):
-        return list(filter(lambda order: order.maker == self.our_address,
-                           self.otc.get_orders(self.sell_token, self.buy_token) +
-                           self.otc.get_orders(self.buy_token, self.sell_token)))
+        return self.order_index.get_orders()
 
     def our_sell_orders(self, our_orders: list):
         return list(filter(lambda order: order.buy_token == self.token_buy.address and
@@ -214,8 +255,10 @@ class OasisMarketMakerKeeper:
                                          order.pay_token == self.token_buy.address, our_orders))
 
     def synchronize_orders(self):
+        state = self.read_state()
+
         # If market is closed, cancel all orders but do not terminate the keeper.
-        if self.otc.is_closed():
+        if state['is_closed']:
             self.logger.warning("Market is closed. Cancelling all orders.")
             self.order_book_manager.cancel_all_orders()
             return
@@ -223,7 +266,7 @@ class OasisMarketMakerKeeper:
         # If keeper balance is below `--min-eth-balance`, cancel all orders but do not terminate
         # the keeper, keep processing blocks as the moment the keeper gets a top-up it should
         # resume activity straight away, without the need to restart it.
-        if eth_balance(self.web3, self.our_address) < self.min_eth_balance:
+        if state['eth_balance'] < self.min_eth_balance:
             self.logger.warning("Keeper ETH balance below minimum. Cancelling all orders.")
             self.order_book_manager.cancel_all_orders()
             return
@@ -231,28 +274,28 @@ class OasisMarketMakerKeeper:
         bands = Bands.read(self.bands_config, self.spread_feed, self.control_feed, self.history)
         order_book = self.order_book_manager.get_order_book()
         target_price = self.price_feed.get_price()
-        # Cancel orders
-        cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                                      our_sell_orders=self.our_sell_orders(order_book.orders),
-                                                      target_price=target_price)
-        if len(cancellable_orders) > 0:
-            self.order_book_manager.cancel_orders(cancellable_orders)
-            return
-
-        # Do not place new orders if other new orders are being placed. In contrary to other keepers,
-        # we allow placing new orders when other orders are being cancelled. This is because Ethereum
-        # transactions are ordered so we are sure that the order placement will not 'overtake'
-        # order cancellation.
+        # Do not place new orders if other new orders are being placed, only cancel orders. In contrary
+        # to other keepers, we allow placing new orders when other orders are being cancelled. This is
+        # because Ethereum transactions are ordered so we are sure that the order placement will not
+        # 'overtake' order cancellation.
         if order_book.orders_being_placed:
-            self.logger.debug("Other orders are being placed, not placing new orders")
+            cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
+                                                          our_sell_orders=self.our_sell_orders(order_book.orders),
+                                                          target_price=target_price)
+            if len(cancellable_orders) > 0:
+                self.order_book_manager.cancel_orders(cancellable_orders)
+            else:
+                self.logger.debug("Other orders are being placed, not placing new orders")
             return
 
-        # Place new orders
-        self.order_book_manager.place_orders(bands.new_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                                              our_sell_orders=self.our_sell_orders(order_book.orders),
-                                                              our_buy_balance=self.our_available_balance(self.token_buy),
-                                                              our_sell_balance=self.our_available_balance(self.token_sell),
-                                                              target_price=target_price)[0])
+        # Cancel orders and place new ones at the same time
+        orders_to_cancel, new_orders, _, _ = bands.cancel_and_top_up_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
+                                                                            our_sell_orders=self.our_sell_orders(order_book.orders),
+                                                                            our_buy_balance=self.our_available_balance(self.token_buy, state['buy_balance']),
+                                                                            our_sell_balance=self.our_available_balance(self.token_sell, state['sell_balance']),
+                                                                            target_price=target_price)
+
+        self.order_book_manager.replace_orders(orders_to_cancel, new_orders)
 
     def place_order_function(self, new_order: NewOrder):
         assert(isinstance(new_order, NewOrder))
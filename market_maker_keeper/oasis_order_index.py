@@ -0,0 +1,131 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+
+from pymaker import Address
+from pymaker.numeric import Wad
+from pymaker.oasis import MatchingMarket
+
+
+class OasisOrderIndex:
+    """Keeps track of our own open orders on OasisDEX without downloading the whole order book.
+
+    The index gets seeded once, either by scanning the whole order book (`full_scan_function`) or
+    from past `LogMake` events. From then on, each `get_orders()` call only looks at `LogMake`,
+    `LogKill` and `LogTake` events emitted for our orders since the previous call, and re-reads only
+    the orders mentioned in them. So the cost of a refresh depends on our activity since the last
+    block, not on the number of orders other makers have placed.
+
+    As the chain may reorganize, events from the last `reorg_margin` blocks are always looked at again.
+    If fetching events fails for whatever reason, the index gets rebuilt with a full scan.
+
+    Attributes:
+        otc: The `MatchingMarket` contract.
+        our_address: Address of the maker whose orders are being tracked.
+        full_scan_function: Function returning all our open orders, used to seed (and rebuild) the index.
+        order_filter: Optional function deciding which orders should be tracked (i.e. only one pair).
+        reorg_margin: Number of blocks for which events get looked at again on each refresh.
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, otc: MatchingMarket, our_address: Address, full_scan_function, order_filter=None, reorg_margin: int = 12):
+        assert(isinstance(otc, MatchingMarket))
+        assert(isinstance(our_address, Address))
+        assert(callable(full_scan_function))
+        assert(callable(order_filter) or order_filter is None)
+        assert(isinstance(reorg_margin, int))
+
+        self.otc = otc
+        self.our_address = our_address
+        self.full_scan_function = full_scan_function
+        self.order_filter = order_filter if order_filter is not None else lambda order: True
+        self.reorg_margin = reorg_margin
+
+        self._orders = {}
+        self._last_block_number = None
+        self._lock = threading.Lock()
+
+    def _is_ours(self, order) -> bool:
+        return order is not None \
+               and order.maker == self.our_address \
+               and order.pay_amount > Wad(0) \
+               and self.order_filter(order)
+
+    def _full_scan(self, block_number: int):
+        self._orders = {order.order_id: order for order in self.full_scan_function() if self._is_ours(order)}
+        self._last_block_number = block_number
+
+        self.logger.debug(f"Rebuilt the OasisDEX order index with a full scan (orders: {list(self._orders.keys())})")
+
+    def _order_ids_changed_since(self, number_of_past_blocks: int) -> set:
+        event_filter = {'maker': self.our_address.address}
+
+        return set(map(lambda event: event.order_id, self.otc.past_make(number_of_past_blocks, event_filter))) | \
+               set(map(lambda event: event.order_id, self.otc.past_kill(number_of_past_blocks, event_filter))) | \
+               set(map(lambda event: event.order_id, self.otc.past_take(number_of_past_blocks, event_filter)))
+
+    def _apply_changes(self, order_ids: set):
+        for order_id in order_ids:
+            order = self.otc.get_order(order_id)
+
+            if self._is_ours(order):
+                self._orders[order_id] = order
+            else:
+                self._orders.pop(order_id, None)
+
+    def seed_from_events(self, number_of_past_blocks: int):
+        """Seeds the index from `LogMake` events from the last `number_of_past_blocks` blocks.
+
+        Orders placed before that will not be known to the index, so this should only be used
+        if we know there were no such orders, or if missing them is not a problem.
+        """
+        assert(isinstance(number_of_past_blocks, int))
+
+        with self._lock:
+            block_number = self.otc.web3.eth.blockNumber
+
+            self._orders = {}
+            self._apply_changes(self._order_ids_changed_since(number_of_past_blocks))
+            self._last_block_number = block_number
+
+    def get_orders(self) -> list:
+        """Returns all our open orders, only processing events since the last call."""
+        with self._lock:
+            block_number = self.otc.web3.eth.blockNumber
+
+            if self._last_block_number is None:
+                self._full_scan(block_number)
+
+            else:
+                try:
+                    number_of_past_blocks = block_number - self._last_block_number + self.reorg_margin
+                    self._apply_changes(self._order_ids_changed_since(number_of_past_blocks))
+                    self._last_block_number = block_number
+
+                except Exception as e:
+                    self.logger.warning(f"Failed to update the OasisDEX order index from events ({e}), doing a full scan")
+                    self._full_scan(block_number)
+
+            return list(self._orders.values())
+
+    def reset(self):
+        """Makes the index rebuild itself with a full scan on the next `get_orders()` call."""
+        with self._lock:
+            self._last_block_number = None
@@ -99,6 +99,7 @@ class OrderBookManager:
         self.get_orders_function = None
         self.get_balances_function = None
         self.place_order_function = None
+        self.place_orders_function = None
         self.cancel_order_function = None
         self.order_history_reporter = None
         self.buy_filter_function = None
@@ -147,6 +148,22 @@ class OrderBookManager:
 
         self.place_order_function = place_order_function
 
+    def place_orders_in_batches_with(self, place_orders_function):
+        """Configures the function used to place a whole batch of new orders at once.
+
+        If configured, it is used by `place_orders()` and `replace_orders()` instead of the function
+        configured with `place_orders_with()`, which lets the keeper process all new orders concurrently
+        or submit them using a bulk endpoint of the exchange.
+
+        Args:
+            place_orders_function: The function which will be called with a list of new orders to place.
+                It has to return a list of placed orders, with `None` in place of orders which have not
+                been placed.
+        """
+        assert(callable(place_orders_function))
+
+        self.place_orders_function = place_orders_function
+
     def cancel_orders_with(self, cancel_order_function):
         """Configures the function used to cancel orders.
 
@@ -241,15 +258,14 @@ class OrderBookManager:
             new_orders: List of new orders to place.
         """
         assert(isinstance(new_orders, list))
-        assert(callable(self.place_order_function))
+        assert(callable(self.place_order_function) or callable(self.place_orders_function))
 
         with self._lock:
             self._currently_placing_orders += len(new_orders)
 
         self._report_order_book_updated()
 
-        for new_order in new_orders:
-            self._executor.submit(self._thread_place_order(partial(self.place_order_function, new_order)))
+        self._submit_new_orders(new_orders)
 
     def cancel_orders(self, orders: list):
         """Cancels existing orders. Order cancellation will happen in a background thread.
@@ -278,7 +294,7 @@ class OrderBookManager:
         """
         assert(isinstance(orders, list))
         assert(isinstance(new_orders, list))
-        assert(callable(self.place_order_function))
+        assert(callable(self.place_order_function) or callable(self.place_orders_function))
         assert(callable(self.cancel_order_function))
 
         with self._lock:
@@ -292,8 +308,7 @@ class OrderBookManager:
         for order in orders:
             self._executor.submit(self._thread_cancel_order(order.order_id, partial(self.cancel_order_function, order)))
 
-        for new_order in new_orders:
-            self._executor.submit(self._thread_place_order(partial(self.place_order_function, new_order)))
+        self._submit_new_orders(new_orders)
 
     def cancel_all_orders(self, final_wait_time: int = None):
         # Cancel all orders straight away, repeat until the internal order book state confirms
@@ -369,6 +384,15 @@ class OrderBookManager:
                 break
             time.sleep(0.1)
 
+    def _submit_new_orders(self, new_orders: list):
+        if self.place_orders_function is not None:
+            if len(new_orders) > 0:
+                self._executor.submit(self._thread_place_orders(partial(self.place_orders_function, new_orders), len(new_orders)))
+
+        else:
+            for new_order in new_orders:
+                self._executor.submit(self._thread_place_order(partial(self.place_order_function, new_order)))
+
     def _report_order_book_updated(self):
         if self.on_update_function is not None:
             self.on_update_function()
@@ -381,7 +405,7 @@ class OrderBookManager:
                     orders_already_placed_before = set(self._orders_placed)
 
                 # get orders, get balances
-                orders = self.get_orders_function()
+                orders = self._fetch_orders()
                 balances = self.get_balances_function() if self.get_balances_function is not None else None
 
                 if self.order_history_reporter:
@@ -410,6 +434,9 @@ class OrderBookManager:
 
             time.sleep(self.refresh_frequency)
 
+    def _fetch_orders(self) -> list:
+        return self.get_orders_function()
+
     def _thread_place_order(self, place_order_function):
         assert(callable(place_order_function))
 
@@ -430,6 +457,26 @@ class OrderBookManager:
 
         return func
 
+    def _thread_place_orders(self, place_orders_function, number_of_orders: int):
+        assert(callable(place_orders_function))
+        assert(isinstance(number_of_orders, int))
+
+        def func():
+            try:
+                new_orders = place_orders_function()
+
+                with self._lock:
+                    self._orders_placed.extend(filter(lambda new_order: new_order is not None, new_orders))
+            except BaseException as exception:
+                self.logger.exception(exception)
+            finally:
+                with self._lock:
+                    self._currently_placing_orders -= number_of_orders
+
+                self._report_order_book_updated()
+
+        return func
+
     def _thread_cancel_order(self, order_id, cancel_order_function):
         assert(callable(cancel_order_function))
 
@@ -15,29 +15,85 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import gzip
+import json
 import logging
+import os
 import threading
-
 import time
+from collections import Counter, deque
 from typing import Optional
 
 import requests
 
 from market_maker_keeper.util import sanitize_url
+from pymaker.numeric import Wad
 
 
 class OrderHistoryReporter:
+    """Reports our open orders to an HTTP endpoint, at most once every `frequency` seconds.
+
+    Reports are sent by one background thread over a keep-alive session, so `report_orders()` never
+    blocks the keeper and slow endpoints cannot make threads pile up. Reports waiting to be sent are
+    kept in a queue of at most `queue_size` entries. If the sender falls behind, the oldest pending
+    reports get superseded by newer ones, as each of them is a full snapshot of our orders anyway.
+
+    If `spool_directory` is specified, reports which could not be delivered (and all following ones,
+    so the order is preserved) get written there and are replayed once the endpoint is back. At most
+    `spool_size` reports are kept on disk, the oldest ones get discarded first.
+
+    If `full_every` is greater than zero, reports only contain orders added and removed since the last
+    report acknowledged by the endpoint (`"type": "delta"`, with `"since"` being the timestamp of that
+    report). A full snapshot (`"type": "full"`) gets sent every `full_every` seconds, and whenever the
+    previous report has not been acknowledged. Orders are compared by their raw amounts and prices,
+    so only the added ones need to be converted to strings.
+
+    Attributes:
+        endpoint: URL of the endpoint to report orders to.
+        frequency: Minimum interval between two reports (in seconds).
+        gzip: Whether reports should be sent gzip-compressed.
+        spool_directory: Optional directory to spool undelivered reports to.
+        queue_size: Maximum number of reports waiting to be sent.
+        spool_size: Maximum number of reports kept in the spool directory.
+        full_every: Frequency of sending full snapshots in delta mode (in seconds), 0 disables delta mode.
+    """
 
     logger = logging.getLogger()
 
-    def __init__(self, endpoint: str, frequency: int):
+    def __init__(self, endpoint: str, frequency: int, gzip: bool = False, spool_directory: Optional[str] = None,
+                 queue_size: int = 10, spool_size: int = 10000, full_every: int = 0):
         assert(isinstance(endpoint, str))
         assert(isinstance(frequency, int))
+        assert(isinstance(gzip, bool))
+        assert(isinstance(spool_directory, str) or spool_directory is None)
+        assert(isinstance(queue_size, int))
+        assert(isinstance(spool_size, int))
+        assert(isinstance(full_every, int))
 
         self.endpoint = endpoint
         self.sanitized_endpoint = sanitize_url(endpoint)
         self.frequency = frequency
+        self.gzip = gzip
+        self.spool_directory = spool_directory
+        self.queue_size = queue_size
+        self.spool_size = spool_size
+        self.full_every = full_every
         self._last_reported = 0
+        self._spool_counter = 0
+
+        # last snapshot acknowledged by the endpoint, deltas are calculated against it
+        self._acknowledged = None
+        self._acknowledged_timestamp = None
+        self._last_full_timestamp = 0.0
+
+        if self.spool_directory is not None:
+            os.makedirs(self.spool_directory, exist_ok=True)
+
+        self._session = requests.Session()
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+        threading.Thread(target=self._background_run, daemon=True).start()
 
     def report_orders(self, our_buy_orders: list, our_sell_orders: list):
         assert(isinstance(our_buy_orders, list))
@@ -48,42 +104,166 @@ class OrderHistoryReporter:
 
         self._last_reported = time.time()
 
-        threading.Thread(target=self._thread_report_function(time.time(), our_buy_orders, our_sell_orders), daemon=True).start()
+        with self._condition:
+            if len(self._queue) >= self.queue_size:
+                self._queue.popleft()
+                self.logger.warning(f"Reporting orders to '{self.sanitized_endpoint}' is falling behind,"
+                                    f" discarding the oldest pending report")
+
+            self._queue.append((time.time(), list(our_buy_orders), list(our_sell_orders)))
+            self._condition.notify()
+
+    @staticmethod
+    def _snapshot(buy_orders: list, sell_orders: list) -> Counter:
+        return Counter([("buy", order.remaining_buy_amount.value, order.sell_to_buy_price.value) for order in buy_orders] +
+                       [("sell", order.remaining_sell_amount.value, order.buy_to_sell_price.value) for order in sell_orders])
 
-    def _thread_report_function(self, timestamp: float, buy_orders: list, sell_orders: list):
+    @staticmethod
+    def _orders(snapshot: Counter) -> list:
+        return [{
+            "amount": str(Wad(amount)),
+            "price": str(Wad(price)),
+            "type": order_type
+        } for order_type, amount, price in snapshot.elements()]
+
+    def _record(self, timestamp: float, buy_orders: list, sell_orders: list) -> (dict, Counter):
         assert(isinstance(timestamp, float))
         assert(isinstance(buy_orders, list))
         assert(isinstance(sell_orders, list))
 
-        orders = list(map(lambda order: {
-            "amount": str(order.remaining_buy_amount),
-            "price": str(order.sell_to_buy_price),
-            "type": "buy"
-        }, buy_orders)) + list(map(lambda order: {
-            "amount": str(order.remaining_sell_amount),
-            "price": str(order.buy_to_sell_price),
-            "type": "sell"
-        }, sell_orders))
-
-        record = {
+        snapshot = self._snapshot(buy_orders, sell_orders)
+
+        if self.full_every <= 0:
+            return {
+                "timestamp": timestamp,
+                "orders": self._orders(snapshot)
+            }, snapshot
+
+        if self._acknowledged is None or timestamp - self._last_full_timestamp >= self.full_every:
+            self._last_full_timestamp = timestamp
+
+            return {
+                "timestamp": timestamp,
+                "type": "full",
+                "orders": self._orders(snapshot)
+            }, snapshot
+
+        return {
             "timestamp": timestamp,
-            "orders": orders
-        }
+            "type": "delta",
+            "since": self._acknowledged_timestamp,
+            "added": self._orders(snapshot - self._acknowledged),
+            "removed": self._orders(self._acknowledged - snapshot)
+        }, snapshot
+
+    def _body(self, record: dict) -> bytes:
+        body = json.dumps(record).encode('utf-8')
+        return gzip.compress(body) if self.gzip else body
+
+    def _post(self, body: bytes, compressed: bool) -> str:
+        """Sends one report. Returns `delivered`, `rejected` or `failed` (meaning it should be retried later)."""
+        headers = {'Content-Type': 'application/json'}
+        if compressed:
+            headers['Content-Encoding'] = 'gzip'
+
+        try:
+            result = self._session.post(url=self.endpoint, data=body, headers=headers, timeout=15.5)
+
+        except Exception as e:
+            self.logger.warning(f"Failed to report orders to '{self.sanitized_endpoint}': {e}")
+            return 'failed'
+
+        if result.ok:
+            self.logger.debug(f"Successfully reported orders to '{self.sanitized_endpoint}'")
+            return 'delivered'
+
+        self.logger.warning(f"Failed to report orders to '{self.sanitized_endpoint}': {result.status_code} {result.text}")
+
+        # the endpoint rejecting a report is not going to change its mind, so there is no point in retrying it
+        if 400 <= result.status_code < 500 and result.status_code not in [408, 429]:
+            return 'rejected'
+
+        return 'failed'
+
+    def _spooled_files(self) -> list:
+        if self.spool_directory is None:
+            return []
+
+        return sorted(filename for filename in os.listdir(self.spool_directory) if filename.endswith('.json') or filename.endswith('.json.gz'))
+
+    def _spool(self, body: bytes):
+        if self.spool_directory is None:
+            self.logger.warning(f"Discarding undelivered report to '{self.sanitized_endpoint}'")
+            return
+
+        # file names sort in the order reports were spooled in
+        self._spool_counter += 1
+        filename = os.path.join(self.spool_directory, f"{time.time():017.6f}-{self._spool_counter:09d}.json{'.gz' if self.gzip else ''}")
+        temporary_filename = f"{filename}.tmp"
+
+        with open(temporary_filename, 'wb') as spool_file:
+            spool_file.write(body)
+
+        os.replace(temporary_filename, filename)
+
+        spooled_files = self._spooled_files()
+        for spooled_file in spooled_files[:max(len(spooled_files) - self.spool_size, 0)]:
+            self.logger.warning(f"Spool of reports to '{self.sanitized_endpoint}' is full, discarding '{spooled_file}'")
+            os.remove(os.path.join(self.spool_directory, spooled_file))
+
+    def _replay_spool(self):
+        for spooled_file in self._spooled_files():
+            filename = os.path.join(self.spool_directory, spooled_file)
+
+            with open(filename, 'rb') as spool_file:
+                body = spool_file.read()
+
+            if self._post(body, spooled_file.endswith('.gz')) == 'failed':
+                return
+
+            os.remove(filename)
+            self.logger.info(f"Replayed spooled report '{spooled_file}' to '{self.sanitized_endpoint}'")
+
+    def _next_report(self) -> Optional[tuple]:
+        with self._condition:
+            if len(self._queue) == 0:
+                self._condition.wait(max(self.frequency, 1))
+
+            return self._queue.popleft() if len(self._queue) > 0 else None
+
+    def _background_run(self):
+        while True:
+            try:
+                report = self._next_report()
+
+                if report is not None:
+                    record, snapshot = self._record(*report)
+                    body = self._body(record)
+
+                    # while there are spooled reports, new ones have to wait behind them
+                    status = 'failed' if len(self._spooled_files()) > 0 else self._post(body, self.gzip)
+                    if status == 'failed':
+                        self._spool(body)
 
-        def _func():
-            result = requests.post(url=self.endpoint, json=record, timeout=15.5)
+                    if status == 'delivered':
+                        self._acknowledged = snapshot
+                        self._acknowledged_timestamp = record['timestamp']
+                    else:
+                        self._acknowledged = None
+                        self._acknowledged_timestamp = None
 
-            if result.ok:
-                self.logger.debug(f"Successfully reported {len(orders)} orders to '{self.sanitized_endpoint}'")
-            else:
-                self.logger.warning(f"Failed to report orders to '{self.sanitized_endpoint}': {result.status_code} {result.text}")
+                self._replay_spool()
 
-        return _func
+            except Exception as e:
+                self.logger.exception(f"Unexpected error while reporting orders to '{self.sanitized_endpoint}': {e}")
 
 
 def create_order_history_reporter(arguments) -> Optional[OrderHistoryReporter]:
     if arguments.order_history:
-        return OrderHistoryReporter(arguments.order_history, 30)
+        return OrderHistoryReporter(arguments.order_history, arguments.order_history_every,
+                                    gzip=getattr(arguments, 'order_history_gzip', False),
+                                    spool_directory=getattr(arguments, 'order_history_spool', None),
+                                    full_every=getattr(arguments, 'order_history_full_every', 0))
 
     else:
         return None
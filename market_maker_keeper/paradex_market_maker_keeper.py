@@ -31,6 +31,7 @@ from market_maker_keeper.order_history_reporter import create_order_history_repo
 from market_maker_keeper.price_feed import PriceFeedFactory
 from market_maker_keeper.reloadable_config import ReloadableConfig
 from market_maker_keeper.spread_feed import create_spread_feed
+from market_maker_keeper.state_reader import StateReader, StateCall
 from market_maker_keeper.util import setup_logging
 from pyexchange.paradex import ParadexApi, Order
 from pymaker import Address
@@ -81,6 +82,9 @@ class ParadexMarketMakerKeeper:
         parser.add_argument("--pair", type=str, required=True,
                             help="Token pair (sell/buy) on which the keeper will operate")
 
+        parser.add_argument("--multicall-address", type=str, required=False,
+                            help="Ethereum address of the Multicall contract, used to batch on-chain state reads")
+
         parser.add_argument("--buy-token-address", type=str, required=True,
                             help="Ethereum address of the buy token")
 
@@ -96,6 +100,12 @@ class ParadexMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -114,6 +124,15 @@ class ParadexMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--order-expiry", type=int, required=True,
                             help="Expiration time of created orders (in seconds)")
 
@@ -143,6 +162,9 @@ class ParadexMarketMakerKeeper:
         self.pair = self.arguments.pair.upper()
         self.token_buy = ERC20Token(web3=self.web3, address=Address(self.arguments.buy_token_address))
         self.token_sell = ERC20Token(web3=self.web3, address=Address(self.arguments.sell_token_address))
+        self.state_reader = StateReader(web3=self.web3,
+                                        multicall_address=Address(self.arguments.multicall_address)
+                                            if self.arguments.multicall_address else None)
         self.bands_config = ReloadableConfig(self.arguments.config)
         self.price_max_decimals = None
         self.amount_max_decimals = None
@@ -191,7 +213,10 @@ class ParadexMarketMakerKeeper:
         self.zrx_exchange.approve([self.token_sell, self.token_buy], directly(gas_price=self.gas_price))
 
     def get_balances(self):
-        return self.token_sell.balance_of(self.our_address), self.token_buy.balance_of(self.our_address)
+        state = self.state_reader.read({'sell_balance': StateCall.balance_of(self.token_sell.address, self.our_address),
+                                        'buy_balance': StateCall.balance_of(self.token_buy.address, self.our_address)})
+
+        return state['sell_balance'], state['buy_balance']
 
     def our_total_sell_balance(self, balances) -> Wad:
         return balances[0]
@@ -17,6 +17,7 @@
 
 import json
 import logging
+import re
 import threading
 import time
 from typing import Optional, List
@@ -25,7 +26,7 @@ import websocket
 
 from gdax_client.price import GdaxPriceClient, GDAX_WS_URL
 from market_maker_keeper.feed import ExpiringFeed, WebSocketFeed, Feed
-from market_maker_keeper.setzer import Setzer
+from market_maker_keeper.setzer import SetzerWorker
 from pymaker.feed import DSValue
 from pymaker.numeric import Wad
 from pymaker.sai import Tub
@@ -70,45 +71,157 @@ class TubPriceFeed(PriceFeed):
         return Price(buy_price=tub_price, sell_price=tub_price)
 
 
-class SetzerPriceFeed(PriceFeed):
+class CachedPriceFeed(PriceFeed):
+    """Serves the latest price of an underlying (potentially blocking) price feed from memory.
+
+    The underlying price feed is queried periodically in a background thread, so each `get_price()`
+    call returns immediately. If the last successful refresh happened more than `expiry` seconds ago,
+    the price is considered stale and `None` prices are returned.
+
+    Attributes:
+        price_feed: The underlying price feed.
+        refresh_interval: Frequency (in seconds) of how often the underlying price feed gets queried.
+        expiry: Maximum age (in seconds) of the cached price.
+    """
+
     logger = logging.getLogger()
 
-    def __init__(self, source: str, expiry: int):
-        assert(isinstance(source, str))
+    def __init__(self, price_feed: PriceFeed, refresh_interval: float, expiry: int):
+        assert(isinstance(price_feed, PriceFeed))
+        assert(isinstance(refresh_interval, (int, float)))
         assert(isinstance(expiry, int))
 
-        self.source = source
+        self.price_feed = price_feed
+        self.refresh_interval = refresh_interval
         self.expiry = expiry
-        self._price = None
-        self._retries = 0
-        self._timestamp = 0
-        self._expired = True
+
+        self._price = Price(buy_price=None, sell_price=None)
+        self._timestamp = 0.0
+        self._lock = threading.Lock()
+
         threading.Thread(target=self._background_run, daemon=True).start()
 
-    def _fetch_price(self):
+    def _refresh(self):
         try:
-            self._price = Setzer().price(self.source)
-            self._retries = 0
-            self._timestamp = time.time()
+            price = self.price_feed.get_price()
 
-            self.logger.debug(f"Fetched price from {self.source}: {self._price}")
+            with self._lock:
+                self._price = price
+                self._timestamp = time.time()
+        except Exception as e:
+            self.logger.warning(f"Failed to refresh price from {type(self.price_feed).__name__} ({e})")
 
-            if self._expired:
-                self.logger.info(f"Price feed from 'setzer' ({self.source}) became available")
-                self._expired = False
-        except:
-            self._retries += 1
-            if self._retries > 10:
-                self.logger.warning(f"Failed to get price from 'setzer' ({self.source}), tried {self._retries} times")
-                self.logger.warning(f"Please check if 'setzer' is installed and working correctly")
+    def _background_run(self):
+        while True:
+            self._refresh()
+            time.sleep(self.refresh_interval)
+
+    def get_price(self) -> Price:
+        with self._lock:
+            if time.time() - self._timestamp > self.expiry:
+                return Price(buy_price=None, sell_price=None)
+
+            return self._price
+
+
+class BlockCachedPriceFeed(CachedPriceFeed):
+    """Serves the latest price of an underlying on-chain price feed from memory.
+
+    The underlying price feed only gets queried when a new block arrives, as on-chain values
+    can not change between blocks, or when the cached price becomes older than `ttl` seconds.
+    New blocks are detected by polling a `latest` block filter in a background thread.
+
+    Attributes:
+        price_feed: The underlying price feed.
+        web3: An instance of `Web3` used to watch for new blocks.
+        ttl: Maximum time (in seconds) between two subsequent refreshes of the price.
+        expiry: Maximum age (in seconds) of the cached price.
+    """
+
+    def __init__(self, price_feed: PriceFeed, web3, ttl: int, expiry: int, poll_interval: float = 1):
+        assert(isinstance(ttl, int))
+        assert(isinstance(poll_interval, (int, float)))
+
+        self.web3 = web3
+        self.ttl = ttl
+
+        super().__init__(price_feed=price_feed, refresh_interval=poll_interval, expiry=expiry)
+
+    def _new_block_arrived(self, block_filter) -> bool:
+        return len(block_filter.get_new_entries()) > 0
 
     def _background_run(self):
+        block_filter = None
+
         while True:
-            self._fetch_price()
-            time.sleep(60)
+            try:
+                if block_filter is None:
+                    block_filter = self.web3.eth.filter('latest')
+                    new_block = True
+
+                else:
+                    new_block = self._new_block_arrived(block_filter)
+
+            except Exception as e:
+                self.logger.warning(f"Failed to check for new blocks ({e}), falling back to refreshing every {self.ttl}s")
+                block_filter = None
+                new_block = False
+
+            if new_block or time.time() - self._timestamp >= self.ttl:
+                self._refresh()
+
+            time.sleep(self.refresh_interval)
+
+
+class SetzerPriceFeed(PriceFeed):
+    logger = logging.getLogger()
+
+    _default_worker = None
+    _default_worker_lock = threading.Lock()
+    _default_worker_interval = 60
+    _default_worker_jitter = 5.0
+
+    def __init__(self, source: str, expiry: int, worker: Optional[SetzerWorker] = None):
+        assert(isinstance(source, str))
+        assert(isinstance(expiry, int))
+        assert(isinstance(worker, SetzerWorker) or worker is None)
+
+        self.source = source
+        self.expiry = expiry
+        self.worker = worker if worker is not None else self._get_default_worker()
+        self._expired = True
+
+        self.worker.add_source(source)
+
+    @classmethod
+    def configure_default_worker(cls, interval: int, jitter: float):
+        """Sets the polling cadence of the worker shared by all setzer price feeds."""
+        assert(isinstance(interval, int))
+        assert(isinstance(jitter, (int, float)))
+
+        with cls._default_worker_lock:
+            cls._default_worker_interval = interval
+            cls._default_worker_jitter = jitter
+
+            # the worker reads both of them before each wait, so it picks them up from its next refresh
+            if cls._default_worker is not None:
+                cls._default_worker.interval = interval
+                cls._default_worker.jitter = jitter
+
+    @classmethod
+    def _get_default_worker(cls) -> SetzerWorker:
+        # All setzer price feeds share one worker by default, so sources get fetched together
+        # instead of each price feed running its own background thread.
+        with cls._default_worker_lock:
+            if cls._default_worker is None:
+                cls._default_worker = SetzerWorker(interval=cls._default_worker_interval, jitter=cls._default_worker_jitter)
+
+            return cls._default_worker
 
     def get_price(self) -> Price:
-        if time.time() - self._timestamp > self.expiry:
+        price, timestamp = self.worker.get(self.source)
+
+        if time.time() - timestamp > self.expiry:
             if not self._expired:
                 self.logger.warning(f"Price feed from 'setzer' ({self.source}) has expired")
                 self._expired = True
@@ -116,8 +229,11 @@ class SetzerPriceFeed(PriceFeed):
             return Price(buy_price=None, sell_price=None)
 
         else:
-            value = self._price
-            return Price(buy_price=value, sell_price=value)
+            if self._expired:
+                self.logger.info(f"Price feed from 'setzer' ({self.source}) became available")
+                self._expired = False
+
+            return Price(buy_price=price, sell_price=price)
 
 
 class GdaxPriceFeed(PriceFeed):
@@ -246,17 +362,235 @@ class BackupPriceFeed(PriceFeed):
         return Price(buy_price=None, sell_price=None)
 
 
+class AggregatedPriceFeed(PriceFeed):
+    """Combines prices of multiple price feeds into one, rejecting outliers.
+
+    Each of the underlying price feeds is polled in its own background thread, and the time at
+    which it returned its price is recorded together with it. A separate background thread
+    recalculates the aggregated price every `refresh_interval` seconds, so `get_price()` just
+    returns the last calculated value. Before aggregating, all prices which deviate from the median
+    by more than `max_deviation` (i.e. 0.05 for 5%) get rejected.
+
+    As soon as a price feed stops returning a price, it is no longer taken into account, as the
+    underlying price feeds already apply their own expiry. The weight of each price decreases
+    linearly with the time since its price feed has returned it, so a price feed which blocks
+    gets less and less influence (without holding up the other ones), and none at all after
+    `expiry` seconds. Supported aggregation methods:
+    * `median` - weighted median of the prices,
+    * `trimmed-mean` - weighted mean of the prices,
+    * `vwap` - weighted mean of the prices, with each price feed weighted by its volume
+      (specified statically in `volumes`) in addition to its freshness.
+
+    Attributes:
+        feeds: List of underlying price feeds.
+        method: Aggregation method, one of `median`, `trimmed-mean` or `vwap`.
+        max_deviation: Maximum relative deviation from the median above which prices get rejected.
+        expiry: Maximum time (in seconds) since the price of each price feed has been returned.
+        volumes: Optional volume weights of each of the price feeds.
+        refresh_interval: Frequency (in seconds) of polling the price feeds and recalculating the price.
+    """
+
+    logger = logging.getLogger()
+
+    METHODS = ['median', 'trimmed-mean', 'vwap']
+
+    def __init__(self, feeds: List[PriceFeed], method: str, max_deviation: float, expiry: int,
+                 volumes: Optional[List[float]] = None, refresh_interval: float = 1):
+        assert(isinstance(feeds, list))
+        assert(method in self.METHODS)
+        assert(isinstance(max_deviation, float))
+        assert(isinstance(expiry, int))
+        assert(isinstance(volumes, list) or volumes is None)
+        assert(isinstance(refresh_interval, (int, float)))
+
+        self.feeds = feeds
+        self.method = method
+        self.max_deviation = max_deviation
+        self.expiry = expiry
+        self.volumes = volumes if volumes is not None else [1.0] * len(feeds)
+        self.refresh_interval = refresh_interval
+
+        assert(len(self.volumes) == len(self.feeds))
+
+        # for each feed, the last buy and sell prices along with the time the feed returned them
+        self._buy_prices = [(None, 0.0)] * len(feeds)
+        self._sell_prices = [(None, 0.0)] * len(feeds)
+        self._price = Price(buy_price=None, sell_price=None)
+        self._lock = threading.Lock()
+
+        for index, feed in enumerate(feeds):
+            threading.Thread(target=self._poll_run, args=(index, feed), daemon=True).start()
+
+        threading.Thread(target=self._background_run, daemon=True).start()
+
+    @staticmethod
+    def _observe(observed: list, index: int, price: Optional[Wad], timestamp: float):
+        # the underlying price feed expires its prices itself, so we forget a price as soon as it is gone
+        observed[index] = (price, timestamp) if price is not None else (None, 0.0)
+
+    def _weighted_prices(self, observed: list, now: float) -> list:
+        result = []
+        for (price, timestamp), volume in zip(observed, self.volumes):
+            age = now - timestamp
+            if price is not None and age < self.expiry:
+                weight = (1.0 - age / self.expiry) * volume
+                if weight > 0:
+                    result.append((price, weight))
+
+        return result
+
+    @staticmethod
+    def _weighted_median(weighted_prices: list) -> Wad:
+        weighted_prices = sorted(weighted_prices, key=lambda item: item[0])
+        half_weight = sum(weight for _, weight in weighted_prices) / 2
+
+        cumulative_weight = 0.0
+        for price, weight in weighted_prices:
+            cumulative_weight += weight
+            if cumulative_weight >= half_weight:
+                return price
+
+        return weighted_prices[-1][0]
+
+    @staticmethod
+    def _weighted_mean(weighted_prices: list) -> Wad:
+        total_weight = sum(weight for _, weight in weighted_prices)
+        total = sum((price * Wad.from_number(weight) for price, weight in weighted_prices), Wad(0))
+
+        return total / Wad.from_number(total_weight)
+
+    def _aggregate(self, weighted_prices: list) -> Optional[Wad]:
+        if len(weighted_prices) == 0:
+            return None
+
+        median = self._weighted_median(weighted_prices)
+        max_deviation = median * Wad.from_number(self.max_deviation)
+
+        accepted = [(price, weight) for price, weight in weighted_prices
+                    if abs(price - median) <= max_deviation]
+
+        rejected = len(weighted_prices) - len(accepted)
+        if rejected > 0:
+            self.logger.debug(f"Rejected {rejected} price(s) deviating more than {self.max_deviation} from {median}")
+
+        if self.method == 'median':
+            return self._weighted_median(accepted)
+
+        else:
+            return self._weighted_mean(accepted)
+
+    def _poll(self, index: int, feed: PriceFeed):
+        try:
+            price = feed.get_price()
+        except Exception as e:
+            self.logger.warning(f"Failed to get price from {type(feed).__name__} ({e})")
+            price = Price(buy_price=None, sell_price=None)
+
+        timestamp = time.time()
+
+        with self._lock:
+            self._observe(self._buy_prices, index, price.buy_price, timestamp)
+            self._observe(self._sell_prices, index, price.sell_price, timestamp)
+
+    def _poll_run(self, index: int, feed: PriceFeed):
+        while True:
+            self._poll(index, feed)
+            time.sleep(self.refresh_interval)
+
+    def _refresh(self):
+        # prices age even if they do not change, so the aggregated price gets recalculated every time
+        now = time.time()
+
+        with self._lock:
+            weighted_buy_prices = self._weighted_prices(self._buy_prices, now)
+            weighted_sell_prices = self._weighted_prices(self._sell_prices, now)
+
+        price = Price(buy_price=self._aggregate(weighted_buy_prices),
+                      sell_price=self._aggregate(weighted_sell_prices))
+
+        with self._lock:
+            self._price = price
+
+    def _background_run(self):
+        while True:
+            self._refresh()
+            time.sleep(self.refresh_interval)
+
+    def get_price(self) -> Price:
+        with self._lock:
+            return self._price
+
+
 class PriceFeedFactory:
+    _price_feeds = {}
+    _price_feeds_lock = threading.RLock()
+
     @staticmethod
     def create_price_feed(arguments, tub: Tub = None) -> PriceFeed:
-        return BackupPriceFeed([PriceFeedFactory._create_price_feed(price_feed, arguments.price_feed_expiry, tub)
+        price_feed_cache_ttl = getattr(arguments, 'price_feed_cache_ttl', 60)
+
+        SetzerPriceFeed.configure_default_worker(interval=getattr(arguments, 'setzer_interval', 60),
+                                                 jitter=getattr(arguments, 'setzer_jitter', 5.0))
+
+        return BackupPriceFeed([PriceFeedFactory._create_price_feed(price_feed, arguments.price_feed_expiry, tub, price_feed_cache_ttl)
                                 for price_feed in arguments.price_feed.split(",")])
 
     @staticmethod
-    def _create_price_feed(price_feed_argument: str, price_feed_expiry_argument: int, tub: Optional[Tub]):
+    def _create_aggregated_price_feed(price_feed_argument: str, price_feed_expiry_argument: int, tub: Optional[Tub], price_feed_cache_ttl_argument: int):
+        # Aggregated price feeds look like `median:eth_dai|eth_dai-pair|ws://...`, the maximum deviation
+        # can be specified in parentheses, i.e. `median(0.02):...`. For `vwap`, each of the price feeds
+        # can be followed by its volume weight, i.e. `vwap(0.02):eth_dai*3|eth_dai-pair*1`.
+        match = re.match(r"^(median|trimmed-mean|vwap)(?:\((\d*\.?\d+)\))?:(.+)$", price_feed_argument)
+        if match is None:
+            raise Exception(f"'--price-feed {price_feed_argument}' is not a valid aggregated price feed")
+
+        method, max_deviation, sources = match.group(1), match.group(2), match.group(3)
+
+        feeds = []
+        volumes = []
+        for source in sources.split("|"):
+            weight_match = re.match(r"^(.+)\*(\d*\.?\d+)$", source)
+            if weight_match and method == 'vwap':
+                source, volume = weight_match.group(1), float(weight_match.group(2))
+            else:
+                volume = 1.0
+
+            feeds.append(PriceFeedFactory._create_price_feed(source, price_feed_expiry_argument, tub, price_feed_cache_ttl_argument))
+            volumes.append(volume)
+
+        return AggregatedPriceFeed(feeds=feeds,
+                                   method=method,
+                                   max_deviation=float(max_deviation) if max_deviation is not None else 0.05,
+                                   expiry=price_feed_expiry_argument,
+                                   volumes=volumes)
+
+    @staticmethod
+    def _create_price_feed(price_feed_argument: str, price_feed_expiry_argument: int, tub: Optional[Tub], price_feed_cache_ttl_argument: int = 60):
         assert(isinstance(price_feed_argument, str))
         assert(isinstance(price_feed_expiry_argument, int))
         assert(isinstance(tub, Tub) or tub is None)
+        assert(isinstance(price_feed_cache_ttl_argument, int))
+
+        # Price feeds usually keep their own WebSocket connections or background threads, so identical
+        # ones (i.e. `eth_dai-pair` and the one underlying `dai_eth-pair`, or the same price feed used
+        # by multiple markets) get created only once per process and are shared afterwards. They get created
+        # while holding the (reentrant) lock, so no duplicate ever gets started only to be thrown away.
+        key = (price_feed_argument, price_feed_expiry_argument, price_feed_cache_ttl_argument,
+               tub.address if tub is not None else None)
+
+        with PriceFeedFactory._price_feeds_lock:
+            if key not in PriceFeedFactory._price_feeds:
+                PriceFeedFactory._price_feeds[key] = PriceFeedFactory._new_price_feed(price_feed_argument,
+                                                                                      price_feed_expiry_argument,
+                                                                                      tub,
+                                                                                      price_feed_cache_ttl_argument)
+
+            return PriceFeedFactory._price_feeds[key]
+
+    @staticmethod
+    def _new_price_feed(price_feed_argument: str, price_feed_expiry_argument: int, tub: Optional[Tub], price_feed_cache_ttl_argument: int):
+        if re.match(r"^(median|trimmed-mean|vwap)(\(|:)", price_feed_argument):
+            return PriceFeedFactory._create_aggregated_price_feed(price_feed_argument, price_feed_expiry_argument, tub, price_feed_cache_ttl_argument)
 
         if price_feed_argument == 'eth_dai-pair':
             return GdaxPriceFeed(product_id="ETH-DAI",
@@ -276,7 +610,12 @@ class PriceFeedFactory:
 
         elif price_feed_argument == 'eth_dai-tub':
             if tub is not None:
-                price_feed = TubPriceFeed(tub)
+                # `TubPriceFeed` does a JSON-RPC call on each read, so we only refresh it in background when
+                # a new block arrives in order not to block the keeper (and other price feeds) on it.
+                price_feed = BlockCachedPriceFeed(TubPriceFeed(tub),
+                                                  web3=tub.web3,
+                                                  ttl=price_feed_cache_ttl_argument,
+                                                  expiry=price_feed_expiry_argument)
             else:
                 raise Exception(f"'--price-feed eth_dai-tub' cannot be used as this keeper does not know about 'Tub'")
 
@@ -285,19 +624,19 @@ class PriceFeedFactory:
                                  expiry=price_feed_expiry_argument)
 
         elif price_feed_argument == 'dai_eth':
-            return ReversePriceFeed(PriceFeedFactory._create_price_feed('eth_dai', price_feed_expiry_argument, tub))
+            return ReversePriceFeed(PriceFeedFactory._create_price_feed('eth_dai', price_feed_expiry_argument, tub, price_feed_cache_ttl_argument))
 
         elif price_feed_argument == 'dai_eth-pair':
-            return ReversePriceFeed(PriceFeedFactory._create_price_feed('eth_dai-pair', price_feed_expiry_argument, tub))
+            return ReversePriceFeed(PriceFeedFactory._create_price_feed('eth_dai-pair', price_feed_expiry_argument, tub, price_feed_cache_ttl_argument))
 
         elif price_feed_argument == 'dai_eth-setzer':
-            return ReversePriceFeed(PriceFeedFactory._create_price_feed('eth_dai-setzer', price_feed_expiry_argument, tub))
+            return ReversePriceFeed(PriceFeedFactory._create_price_feed('eth_dai-setzer', price_feed_expiry_argument, tub, price_feed_cache_ttl_argument))
 
         elif price_feed_argument == 'dai_eth-tub':
-            return ReversePriceFeed(PriceFeedFactory._create_price_feed('eth_dai-tub', price_feed_expiry_argument, tub))
+            return ReversePriceFeed(PriceFeedFactory._create_price_feed('eth_dai-tub', price_feed_expiry_argument, tub, price_feed_cache_ttl_argument))
 
         elif price_feed_argument == 'dai_btc':
-            return ReversePriceFeed(PriceFeedFactory._create_price_feed('btc_dai', price_feed_expiry_argument, tub))
+            return ReversePriceFeed(PriceFeedFactory._create_price_feed('btc_dai', price_feed_expiry_argument, tub, price_feed_cache_ttl_argument))
 
         elif price_feed_argument == 'zrx_usd-pair-midpoint':
              return GdaxMidpointPriceFeed(product_id="ZRX-USD",
@@ -15,7 +15,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
+import random
 import subprocess
+import threading
+import time
+from typing import Optional, Tuple
+
+import requests
 
 from pymaker.numeric import Wad
 
@@ -73,3 +80,120 @@ class Setzer():
 
     def __repr__(self):
         return f"Setzer()"
+
+
+class SetzerWorker:
+    """Fetches prices from multiple `setzer` sources in a single background worker.
+
+    Instead of each price feed forking its own `setzer` process from its own thread, all sources
+    get registered in one worker which refreshes all of them every `interval` seconds (plus a random
+    `jitter`, so multiple keepers do not hit the same sources at exactly the same time).
+
+    For sources for which `setzer` is just a thin `curl` wrapper (see `NATIVE_SOURCES`), the price
+    is fetched directly over HTTP using a keep-alive session, without spawning any processes.
+    All other sources are fetched using the `setzer` tool.
+
+    Attributes:
+        interval: Frequency (in seconds) of how often all registered sources get refreshed.
+        jitter: Maximum random delay (in seconds) added to `interval`.
+        setzer: The `Setzer` client used for sources not supported natively.
+    """
+
+    logger = logging.getLogger()
+
+    NATIVE_SOURCES = {
+        'kraken': ("https://api.kraken.com/0/public/Ticker?pair=ETHUSD",
+                   lambda data: data['result']['XETHZUSD']['c'][0]),
+        'gemini': ("https://api.gemini.com/v1/pubticker/ethusd",
+                   lambda data: data['last'])
+    }
+
+    def __init__(self, interval: int = 60, jitter: float = 5.0, setzer: Setzer = None, timeout: float = 9.5):
+        assert(isinstance(interval, int))
+        assert(isinstance(jitter, (int, float)))
+        assert(isinstance(setzer, Setzer) or setzer is None)
+        assert(isinstance(timeout, (int, float)))
+
+        self.interval = interval
+        self.jitter = jitter
+        self.setzer = setzer if setzer is not None else Setzer()
+        self.timeout = timeout
+
+        self._sources = []
+        self._prices = {}
+        self._retries = {}
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started = False
+
+    def add_source(self, source: str):
+        """Registers a new source and makes sure the background worker is running.
+
+        Newly registered sources get fetched straight away, without waiting for the next round.
+        """
+        assert(isinstance(source, str))
+
+        with self._lock:
+            if source not in self._sources:
+                self._sources.append(source)
+                self._retries[source] = 0
+
+            if not self._started:
+                self._started = True
+                threading.Thread(target=self._background_run, daemon=True).start()
+
+        self._wakeup.set()
+
+    def get(self, source: str) -> Tuple[Optional[Wad], float]:
+        """Returns the last price fetched from `source` and the timestamp it has been fetched at."""
+        assert(isinstance(source, str))
+
+        with self._lock:
+            return self._prices.get(source, (None, 0.0))
+
+    def _fetch_native(self, source: str) -> Wad:
+        url, extract = self.NATIVE_SOURCES[source]
+
+        response = self._session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+
+        return Wad.from_number(float(extract(response.json())))
+
+    def _fetch(self, source: str) -> Wad:
+        if source in self.NATIVE_SOURCES:
+            return self._fetch_native(source)
+
+        else:
+            return self.setzer.price(source)
+
+    def _fetch_all(self):
+        with self._lock:
+            sources = list(self._sources)
+
+        for source in sources:
+            try:
+                price = self._fetch(source)
+
+                with self._lock:
+                    self._prices[source] = price, time.time()
+                    self._retries[source] = 0
+
+                self.logger.debug(f"Fetched price from {source}: {price}")
+            except Exception as e:
+                with self._lock:
+                    self._retries[source] += 1
+                    retries = self._retries[source]
+
+                if retries > 10:
+                    self.logger.warning(f"Failed to get price from 'setzer' ({source}), tried {retries} times ({e})")
+                    self.logger.warning(f"Please check if 'setzer' is installed and working correctly")
+
+    def _background_run(self):
+        while True:
+            self._wakeup.clear()
+            self._fetch_all()
+            self._wakeup.wait(self.interval + random.uniform(0, self.jitter))
+
+    def __repr__(self):
+        return f"SetzerWorker({self.interval}, {self.jitter})"
@@ -0,0 +1,247 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import logging
+import re
+from typing import Optional, List
+
+import requests
+from eth_abi import encode_abi, decode_abi, decode_single
+from web3 import Web3, HTTPProvider
+
+from pymaker import Address
+from pymaker.numeric import Wad
+
+
+class StateCall:
+    """Represents a single read-only contract call (or an ETH balance read) to be done in a batch.
+
+    Attributes:
+        address: Address of the contract to call (or of the account, for ETH balance reads).
+        function: Signature of the function to call, i.e. `balanceOf(address)`.
+        args: Arguments of the function call.
+        return_type: ABI type of the value returned by the function, i.e. `uint256`.
+    """
+
+    ETH_BALANCE = 'eth_getBalance'
+
+    def __init__(self, address: Address, function: str, args: list, return_type: str):
+        assert(isinstance(address, Address))
+        assert(isinstance(function, str))
+        assert(isinstance(args, list))
+        assert(isinstance(return_type, str))
+
+        self.address = address
+        self.function = function
+        self.args = args
+        self.return_type = return_type
+
+    @staticmethod
+    def balance_of(token: Address, owner: Address) -> 'StateCall':
+        return StateCall(token, 'balanceOf(address)', [owner], 'uint256')
+
+    @staticmethod
+    def eth_balance(owner: Address) -> 'StateCall':
+        return StateCall(owner, StateCall.ETH_BALANCE, [], 'uint256')
+
+    @staticmethod
+    def call(address: Address, function: str, return_type: str) -> 'StateCall':
+        return StateCall(address, function, [], return_type)
+
+    def arg_types(self) -> list:
+        types = re.match(r"^\w+\((.*)\)$", self.function).group(1)
+        return types.split(',') if len(types) > 0 else []
+
+    def calldata(self) -> bytes:
+        selector = bytes(Web3.sha3(text=self.function))[0:4]
+        args = [arg.address if isinstance(arg, Address) else arg for arg in self.args]
+
+        return selector + encode_abi(self.arg_types(), args)
+
+    def decode(self, data: bytes):
+        value = decode_single(self.return_type, data)
+
+        # balances and other amounts are returned as `Wad`s, the same way `pymaker` does it
+        return Wad(value) if self.return_type == 'uint256' else value
+
+    def __repr__(self):
+        return f"StateCall('{self.address}', '{self.function}')"
+
+
+class State:
+    """Values returned by a single batch read, together with the number of the block they come from."""
+
+    def __init__(self, block_number: Optional[int], values: dict):
+        assert(isinstance(block_number, int) or block_number is None)
+        assert(isinstance(values, dict))
+
+        self.block_number = block_number
+        self.values = values
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+
+class StateReader:
+    """Reads multiple on-chain values in a single round-trip to the Ethereum node.
+
+    If the address of a `Multicall` contract (<https://github.com/makerdao/multicall>) is known,
+    all reads get aggregated into one `eth_call` so they are guaranteed to come from the same block.
+    Otherwise, all reads are sent as one JSON-RPC batch request against the `latest` block, together
+    with an `eth_blockNumber` call. Nodes serve a batch in one go, so the reads come from the same
+    block unless a new one arrives while the batch is being served. Only `Multicall` guarantees that.
+
+    Providers other than `HTTPProvider` do not support batch requests, in which case the reads are
+    done one after another as a fallback.
+
+    Attributes:
+        web3: An instance of `Web3`.
+        multicall_address: Optional address of the `Multicall` contract.
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, multicall_address: Optional[Address] = None):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(multicall_address, Address) or multicall_address is None)
+
+        self.web3 = web3
+        self.multicall_address = multicall_address
+
+        self._session = requests.Session()
+        self._request_ids = itertools.count()
+
+    def read(self, calls: dict) -> State:
+        """Executes all `calls` in one round-trip.
+
+        Args:
+            calls: Dictionary of `StateCall`s. The returned `State` has values under the same keys.
+
+        Returns:
+            A `State` instance.
+        """
+        assert(isinstance(calls, dict))
+
+        keys = list(calls.keys())
+        state_calls = [calls[key] for key in keys]
+
+        if self.multicall_address is not None:
+            block_number, values = self._read_multicall(state_calls)
+
+        elif self._endpoint_uri() is not None:
+            block_number, values = self._read_batch(state_calls)
+
+        else:
+            block_number, values = self._read_sequentially(state_calls)
+
+        return State(block_number=block_number, values=dict(zip(keys, values)))
+
+    def _endpoint_uri(self) -> Optional[str]:
+        providers = self.web3.providers
+        if len(providers) == 1 and isinstance(providers[0], HTTPProvider):
+            return providers[0].endpoint_uri
+
+        return None
+
+    def _read_multicall(self, calls: List[StateCall]) -> tuple:
+        def multicall_entry(call: StateCall):
+            if call.function == StateCall.ETH_BALANCE:
+                # `Multicall` has a helper function for reading ETH balances
+                eth_balance_call = StateCall(self.multicall_address, 'getEthBalance(address)', [call.address], 'uint256')
+                return self.multicall_address.address, eth_balance_call.calldata()
+
+            return call.address.address, call.calldata()
+
+        calldata = self._aggregate_calldata(list(map(multicall_entry, calls)))
+
+        result = self.web3.eth.call({'to': self.multicall_address.address, 'data': Web3.toHex(calldata)})
+        block_number, return_data = decode_abi(['uint256', 'bytes[]'], bytes(result))
+
+        return block_number, [call.decode(data) for call, data in zip(calls, return_data)]
+
+    @staticmethod
+    def _aggregate_calldata(entries: list) -> bytes:
+        # `aggregate((address,bytes)[])` gets encoded by hand, as `eth_abi` versions accepted by older
+        # `web3` 4.x releases can not encode tuples. Each (dynamic) tuple is encoded in place, preceded
+        # by its offset counted from the start of the offsets themselves.
+        selector = bytes(Web3.sha3(text='aggregate((address,bytes)[])'))[0:4]
+        encoded_entries = [encode_abi(['address', 'bytes'], [address, data]) for address, data in entries]
+
+        offsets = []
+        offset = 32 * len(encoded_entries)
+        for encoded_entry in encoded_entries:
+            offsets.append(offset)
+            offset += len(encoded_entry)
+
+        return selector \
+            + encode_abi(['uint256', 'uint256'], [32, len(encoded_entries)]) \
+            + encode_abi(['uint256'] * len(offsets), offsets) \
+            + b''.join(encoded_entries)
+
+    def _json_rpc_request(self, call: StateCall, block_identifier) -> dict:
+        if call.function == StateCall.ETH_BALANCE:
+            params = [call.address.address, block_identifier]
+        else:
+            params = [{'to': call.address.address, 'data': Web3.toHex(call.calldata())}, block_identifier]
+
+        return {'jsonrpc': '2.0',
+                'id': next(self._request_ids),
+                'method': 'eth_getBalance' if call.function == StateCall.ETH_BALANCE else 'eth_call',
+                'params': params}
+
+    def _post(self, batch: list) -> dict:
+        response = self._session.post(url=self._endpoint_uri(), json=batch, timeout=self._timeout())
+        response.raise_for_status()
+
+        responses = {item['id']: item for item in response.json()}
+        for item in responses.values():
+            if 'error' in item:
+                raise Exception(f"Batch JSON-RPC request failed: {item['error']}")
+
+        return responses
+
+    def _read_batch(self, calls: List[StateCall]) -> tuple:
+        block_number_request = {'jsonrpc': '2.0', 'id': next(self._request_ids), 'method': 'eth_blockNumber', 'params': []}
+        call_requests = [self._json_rpc_request(call, 'latest') for call in calls]
+        responses = self._post([block_number_request] + call_requests)
+
+        def value(call: StateCall, result: str):
+            if call.function == StateCall.ETH_BALANCE:
+                return Wad(int(result, 16))
+
+            return call.decode(Web3.toBytes(hexstr=result))
+
+        block_number = int(responses[block_number_request['id']]['result'], 16)
+        return block_number, [value(call, responses[request['id']]['result']) for call, request in zip(calls, call_requests)]
+
+    def _timeout(self):
+        request_kwargs = getattr(self.web3.providers[0], '_request_kwargs', {}) or {}
+        return request_kwargs.get('timeout', 10)
+
+    def _read_sequentially(self, calls: List[StateCall]) -> tuple:
+        block_number = self.web3.eth.blockNumber
+
+        values = []
+        for call in calls:
+            if call.function == StateCall.ETH_BALANCE:
+                values.append(Wad(self.web3.eth.getBalance(call.address.address, block_number)))
+            else:
+                result = self.web3.eth.call({'to': call.address.address, 'data': Web3.toHex(call.calldata())}, block_number)
+                values.append(call.decode(bytes(result)))
+
+        return block_number, values
@@ -22,6 +22,7 @@ import sys
 from web3 import Web3, HTTPProvider
 
 from market_maker_keeper.band import Bands, NewOrder
+from market_maker_keeper.batch import BatchExecutor
 from market_maker_keeper.control_feed import create_control_feed
 from market_maker_keeper.gas import GasPriceFactory
 from market_maker_keeper.limit import History
@@ -94,6 +95,12 @@ class TheOceanMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -112,6 +119,15 @@ class TheOceanMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--gas-price", type=int, default=0,
                             help="Gas price (in Wei)")
 
@@ -147,6 +163,7 @@ class TheOceanMarketMakerKeeper:
         self.order_history_reporter = create_order_history_reporter(self.arguments)
 
         self.history = History()
+        self.batch_executor = BatchExecutor()
         self.zrx_exchange = ZrxExchangeV2(web3=self.web3, address=Address(self.arguments.exchange_address))
         self.theocean_api = TheOceanApi(self.zrx_exchange,
                                         self.arguments.theocean_api_server,
@@ -157,7 +174,7 @@ class TheOceanMarketMakerKeeper:
         self.order_book_manager = OrderBookManager(refresh_frequency=self.arguments.refresh_frequency)
         self.order_book_manager.get_orders_with(lambda: self.theocean_api.get_orders(self.pair))
         self.order_book_manager.get_balances_with(lambda: self.get_balances())
-        self.order_book_manager.place_orders_with(self.place_order_function)
+        self.order_book_manager.place_orders_in_batches_with(self.place_orders_function)
         self.order_book_manager.cancel_orders_with(lambda order: self.theocean_api.cancel_order(order.order_id))
         self.order_book_manager.enable_history_reporting(self.order_history_reporter, self.our_buy_orders, self.our_sell_orders)
         self.order_book_manager.start()
@@ -209,25 +226,30 @@ class TheOceanMarketMakerKeeper:
         order_book = self.order_book_manager.get_order_book()
         target_price = self.price_feed.get_price()
 
-        # Cancel orders
-        cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                                      our_sell_orders=self.our_sell_orders(order_book.orders),
-                                                      target_price=target_price)
-        if len(cancellable_orders) > 0:
-            self.order_book_manager.cancel_orders(cancellable_orders)
-            return
-
-        # Do not place new orders if order book state is not confirmed
+        # Do not place new orders if order book state is not confirmed, only cancel orders
         if order_book.orders_being_placed or order_book.orders_being_cancelled:
-            self.logger.debug("Order book is in progress, not placing new orders")
+            cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
+                                                          our_sell_orders=self.our_sell_orders(order_book.orders),
+                                                          target_price=target_price)
+            if len(cancellable_orders) > 0:
+                self.order_book_manager.cancel_orders(cancellable_orders)
+            else:
+                self.logger.debug("Order book is in progress, not placing new orders")
             return
 
-        # Place new orders
-        self.order_book_manager.place_orders(bands.new_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
-                                                              our_sell_orders=self.our_sell_orders(order_book.orders),
-                                                              our_buy_balance=self.our_buy_balance(order_book.balances),
-                                                              our_sell_balance=self.our_sell_balance(order_book.balances),
-                                                              target_price=target_price)[0])
+        # Cancel orders and place new ones at the same time
+        orders_to_cancel, new_orders, _, _ = bands.cancel_and_top_up_orders(our_buy_orders=self.our_buy_orders(order_book.orders),
+                                                                            our_sell_orders=self.our_sell_orders(order_book.orders),
+                                                                            our_buy_balance=self.our_buy_balance(order_book.balances),
+                                                                            our_sell_balance=self.our_sell_balance(order_book.balances),
+                                                                            target_price=target_price)
+
+        self.order_book_manager.replace_orders(orders_to_cancel, new_orders)
+
+    def place_orders_function(self, new_orders: list) -> list:
+        # Each order gets reserved, signed and placed by `TheOceanApi.place_order` in one go,
+        # so we do it for all orders of the batch concurrently.
+        return self.batch_executor.map(self.place_order_function, new_orders)
 
     def place_order_function(self, new_order: NewOrder):
         assert(isinstance(new_order, NewOrder))
@@ -0,0 +1,181 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+import time
+
+from web3 import Web3
+
+from market_maker_keeper.state_reader import StateReader, StateCall
+from pymaker import Address
+from pymaker.numeric import Wad
+from pymaker.util import hexstring_to_bytes
+from pymaker.zrx import ZrxExchange
+from pymaker.zrxv2 import ZrxExchangeV2
+
+
+class BatchedFillStatus:
+    """Checks fill status of many 0x orders in one batch, remembering orders which became unavailable.
+
+    `refresh_unavailable_buy_amounts()` reads unavailable amounts of all passed orders in a single
+    round-trip (see `StateReader`), subsequent `get_unavailable_buy_amount()` calls for these orders
+    are then answered from memory. Orders which became fully unavailable (filled or cancelled) can
+    never become available again, so they are remembered and never queried again.
+
+    Order hashes are memoized as well, as they never change for a given order and calculating
+    each of them is an `eth_call`. This applies to all `get_order_hash()` calls, so the order store
+    and the relayer order sync get them from memory too.
+    """
+
+    logger = logging.getLogger()
+
+    def _init_fill_status(self, state_reader: StateReader):
+        assert(isinstance(state_reader, StateReader))
+
+        self.state_reader = state_reader
+        self._fill_status_lock = threading.Lock()
+        self._order_hashes = {}
+        self._unavailable_buy_amounts = {}
+        self._unavailable_order_hashes = set()
+
+    def _fill_status_calls(self, order, order_hash: bytes) -> dict:
+        raise NotImplementedError()
+
+    def _unavailable_buy_amount_from(self, state, order) -> Wad:
+        raise NotImplementedError()
+
+    def get_order_hash(self, order) -> str:
+        with self._fill_status_lock:
+            if order in self._order_hashes:
+                return self._order_hashes[order]
+
+        order_hash = super().get_order_hash(order)
+
+        with self._fill_status_lock:
+            self._order_hashes[order] = order_hash
+
+        return order_hash
+
+    def _order_hash(self, order) -> bytes:
+        return hexstring_to_bytes(self.get_order_hash(order))
+
+    def refresh_unavailable_buy_amounts(self, orders: list):
+        """Reads the unavailable amounts of all `orders` in one batch."""
+        assert(isinstance(orders, list))
+
+        order_hashes = {order: self._order_hash(order) for order in orders}
+        pending_orders = [order for order in orders if order_hashes[order] not in self._unavailable_order_hashes]
+
+        calls = {}
+        for index, order in enumerate(pending_orders):
+            for key, call in self._fill_status_calls(order, order_hashes[order]).items():
+                calls[(index, key)] = call
+
+        unavailable_buy_amounts = {}
+        if len(calls) > 0:
+            state = self.state_reader.read(calls)
+
+            for index, order in enumerate(pending_orders):
+                order_state = {key: state[(index, key)] for key in self._fill_status_calls(order, order_hashes[order]).keys()}
+                unavailable_buy_amounts[order] = self._unavailable_buy_amount_from(order_state, order)
+
+        with self._fill_status_lock:
+            self._unavailable_buy_amounts = unavailable_buy_amounts
+
+            for order, unavailable_buy_amount in unavailable_buy_amounts.items():
+                if unavailable_buy_amount >= order.buy_amount:
+                    self._unavailable_order_hashes.add(order_hashes[order])
+
+            # forget hashes of orders we do not track anymore
+            self._order_hashes = {order: order_hash for order, order_hash in self._order_hashes.items() if order in order_hashes}
+            self._unavailable_order_hashes &= set(order_hashes.values())
+
+        self.logger.debug(f"Checked fill status of {len(pending_orders)} order(s) in one batch,"
+                          f" {len(orders) - len(pending_orders)} order(s) already known to be unavailable")
+
+    def get_unavailable_buy_amount(self, order) -> Wad:
+        with self._fill_status_lock:
+            if order in self._order_hashes and hexstring_to_bytes(self._order_hashes[order]) in self._unavailable_order_hashes:
+                return order.buy_amount
+
+            if order in self._unavailable_buy_amounts:
+                return self._unavailable_buy_amounts[order]
+
+        return super().get_unavailable_buy_amount(order)
+
+
+class BatchedZrxExchange(BatchedFillStatus, ZrxExchange):
+    """`ZrxExchange` (0x V1) checking fill status of orders in batches."""
+
+    def __init__(self, web3: Web3, address: Address, state_reader: StateReader):
+        super().__init__(web3=web3, address=address)
+        self._init_fill_status(state_reader)
+
+    def _fill_status_calls(self, order, order_hash: bytes) -> dict:
+        return {'unavailable': StateCall(self.address, 'getUnavailableTakerTokenAmount(bytes32)', [order_hash], 'uint256')}
+
+    def _unavailable_buy_amount_from(self, state, order) -> Wad:
+        return state['unavailable']
+
+
+class BatchedZrxExchangeV2(BatchedFillStatus, ZrxExchangeV2):
+    """`ZrxExchangeV2` (0x V2) checking fill status of orders in batches.
+
+    The status of each order is worked out the same way `getOrderInfo` of the exchange contract does
+    it, from the `filled`, `cancelled` and `orderEpoch` mappings read in the batch. Any order which
+    is not `FILLABLE` (fully filled, expired, cancelled directly or with `cancelOrdersUpTo`, or with
+    zero amounts) is treated as fully unavailable.
+    """
+
+    # `OrderStatus` enum of the 0x V2 exchange contract
+    ORDER_STATUS_INVALID_MAKER_ASSET_AMOUNT = 1
+    ORDER_STATUS_INVALID_TAKER_ASSET_AMOUNT = 2
+    ORDER_STATUS_FILLABLE = 3
+    ORDER_STATUS_EXPIRED = 4
+    ORDER_STATUS_FULLY_FILLED = 5
+    ORDER_STATUS_CANCELLED = 6
+
+    def __init__(self, web3: Web3, address: Address, state_reader: StateReader):
+        super().__init__(web3=web3, address=address)
+        self._init_fill_status(state_reader)
+
+    def _fill_status_calls(self, order, order_hash: bytes) -> dict:
+        return {'filled': StateCall(self.address, 'filled(bytes32)', [order_hash], 'uint256'),
+                'cancelled': StateCall(self.address, 'cancelled(bytes32)', [order_hash], 'bool'),
+                'epoch': StateCall(self.address, 'orderEpoch(address,address)', [order.maker, order.sender], 'uint256')}
+
+    @staticmethod
+    def _order_status(state, order, timestamp: int) -> int:
+        if order.pay_amount == Wad(0):
+            return BatchedZrxExchangeV2.ORDER_STATUS_INVALID_MAKER_ASSET_AMOUNT
+        if order.buy_amount == Wad(0):
+            return BatchedZrxExchangeV2.ORDER_STATUS_INVALID_TAKER_ASSET_AMOUNT
+        if state['filled'] >= order.buy_amount:
+            return BatchedZrxExchangeV2.ORDER_STATUS_FULLY_FILLED
+        if timestamp >= order.expiration:
+            return BatchedZrxExchangeV2.ORDER_STATUS_EXPIRED
+        if state['cancelled'] or state['epoch'] > Wad(order.salt):
+            return BatchedZrxExchangeV2.ORDER_STATUS_CANCELLED
+
+        return BatchedZrxExchangeV2.ORDER_STATUS_FILLABLE
+
+    def _unavailable_buy_amount_from(self, state, order) -> Wad:
+        if self._order_status(state, order, int(time.time())) != self.ORDER_STATUS_FILLABLE:
+            return order.buy_amount
+
+        return state['filled']
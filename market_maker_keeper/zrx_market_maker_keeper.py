@@ -19,11 +19,11 @@ import argparse
 import logging
 import sys
 import time
-from threading import Lock
 
 from web3 import Web3, HTTPProvider
 
 from market_maker_keeper.band import Bands, NewOrder, BuyBand
+from market_maker_keeper.batch import BatchExecutor
 from market_maker_keeper.control_feed import create_control_feed
 from market_maker_keeper.gas import GasPriceFactory
 from market_maker_keeper.limit import History
@@ -32,6 +32,9 @@ from market_maker_keeper.order_history_reporter import create_order_history_repo
 from market_maker_keeper.price_feed import PriceFeedFactory, Price
 from market_maker_keeper.reloadable_config import ReloadableConfig
 from market_maker_keeper.spread_feed import create_spread_feed
+from market_maker_keeper.state_reader import StateReader
+from market_maker_keeper.zrx_exchange import BatchedZrxExchange
+from market_maker_keeper.zrx_orders import ZrxOrderStore, ZrxRelayerOrderSync
 from market_maker_keeper.util import setup_logging
 from pyexchange.zrx import ZrxApi, Pair
 from pymaker import Address
@@ -41,7 +44,7 @@ from pymaker.lifecycle import Lifecycle
 from pymaker.numeric import Wad
 from pymaker.token import ERC20Token
 from pymaker.util import eth_balance
-from pymaker.zrx import ZrxExchange, ZrxRelayerApi
+from pymaker.zrx import ZrxRelayerApi, Order
 
 
 class ZrxMarketMakerKeeper:
@@ -70,12 +73,19 @@ class ZrxMarketMakerKeeper:
         parser.add_argument("--exchange-address", type=str, required=True,
                             help="Ethereum address of the 0x Exchange contract")
 
+        parser.add_argument("--multicall-address", type=str, required=False,
+                            help="Ethereum address of the Multicall contract, used to batch on-chain state reads")
+
         parser.add_argument("--relayer-api-server", type=str, required=True,
                             help="Address of the 0x Relayer API")
 
         parser.add_argument("--relayer-per-page", type=int, default=100,
                             help="Number of orders to fetch per one page from the 0x Relayer API (default: 100)")
 
+        parser.add_argument("--order-store", type=str, required=False,
+                            help="File to persist our own orders to, so they are remembered across restarts"
+                                 " (used with `--remember-own-orders')")
+
         parser.add_argument("--buy-token-address", type=str, required=True,
                             help="Ethereum address of the buy token")
 
@@ -97,6 +107,12 @@ class ZrxMarketMakerKeeper:
         parser.add_argument("--price-feed-expiry", type=int, default=120,
                             help="Maximum age of the price feed (in seconds, default: 120)")
 
+        parser.add_argument("--setzer-interval", type=int, default=60,
+                            help="Frequency of refreshing 'setzer' price feeds (in seconds, default: 60)")
+
+        parser.add_argument("--setzer-jitter", type=float, default=5.0,
+                            help="Maximum random delay added to --setzer-interval (in seconds, default: 5.0)")
+
         parser.add_argument("--spread-feed", type=str,
                             help="Source of spread feed")
 
@@ -115,6 +131,15 @@ class ZrxMarketMakerKeeper:
         parser.add_argument("--order-history-every", type=int, default=30,
                             help="Frequency of reporting active orders (in seconds, default: 30)")
 
+        parser.add_argument("--order-history-gzip", dest='order_history_gzip', action='store_true',
+                            help="Send active orders reports gzip-compressed")
+
+        parser.add_argument("--order-history-spool", type=str,
+                            help="Directory to keep undelivered active orders reports in until the endpoint is back")
+
+        parser.add_argument("--order-history-full-every", type=int, default=0,
+                            help="Report only changes of active orders, with a full report every this many seconds (default: 0, always full)")
+
         parser.add_argument("--order-expiry", type=int, required=True,
                             help="Expiration time of created orders (in seconds)")
 
@@ -165,29 +190,39 @@ class ZrxMarketMakerKeeper:
         self.order_history_reporter = create_order_history_reporter(self.arguments)
 
         self.history = History()
+        self.batch_executor = BatchExecutor()
+        self.state_reader = StateReader(web3=self.web3,
+                                        multicall_address=Address(self.arguments.multicall_address)
+                                            if self.arguments.multicall_address else None)
 
         # Delegate 0x specific init to a function to permit overload for 0xv2
         self.zrx_exchange = None
         self.zrx_relayer_api = None
         self.zrx_api = None
+        self.relayer_order_sync = None
+        self.order_store = None
         self.pair = None
         self.init_zrx()
 
-        self.placed_zrx_orders = []
-        self.placed_zrx_orders_lock = Lock()
-
         self.order_book_manager = OrderBookManager(refresh_frequency=self.arguments.refresh_frequency)
         self.order_book_manager.get_orders_with(lambda: self.get_orders())
         self.order_book_manager.get_balances_with(lambda: self.get_balances())
-        self.order_book_manager.place_orders_with(self.place_order_function)
+        self.order_book_manager.place_orders_in_batches_with(self.place_orders_function)
         self.order_book_manager.cancel_orders_with(self.cancel_order_function)
         self.order_book_manager.enable_history_reporting(self.order_history_reporter, self.our_buy_orders, self.our_sell_orders)
         self.order_book_manager.start()
 
     def init_zrx(self):
-        self.zrx_exchange = ZrxExchange(web3=self.web3, address=Address(self.arguments.exchange_address))
+        self.zrx_exchange = BatchedZrxExchange(web3=self.web3,
+                                               address=Address(self.arguments.exchange_address),
+                                               state_reader=self.state_reader)
         self.zrx_relayer_api = ZrxRelayerApi(exchange=self.zrx_exchange, api_server=self.arguments.relayer_api_server)
         self.zrx_api = ZrxApi(zrx_exchange=self.zrx_exchange)
+        self.relayer_order_sync = ZrxRelayerOrderSync(exchange=self.zrx_exchange,
+                                                      api_server=self.arguments.relayer_api_server,
+                                                      maker=self.our_address,
+                                                      per_page=self.arguments.relayer_per_page)
+        self.order_store = ZrxOrderStore(exchange=self.zrx_exchange, order_class=Order, filename=self.arguments.order_store)
 
         self.pair = Pair(sell_token_address=Address(self.arguments.sell_token_address),
                          sell_token_decimals=self.arguments.sell_token_decimals,
@@ -226,16 +261,23 @@ class ZrxMarketMakerKeeper:
         return list(filter(lambda order: self.zrx_exchange.get_unavailable_buy_amount(order) < order.buy_amount, zrx_orders))
 
     def get_orders(self) -> list:
-        def remove_old_zrx_orders(zrx_orders: list) -> list:
-            return self.remove_filled_or_cancelled_zrx_orders(self.remove_expired_zrx_orders(zrx_orders))
+        # Each order gets hashed only once here (the store keeps orders indexed by hash already),
+        # as calculating an order hash is a call to the exchange contract.
+        placed_zrx_orders = self.order_store.orders_by_hash()
+        api_zrx_orders = self.relayer_order_sync.get_orders_by_hash()
+        known_zrx_orders = {**api_zrx_orders, **placed_zrx_orders}
 
-        with self.placed_zrx_orders_lock:
-            self.placed_zrx_orders = remove_old_zrx_orders(self.placed_zrx_orders)
+        zrx_orders = self.remove_expired_zrx_orders(list(known_zrx_orders.values()))
 
-        api_zrx_orders = remove_old_zrx_orders(self.zrx_relayer_api.get_orders_by_maker(self.our_address, self.arguments.relayer_per_page))
+        # Check fill status of all orders we know about in one batch, so `remove_filled_or_cancelled_zrx_orders`
+        # and `zrx_api.get_orders` below do not have to query the exchange contract for each order separately.
+        self.zrx_exchange.refresh_unavailable_buy_amounts(zrx_orders)
+        zrx_orders = self.remove_filled_or_cancelled_zrx_orders(zrx_orders)
 
-        with self.placed_zrx_orders_lock:
-            zrx_orders = list(set(self.placed_zrx_orders + api_zrx_orders))
+        # Orders which have expired or have been filled or cancelled do not need to be remembered anymore.
+        active_orders = set(map(id, zrx_orders))
+        active_order_hashes = {order_hash for order_hash, order in known_zrx_orders.items() if id(order) in active_orders}
+        self.order_store.remove(set(placed_zrx_orders.keys()) - active_order_hashes)
 
         return self.zrx_api.get_orders(self.pair, zrx_orders)
 
@@ -278,17 +320,15 @@ class ZrxMarketMakerKeeper:
             self.order_book_manager.cancel_all_orders()
             return
 
-        # Cancel orders
-        cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(orders),
-                                                      our_sell_orders=self.our_sell_orders(orders),
-                                                      target_price=target_price)
-        if len(cancellable_orders) > 0:
-            self.order_book_manager.cancel_orders(cancellable_orders)
-            return
-
-        # Do not place new orders if order book state is not confirmed
+        # Do not place new orders if order book state is not confirmed, only cancel orders
         if order_book.orders_being_placed or order_book.orders_being_cancelled:
-            self.logger.debug("Order book is in progress, not placing new orders")
+            cancellable_orders = bands.cancellable_orders(our_buy_orders=self.our_buy_orders(orders),
+                                                          our_sell_orders=self.our_sell_orders(orders),
+                                                          target_price=target_price)
+            if len(cancellable_orders) > 0:
+                self.order_book_manager.cancel_orders(cancellable_orders)
+            else:
+                self.logger.debug("Order book is in progress, not placing new orders")
             return
 
         # Balances returned by `our_total_***_balance` still contain amounts "locked"
@@ -300,31 +340,30 @@ class ZrxMarketMakerKeeper:
             our_buy_balance = self.our_total_buy_balance(order_book.balances) - Bands.total_amount(self.our_buy_orders(orders))
             our_sell_balance = self.our_total_sell_balance(order_book.balances) - Bands.total_amount(self.our_sell_orders(orders))
 
-        # Place new orders
-        self.order_book_manager.place_orders(bands.new_orders(our_buy_orders=self.our_buy_orders(orders),
-                                                              our_sell_orders=self.our_sell_orders(orders),
-                                                              our_buy_balance=our_buy_balance,
-                                                              our_sell_balance=our_sell_balance,
-                                                              target_price=target_price)[0])
+        # Cancel orders and place new ones at the same time
+        orders_to_cancel, new_orders, _, _ = bands.cancel_and_top_up_orders(our_buy_orders=self.our_buy_orders(orders),
+                                                                            our_sell_orders=self.our_sell_orders(orders),
+                                                                            our_buy_balance=our_buy_balance,
+                                                                            our_sell_balance=our_sell_balance,
+                                                                            target_price=target_price)
 
-    def place_order_function(self, new_order: NewOrder):
+        self.order_book_manager.replace_orders(orders_to_cancel, new_orders)
+
+    def create_zrx_order(self, new_order: NewOrder):
         assert(isinstance(new_order, NewOrder))
 
         order_expiry = int(new_order.band.params.get('orderExpiry', self.arguments.order_expiry))
 
-        zrx_order = self.zrx_api.place_order(pair=self.pair,
-                                             is_sell=new_order.is_sell,
-                                             price=new_order.price,
-                                             amount=new_order.amount,
-                                             expiration=int(time.time()) + order_expiry)
-
-        zrx_order = self.zrx_relayer_api.calculate_fees(zrx_order)
-        zrx_order = self.zrx_exchange.sign_order(zrx_order)
+        return self.zrx_api.place_order(pair=self.pair,
+                                        is_sell=new_order.is_sell,
+                                        price=new_order.price,
+                                        amount=new_order.amount,
+                                        expiration=int(time.time()) + order_expiry)
 
+    def submit_zrx_order(self, zrx_order):
         if self.zrx_relayer_api.submit_order(zrx_order):
             if self.arguments.remember_own_orders:
-                with self.placed_zrx_orders_lock:
-                    self.placed_zrx_orders.append(zrx_order)
+                self.order_store.add(zrx_order)
 
             order = self.zrx_api.get_orders(self.pair, [zrx_order])[0]
 
@@ -333,6 +372,20 @@ class ZrxMarketMakerKeeper:
         else:
             return None
 
+    def place_orders_function(self, new_orders: list) -> list:
+        # Each step (creation, fee calculation, signing and submission) is done for all orders of the batch
+        # concurrently, so placing the whole batch takes about as long as placing a single order.
+        zrx_orders = self.batch_executor.map(self.create_zrx_order, new_orders)
+        zrx_orders = self.batch_executor.map(self.zrx_relayer_api.calculate_fees, zrx_orders)
+        zrx_orders = self.batch_executor.map(self.zrx_exchange.sign_order, zrx_orders)
+
+        return self.batch_executor.map(self.submit_zrx_order, zrx_orders)
+
+    def place_order_function(self, new_order: NewOrder):
+        assert(isinstance(new_order, NewOrder))
+
+        return self.place_orders_function([new_order])[0]
+
     def cancel_order_function(self, order):
         transact = self.zrx_exchange.cancel_order(order.zrx_order).transact(gas_price=self.gas_price)
         return transact is not None and transact.successful
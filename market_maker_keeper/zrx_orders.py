@@ -0,0 +1,217 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+import requests
+
+from pymaker import Address
+from pymaker.zrx import Order
+from pymaker.zrxv2 import Order as OrderV2
+
+
+class ZrxOrderStore:
+    """Local store of our signed 0x orders, indexed by order hash.
+
+    Orders are kept in memory and, if `filename` is specified, also persisted to a JSON file
+    after each change, so the keeper still knows about orders it has signed after a restart.
+    The file gets replaced atomically, so a crash while writing it can never corrupt the store.
+
+    Attributes:
+        exchange: The 0x exchange the orders belong to, used to calculate order hashes.
+        order_class: Class of the orders (i.e. `pymaker.zrx.Order` or `pymaker.zrxv2.Order`),
+            used to deserialize them from the file.
+        filename: Optional name of the file to persist the orders to.
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, exchange, order_class, filename: Optional[str] = None):
+        assert(isinstance(filename, str) or filename is None)
+
+        self.exchange = exchange
+        self.order_class = order_class
+        self.filename = filename
+
+        self._orders = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if self.filename is None or not os.path.isfile(self.filename):
+            return
+
+        try:
+            with open(self.filename) as data_file:
+                data = json.load(data_file)
+
+            self._orders = {order_hash: self.order_class.from_json(self.exchange, order_json)
+                            for order_hash, order_json in data.items()}
+
+            self.logger.info(f"Loaded {len(self._orders)} order(s) from '{self.filename}'")
+
+        except Exception as e:
+            self.logger.warning(f"Failed to load orders from '{self.filename}', starting with an empty store: {e}")
+
+    def _save(self):
+        if self.filename is None:
+            return
+
+        temporary_filename = f"{self.filename}.tmp"
+        with open(temporary_filename, 'w') as data_file:
+            json.dump({order_hash: order.to_json() for order_hash, order in self._orders.items()}, data_file)
+
+        os.replace(temporary_filename, self.filename)
+
+    def order_hash(self, order) -> str:
+        return self.exchange.get_order_hash(order)
+
+    def add(self, order):
+        """Adds a newly signed order to the store."""
+        order_hash = self.order_hash(order)
+
+        with self._lock:
+            self._orders[order_hash] = order
+            self._save()
+
+    def orders(self) -> list:
+        """Returns all orders from the store."""
+        with self._lock:
+            return list(self._orders.values())
+
+    def orders_by_hash(self) -> dict:
+        """Returns all orders from the store, indexed by order hash."""
+        with self._lock:
+            return dict(self._orders)
+
+    def remove(self, order_hashes: set):
+        """Removes orders with hashes in `order_hashes` from the store."""
+        assert(isinstance(order_hashes, set))
+
+        with self._lock:
+            if len(order_hashes & set(self._orders.keys())) > 0:
+                self._orders = {order_hash: order for order_hash, order in self._orders.items() if order_hash not in order_hashes}
+                self._save()
+
+
+class ZrxRelayerOrderSync:
+    """Fetches all orders of one maker from a 0x Relayer API V0, page by page.
+
+    Unlike `ZrxRelayerApi.get_orders_by_maker()`, which only ever returns the first page, all pages
+    get fetched so large order sets do not get truncated. Each page is requested with the `ETag`
+    received for it last time (if the relayer sends one), so pages which have not changed come back
+    as empty `304 Not Modified` responses and the orders from the previous fetch get reused, instead
+    of being downloaded and parsed again.
+
+    Attributes:
+        exchange: The 0x exchange the orders belong to.
+        api_server: Base URL of the relayer API.
+        maker: Address of the maker whose orders are fetched.
+        per_page: Number of orders to fetch per one page.
+        timeout: Timeout of each request (in seconds).
+    """
+
+    logger = logging.getLogger()
+
+    def __init__(self, exchange, api_server: str, maker: Address, per_page: int, timeout: float = 15.5):
+        assert(isinstance(api_server, str))
+        assert(isinstance(maker, Address))
+        assert(isinstance(per_page, int))
+        assert(isinstance(timeout, float))
+
+        self.exchange = exchange
+        self.api_server = api_server
+        self.maker = maker
+        self.per_page = per_page
+        self.timeout = timeout
+
+        self._session = requests.Session()
+        self._pages = {}
+
+    def _url(self, page: int) -> str:
+        return f"{self.api_server}/v0/orders?exchangeContractAddress={self.exchange.address.address}" \
+               f"&maker={self.maker.address}&page={page}&per_page={self.per_page}"
+
+    def _parse(self, data) -> list:
+        return list(map(lambda item: Order.from_json(self.exchange, item), data))
+
+    def _fetch_page(self, page: int) -> list:
+        etag, orders = self._pages.get(page, (None, None))
+        headers = {'If-None-Match': etag} if etag is not None and orders is not None else {}
+
+        response = self._session.get(self._url(page), headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304:
+            return orders
+
+        if not response.ok:
+            raise Exception(f"Failed to fetch page {page} of orders from the relayer: {response.status_code} {response.text}")
+
+        orders = self._parse(response.json())
+        self._pages[page] = (response.headers.get('ETag'), orders)
+
+        return orders
+
+    def get_orders(self) -> list:
+        """Returns all orders of the maker, fetching all pages but only downloading the changed ones."""
+        return list(self.get_orders_by_hash().values())
+
+    def get_orders_by_hash(self) -> dict:
+        """Returns all orders of the maker indexed by order hash, see `get_orders()`."""
+        orders = {}
+
+        page = 1
+        while True:
+            page_orders = self._fetch_page(page)
+            new_orders = {self.exchange.get_order_hash(order): order for order in page_orders}
+            new_orders = {order_hash: order for order_hash, order in new_orders.items() if order_hash not in orders}
+
+            # some relayers ignore paging, in which case we would get the same orders forever
+            if len(page_orders) > 0 and len(new_orders) == 0:
+                break
+
+            orders.update(new_orders)
+
+            if len(page_orders) < self.per_page:
+                break
+
+            page += 1
+
+        # forget pages past the last one, as the number of our orders may have decreased
+        self._pages = {number: value for number, value in self._pages.items() if number <= page}
+
+        self.logger.debug(f"Fetched {len(orders)} order(s) from {page} page(s) of the relayer API")
+
+        return orders
+
+
+class ZrxRelayerOrderSyncV2(ZrxRelayerOrderSync):
+    """Fetches all orders of one maker from a 0x Relayer API V2, page by page.
+
+    See `ZrxRelayerOrderSync` for details.
+    """
+
+    def _url(self, page: int) -> str:
+        return f"{self.api_server}/v2/orders?makerAddress={self.maker.address}" \
+               f"&networkId={self.exchange.web3.version.network}&page={page}&perPage={self.per_page}"
+
+    def _parse(self, data) -> list:
+        return list(map(lambda item: OrderV2.from_json(self.exchange, item['order']), data['records']))
@@ -20,18 +20,27 @@ import time
 
 from market_maker_keeper.zrx_market_maker_keeper import ZrxMarketMakerKeeper
 from market_maker_keeper.band import NewOrder
+from market_maker_keeper.zrx_exchange import BatchedZrxExchangeV2
+from market_maker_keeper.zrx_orders import ZrxOrderStore, ZrxRelayerOrderSyncV2
 from pyexchange.zrxv2 import ZrxApiV2, Pair
 from pymaker import Address
-from pymaker.zrxv2 import ZrxExchangeV2, ZrxRelayerApiV2
+from pymaker.zrxv2 import ZrxRelayerApiV2, Order
 
 
 class ZrxV2MarketMakerKeeper(ZrxMarketMakerKeeper):
     """Keeper acting as a market maker on any 0x V2 exchange implementing the Standard 0x Relayer API V2."""
 
     def init_zrx(self):
-        self.zrx_exchange = ZrxExchangeV2(web3=self.web3, address=Address(self.arguments.exchange_address))
+        self.zrx_exchange = BatchedZrxExchangeV2(web3=self.web3,
+                                                 address=Address(self.arguments.exchange_address),
+                                                 state_reader=self.state_reader)
         self.zrx_relayer_api = ZrxRelayerApiV2(exchange=self.zrx_exchange, api_server=self.arguments.relayer_api_server)
         self.zrx_api = ZrxApiV2(zrx_exchange=self.zrx_exchange, zrx_api=self.zrx_relayer_api)
+        self.relayer_order_sync = ZrxRelayerOrderSyncV2(exchange=self.zrx_exchange,
+                                                        api_server=self.arguments.relayer_api_server,
+                                                        maker=self.our_address,
+                                                        per_page=self.arguments.relayer_per_page)
+        self.order_store = ZrxOrderStore(exchange=self.zrx_exchange, order_class=Order, filename=self.arguments.order_store)
 
         self.pair = Pair(sell_token_address=Address(self.arguments.sell_token_address),
                          sell_token_decimals=self.arguments.sell_token_decimals,
@@ -51,8 +60,7 @@ class ZrxV2MarketMakerKeeper(ZrxMarketMakerKeeper):
 
         if zrx_order:
             if self.arguments.remember_own_orders:
-                with self.placed_zrx_orders_lock:
-                    self.placed_zrx_orders.append(zrx_order)
+                self.order_store.add(zrx_order)
 
             order = self.zrx_api.get_orders(self.pair, [zrx_order])[0]
 
@@ -61,6 +69,11 @@ class ZrxV2MarketMakerKeeper(ZrxMarketMakerKeeper):
         else:
             return None
 
+    def place_orders_function(self, new_orders: list) -> list:
+        # `ZrxApiV2.place_order` builds, signs and submits an order in one go,
+        # so we do it for all orders of the batch concurrently.
+        return self.batch_executor.map(self.place_order_function, new_orders)
+
 
 if __name__ == '__main__':
     ZrxV2MarketMakerKeeper(sys.argv[1:]).main()
@@ -0,0 +1,153 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import threading
+import time
+
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from tornado.httpclient import HTTPRequest
+
+from market_maker_keeper.airswap_server import create_airswap_application
+
+
+class FakeAirswapApi:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.failing = False
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._lock = threading.Lock()
+
+    def sign_order(self, maker_address, maker_token, maker_amount, taker_address, taker_token, taker_amount):
+        if self.failing:
+            raise Exception("Signing failed")
+
+        with self._lock:
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+
+        time.sleep(self.delay)
+
+        with self._lock:
+            self.concurrent -= 1
+
+        return json.dumps({'makerAmount': maker_amount, 'takerAmount': taker_amount, 'signature': '0x1234'})
+
+
+class FakeKeeper:
+    def __init__(self, airswap_api: FakeAirswapApi):
+        self.airswap_api = airswap_api
+        self.available = 10
+        self.reservations = set()
+
+    def _reserve_for_order(self, order: dict):
+        if len(self.reservations) >= self.available:
+            raise Exception("Not enough balance available to sign the order")
+
+        reservation_id = len(self.reservations)
+        self.reservations.add(reservation_id)
+        return reservation_id
+
+    def _release_reservation(self, reservation_id):
+        self.reservations.discard(reservation_id)
+
+    def _order_handler(self, req):
+        if 'makerAmount' not in req:
+            raise Exception("Neither takerAmount or makerAmount was specified in the request")
+
+        return {"maker_address": req['makerAddress'],
+                "maker_token": req['makerToken'],
+                "maker_amount": req['makerAmount'],
+                "taker_address": req['takerAddress'],
+                "taker_token": req['takerToken'],
+                "taker_amount": "2000"}
+
+
+def order_request(maker_amount: str = None) -> str:
+    request = {'makerAddress': '0x0001', 'takerAddress': '0x0002', 'makerToken': '0x0003', 'takerToken': '0x0004'}
+    if maker_amount is not None:
+        request['makerAmount'] = maker_amount
+
+    return json.dumps(request)
+
+
+class TestAirswapServer(AsyncHTTPTestCase):
+    def get_app(self):
+        self.airswap_api = FakeAirswapApi(delay=0.2)
+        self.keeper = FakeKeeper(self.airswap_api)
+        return create_airswap_application(self.keeper, signing_workers=10)
+
+    def test_should_return_quote(self):
+        # when
+        response = self.fetch('/getQuote', method='POST', body=order_request('1000'))
+
+        # then
+        assert response.code == 200
+        assert json.loads(response.body)['maker_amount'] == '1000'
+        assert json.loads(response.body)['taker_amount'] == '2000'
+
+    def test_should_return_signed_order(self):
+        # when
+        response = self.fetch('/getOrder', method='POST', body=order_request('1000'))
+
+        # then
+        assert response.code == 200
+        assert json.loads(response.body)['signature'] == '0x1234'
+
+    def test_should_not_respond_if_order_cannot_be_built(self):
+        # when
+        response = self.fetch('/getOrder', method='POST', body=order_request())
+
+        # then
+        assert response.code == 400
+        assert response.body == b''
+
+    def test_should_not_sign_order_if_balance_cannot_be_reserved(self):
+        # given
+        self.keeper.available = 0
+
+        # when
+        response = self.fetch('/getOrder', method='POST', body=order_request('1000'))
+
+        # then
+        assert response.code == 400
+        assert self.airswap_api.max_concurrent == 0
+
+    def test_should_not_respond_and_release_reservation_if_signing_fails(self):
+        # given
+        self.airswap_api.failing = True
+
+        # when
+        response = self.fetch('/getOrder', method='POST', body=order_request('1000'))
+
+        # then
+        assert response.code == 400
+        assert response.body == b''
+        assert self.keeper.reservations == set()
+
+    @gen_test(timeout=10)
+    def test_should_sign_orders_concurrently(self):
+        # when
+        started = time.time()
+        responses = yield [self.http_client.fetch(HTTPRequest(self.get_url('/getOrder'), method='POST', body=order_request('1000')))
+                           for _ in range(10)]
+
+        # then
+        assert all(response.code == 200 for response in responses)
+        assert self.airswap_api.max_concurrent > 1
+        assert time.time() - started < 10 * 0.2
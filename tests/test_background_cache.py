@@ -0,0 +1,86 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+import pytest
+
+from market_maker_keeper.background_cache import BackgroundCache
+
+
+class TestBackgroundCache:
+    def test_should_serve_values_of_all_functions(self):
+        # given
+        cache = BackgroundCache({'a': lambda: 1, 'b': lambda: 2}, refresh_interval=3600, expiry=60)
+
+        # expect
+        assert cache.get('a') == 1
+        assert cache.get('b') == 2
+
+    def test_should_refresh_values(self):
+        # given
+        values = [1]
+        cache = BackgroundCache({'a': lambda: values[0]}, refresh_interval=3600, expiry=60)
+        assert cache.get('a') == 1
+
+        # when
+        values[0] = 2
+        cache.refresh()
+
+        # then
+        assert cache.get('a') == 2
+
+    def test_should_keep_last_value_if_refresh_fails(self):
+        # given
+        values = [1]
+
+        def function():
+            if values[0] is None:
+                raise Exception("RPC unavailable")
+            return values[0]
+
+        cache = BackgroundCache({'a': function}, refresh_interval=3600, expiry=60)
+        assert cache.get('a') == 1
+
+        # when
+        values[0] = None
+        cache.refresh()
+
+        # then
+        assert cache.get('a') == 1
+
+    def test_should_not_serve_stale_values(self):
+        # given
+        cache = BackgroundCache({'a': lambda: 1}, refresh_interval=3600, expiry=0)
+
+        # when
+        time.sleep(0.01)
+
+        # then
+        with pytest.raises(Exception):
+            cache.get('a')
+
+    def test_should_not_serve_values_never_fetched(self):
+        # given
+        def function():
+            raise Exception("RPC unavailable")
+
+        cache = BackgroundCache({'a': function}, refresh_interval=3600, expiry=60)
+
+        # expect
+        with pytest.raises(Exception):
+            cache.get('a')
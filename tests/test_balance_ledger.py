@@ -0,0 +1,90 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from market_maker_keeper.balance_ledger import BalanceLedger
+from pymaker.numeric import Wad
+
+
+class TestBalanceLedger:
+    @staticmethod
+    def create_ledger(balances: dict, reservation_ttl: int = 60) -> BalanceLedger:
+        return BalanceLedger({token: (lambda token=token: balances[token]) for token in balances.keys()},
+                             refresh_interval=3600, expiry=60, reservation_ttl=reservation_ttl)
+
+    def test_should_return_available_balance(self):
+        # given
+        ledger = self.create_ledger({'DAI': Wad.from_number(100)})
+
+        # expect
+        assert ledger.available('DAI') == Wad.from_number(100)
+        assert ledger.tracks('DAI')
+        assert not ledger.tracks('ETH')
+
+    def test_should_reserve_balance(self):
+        # given
+        ledger = self.create_ledger({'DAI': Wad.from_number(100)})
+
+        # when
+        assert ledger.reserve('quote-1', 'DAI', Wad.from_number(60))
+
+        # then
+        assert ledger.available('DAI') == Wad.from_number(40)
+
+    def test_should_not_promise_the_same_balance_twice(self):
+        # given
+        ledger = self.create_ledger({'DAI': Wad.from_number(100)})
+        assert ledger.reserve('quote-1', 'DAI', Wad.from_number(60))
+
+        # expect
+        assert not ledger.reserve('quote-2', 'DAI', Wad.from_number(60))
+        assert ledger.reserve('quote-3', 'DAI', Wad.from_number(40))
+        assert ledger.available('DAI') == Wad(0)
+
+    def test_should_release_reservation(self):
+        # given
+        ledger = self.create_ledger({'DAI': Wad.from_number(100)})
+        assert ledger.reserve('quote-1', 'DAI', Wad.from_number(60))
+
+        # when
+        ledger.release('quote-1')
+        ledger.release('quote-1')
+
+        # then
+        assert ledger.available('DAI') == Wad.from_number(100)
+
+    def test_should_release_expired_reservations(self):
+        # given
+        ledger = self.create_ledger({'DAI': Wad.from_number(100)}, reservation_ttl=0)
+        assert ledger.reserve('quote-1', 'DAI', Wad.from_number(60))
+
+        # when
+        time.sleep(0.01)
+
+        # then
+        assert ledger.available('DAI') == Wad.from_number(100)
+
+    def test_should_not_reserve_if_balance_unknown(self):
+        # given
+        def balance():
+            raise Exception("RPC unavailable")
+
+        ledger = BalanceLedger({'DAI': balance}, refresh_interval=3600, expiry=60, reservation_ttl=60)
+
+        # expect
+        assert not ledger.reserve('quote-1', 'DAI', Wad.from_number(1))
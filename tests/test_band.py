@@ -25,7 +25,8 @@ from pymaker.numeric import Wad
 
 
 class FakeOrder:
-    def __init__(self, amount: Wad, price: Wad):
+    def __init__(self, amount: Wad, price: Wad, order_id: int = 0):
+        self.order_id = order_id
         self.amount = amount
         self.price = price
 
@@ -161,6 +162,138 @@ class TestBands:
         # then
         assert(orders_to_cancel == [buy_order, sell_order])
 
+    def test_should_apply_margins_the_same_way_as_wad_multiplication(self, tmpdir):
+        # given
+        config = BandConfig.sample_config(tmpdir)
+        bands = self.create_bands(config)
+        buy_band = bands.buy_bands[0]
+        sell_band = bands.sell_bands[0]
+
+        # expect
+        for price in [Wad.from_number(100), Wad.from_number(0.000123), Wad(123456789012345678901)]:
+            for margin in [buy_band.min_margin, buy_band.avg_margin, buy_band.max_margin, 0.035]:
+                assert(buy_band._apply_margin(price, margin) == price * Wad.from_number(1 - margin))
+                assert(sell_band._apply_margin(price, margin) == price * Wad.from_number(1 + margin))
+
+    def test_should_recalculate_band_boundaries_when_target_price_changes(self, tmpdir):
+        # given
+        config = BandConfig.sample_config(tmpdir)
+        bands = self.create_bands(config)
+        buy_band = bands.buy_bands[0]
+
+        # and
+        order = FakeOrder(Wad.from_number(75), Wad.from_number(96))
+
+        # expect
+        assert(buy_band.includes(order, Wad.from_number(100)))
+        assert(not buy_band.includes(order, Wad.from_number(90)))
+        assert(buy_band.includes(order, Wad.from_number(100)))
+
+    def test_should_calculate_total_amount(self):
+        # given
+        orders = [FakeOrder(Wad(1), Wad.from_number(96)),
+                  FakeOrder(Wad.from_number(7.5), Wad.from_number(96)),
+                  FakeOrder(Wad.from_number(0.000001), Wad.from_number(96))]
+
+        # expect
+        assert(Bands.total_amount([]) == Wad(0))
+        assert(Bands.total_amount(orders) == Wad(1) + Wad.from_number(7.5) + Wad.from_number(0.000001))
+
+    def test_should_plan_nothing_if_ladder_is_already_in_place(self, tmpdir):
+        # given
+        config = BandConfig.sample_config(tmpdir)
+        bands = self.create_bands(config)
+
+        # and
+        buy_order = FakeOrder(Wad.from_number(75), Wad.from_number(96), order_id=1)
+        sell_order = FakeOrder(Wad.from_number(7.5), Wad.from_number(208), order_id=2)
+
+        # when
+        price = Price(buy_price=Wad.from_number(100), sell_price=Wad.from_number(200))
+        orders_to_cancel, new_orders, _, _ = bands.cancel_and_top_up_orders([buy_order], [sell_order], Wad.from_number(1000000), Wad.from_number(1000000), price)
+
+        # then
+        assert(orders_to_cancel == [])
+        assert(new_orders == [])
+
+    def test_should_not_top_up_bands_which_are_above_min_amount(self, tmpdir):
+        # given
+        config = BandConfig.sample_config(tmpdir)
+        bands = self.create_bands(config)
+
+        # and
+        buy_order = FakeOrder(Wad.from_number(60), Wad.from_number(96), order_id=1)
+        sell_order = FakeOrder(Wad.from_number(6), Wad.from_number(208), order_id=2)
+
+        # when
+        price = Price(buy_price=Wad.from_number(100), sell_price=Wad.from_number(200))
+        orders_to_cancel, new_orders, _, _ = bands.cancel_and_top_up_orders([buy_order], [sell_order], Wad.from_number(1000000), Wad.from_number(1000000), price)
+
+        # then
+        assert(orders_to_cancel == [])
+        assert(new_orders == [])
+
+    def test_should_plan_cancels_and_replacements_at_once_if_price_moves(self, tmpdir):
+        # given
+        config = BandConfig.sample_config(tmpdir)
+        bands = self.create_bands(config)
+
+        # and
+        buy_order = FakeOrder(Wad.from_number(75), Wad.from_number(96), order_id=1)
+        sell_order = FakeOrder(Wad.from_number(7.5), Wad.from_number(208), order_id=2)
+
+        # when
+        price = Price(buy_price=Wad.from_number(200), sell_price=Wad.from_number(400))
+        orders_to_cancel, new_orders, _, _ = bands.cancel_and_top_up_orders([buy_order], [sell_order], Wad.from_number(1000000), Wad.from_number(1000000), price)
+
+        # then
+        assert(orders_to_cancel == [buy_order, sell_order])
+        assert(len(new_orders) == 2)
+        assert(new_orders[0].is_sell is False)
+        assert(new_orders[0].price == Wad.from_number(192))
+        assert(new_orders[0].pay_amount == Wad.from_number(75))
+        assert(new_orders[1].is_sell is True)
+        assert(new_orders[1].price == Wad.from_number(416))
+        assert(new_orders[1].pay_amount == Wad.from_number(7.5))
+
+    def test_should_plan_top_up_if_cancelling_excessive_orders_brings_band_below_min(self, tmpdir):
+        # given
+        config = BandConfig.sample_config(tmpdir)
+        bands = self.create_bands(config)
+
+        # and
+        closest_order = FakeOrder(Wad.from_number(90), Wad.from_number(97), order_id=1)
+        other_order = FakeOrder(Wad.from_number(30), Wad.from_number(96), order_id=2)
+
+        # when
+        price = Price(buy_price=Wad.from_number(100), sell_price=None)
+        orders_to_cancel, new_orders, _, _ = bands.cancel_and_top_up_orders([closest_order, other_order], [], Wad.from_number(1000000), Wad.from_number(1000000), price)
+
+        # then
+        assert(orders_to_cancel == [closest_order])
+        assert(len(new_orders) == 1)
+        assert(new_orders[0].is_sell is False)
+        assert(new_orders[0].price == Wad.from_number(96))
+        assert(new_orders[0].pay_amount == Wad.from_number(45))
+
+    def test_should_plan_with_the_balances_as_passed(self, tmpdir):
+        # given
+        config = BandConfig.sample_config(tmpdir)
+        bands = self.create_bands(config)
+
+        # and
+        buy_order = FakeOrder(Wad.from_number(75), Wad.from_number(96), order_id=1)
+
+        # when
+        price = Price(buy_price=Wad.from_number(200), sell_price=None)
+        orders_to_cancel, new_orders, missing_buy_amount, _ = bands.cancel_and_top_up_orders([buy_order], [], Wad.from_number(20), Wad(0), price)
+
+        # then
+        assert(orders_to_cancel == [buy_order])
+        assert(len(new_orders) == 1)
+        assert(new_orders[0].pay_amount == Wad.from_number(20))
+        assert(missing_buy_amount == Wad.from_number(55))
+
     @staticmethod
     def create_bands(config_file):
         config = ReloadableConfig(str(config_file))
@@ -0,0 +1,148 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import operator
+import random
+from functools import reduce
+
+import pytest
+
+from market_maker_keeper.band import BuyBand, SellBand
+from pymaker.numeric import Wad
+
+
+class FakeOrder:
+    def __init__(self, order_id: int, amount: Wad, price: Wad):
+        self.order_id = order_id
+        self.amount = amount
+        self.price = price
+
+    @property
+    def sell_to_buy_price(self) -> Wad:
+        return self.price
+
+    @property
+    def buy_to_sell_price(self) -> Wad:
+        return self.price
+
+    @property
+    def remaining_sell_amount(self) -> Wad:
+        return self.amount
+
+
+class ValueOrder(FakeOrder):
+    """Order comparing equal to other orders with the same amount and price, as some pymaker orders do."""
+
+    def __eq__(self, other):
+        return (self.amount, self.price) == (other.amount, other.price)
+
+    def __hash__(self):
+        return hash((self.amount, self.price))
+
+
+def reference_excessive_orders(band, orders: list, target_price: Wad, is_first_band: bool, is_last_band: bool):
+    """The original, quadratic implementation of `Band.excessive_orders()`."""
+
+    def total_amount(orders):
+        return reduce(operator.add, map(lambda order: order.remaining_sell_amount, orders), Wad(0))
+
+    orders_in_band = [order for order in orders if band.includes(order, target_price)]
+
+    if is_first_band:
+        sorting = lambda order: abs(band.order_price(order) - target_price)
+        reverse = True
+
+    elif is_last_band:
+        sorting = lambda order: abs(band.order_price(order) - target_price)
+        reverse = False
+
+    else:
+        sorting = lambda order: order.remaining_sell_amount
+        reverse = True
+
+    orders_to_leave = sorted(orders_in_band, key=sorting, reverse=reverse)
+    while total_amount(orders_to_leave) > band.max_amount:
+        orders_to_leave.pop()
+
+    return set(orders_in_band) - set(orders_to_leave)
+
+
+def random_band(rand: random.Random, band_class):
+    min_amount = rand.choice([0.0, 0.5, 10.0, 50.0])
+    avg_amount = min_amount + rand.choice([0.0, 1.0, 25.0])
+    max_amount = avg_amount + rand.choice([0.0, 0.1, 30.0])
+
+    return band_class({'minMargin': 0.02,
+                       'avgMargin': 0.04,
+                       'maxMargin': 0.06,
+                       'minAmount': min_amount,
+                       'avgAmount': avg_amount,
+                       'maxAmount': max_amount,
+                       'dustCutoff': 0.0})
+
+
+def random_orders(rand: random.Random, target_price: Wad, order_class) -> list:
+    # a few distinct prices and amounts only, so there are plenty of ties in sorting,
+    # most prices fall into either the buy band or the sell band (between 2% and 6% from the target price)
+    prices = [target_price * Wad.from_number(rand.uniform(*rand.choice([(0.93, 0.99), (1.01, 1.07), (0.9, 1.1)])))
+              for _ in range(rand.randint(1, 6))]
+    amounts = [Wad.from_number(rand.choice([0.001, 0.1, 1.0, 5.0, 12.5, 40.0])) for _ in range(rand.randint(1, 4))]
+
+    return [order_class(order_id, rand.choice(amounts), rand.choice(prices)) for order_id in range(rand.randint(0, 40))]
+
+
+class TestBandExcessiveOrders:
+    @pytest.mark.parametrize('seed', range(200))
+    @pytest.mark.parametrize('band_class', [BuyBand, SellBand])
+    @pytest.mark.parametrize('is_first_band,is_last_band', [(True, False), (False, True), (True, True), (False, False)])
+    @pytest.mark.parametrize('order_class', [FakeOrder, ValueOrder])
+    def test_should_cancel_the_same_orders_as_the_reference_implementation(self, seed, band_class, is_first_band, is_last_band, order_class):
+        # given
+        rand = random.Random(seed)
+        band = random_band(rand, band_class)
+        target_price = Wad.from_number(rand.choice([0.0035, 1.0, 100.0, 12345.678]))
+        orders = random_orders(rand, target_price, order_class)
+
+        # when
+        result = band.excessive_orders(orders, target_price, is_first_band, is_last_band)
+
+        # then
+        expected = reference_excessive_orders(band, orders, target_price, is_first_band, is_last_band)
+        assert(result == expected)
+        if order_class == FakeOrder:
+            assert(sorted(map(id, result)) == sorted(map(id, expected)))
+
+    def test_should_not_cancel_anything_if_band_is_not_above_max_amount(self):
+        # given
+        band = BuyBand({'minMargin': 0.02, 'avgMargin': 0.04, 'maxMargin': 0.06,
+                        'minAmount': 50.0, 'avgAmount': 75.0, 'maxAmount': 100.0, 'dustCutoff': 0.0})
+        orders = [FakeOrder(1, Wad.from_number(60), Wad.from_number(96)),
+                  FakeOrder(2, Wad.from_number(40), Wad.from_number(95))]
+
+        # expect
+        assert(band.excessive_orders(orders, Wad.from_number(100), True, True) == set())
+
+    def test_should_cancel_smallest_orders_first_in_middle_bands(self):
+        # given
+        band = BuyBand({'minMargin': 0.02, 'avgMargin': 0.04, 'maxMargin': 0.06,
+                        'minAmount': 50.0, 'avgAmount': 75.0, 'maxAmount': 100.0, 'dustCutoff': 0.0})
+        big_order = FakeOrder(1, Wad.from_number(80), Wad.from_number(96))
+        medium_order = FakeOrder(2, Wad.from_number(15), Wad.from_number(95))
+        small_order = FakeOrder(3, Wad.from_number(10), Wad.from_number(97))
+
+        # expect
+        assert(band.excessive_orders([big_order, medium_order, small_order], Wad.from_number(100), False, False) == {small_order})
@@ -0,0 +1,71 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+from market_maker_keeper.batch import BatchExecutor
+
+
+class TestBatchExecutor:
+    def test_should_return_results_in_order(self):
+        # given
+        batch_executor = BatchExecutor()
+
+        # when
+        results = batch_executor.map(lambda item: item * 2, [3, 1, 2])
+
+        # then
+        assert results == [6, 2, 4]
+
+    def test_should_process_items_concurrently(self):
+        # given
+        batch_executor = BatchExecutor(max_workers=10)
+        barrier = threading.Barrier(10, timeout=5)
+
+        # when
+        results = batch_executor.map(lambda item: barrier.wait() is not None and item, list(range(10)))
+
+        # then
+        assert results == list(range(10))
+
+    def test_should_isolate_failures(self):
+        # given
+        batch_executor = BatchExecutor()
+
+        def function(item):
+            if item == 2:
+                raise Exception("Failed")
+
+            return item
+
+        # when
+        results = batch_executor.map(function, [1, 2, 3])
+
+        # then
+        assert results == [1, None, 3]
+
+    def test_should_pass_through_none_items(self):
+        # given
+        batch_executor = BatchExecutor()
+        calls = []
+
+        # when
+        results = batch_executor.map(lambda item: calls.append(item) or item, [1, None, 3])
+
+        # then
+        assert results == [1, None, 3]
+        assert sorted(calls) == [1, 3]
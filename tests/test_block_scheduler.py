@@ -0,0 +1,120 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from market_maker_keeper.block_scheduler import BlockScheduler
+
+
+class FakeMiddlewareStack:
+    def __init__(self):
+        self.middlewares = []
+
+    def add(self, middleware):
+        self.middlewares.append(middleware)
+
+
+class FakeWeb3:
+    def __init__(self):
+        self.block_number = 1
+        self.calls = 0
+        self.middleware_stack = FakeMiddlewareStack()
+
+        web3 = self
+
+        class FakeEth:
+            def getBlock(self, block_identifier):
+                method = 'eth_getBlockByNumber' if block_identifier in ['latest', 'pending'] else 'eth_getBlockByHash'
+                return web3.request(method, [block_identifier, False])['result']
+
+        self.eth = FakeEth()
+
+    def request(self, method, params):
+        def make_request(method, params):
+            self.calls += 1
+            if params[0] == 'pending':
+                return {'result': {'number': self.block_number + 1, 'hash': None}}
+
+            return {'result': {'number': self.block_number, 'hash': f"0x{self.block_number:064x}"}}
+
+        for middleware in self.middleware_stack.middlewares:
+            make_request = middleware(make_request, self)
+
+        return make_request(method, params)
+
+    def new_block(self, block_number: int):
+        # this is what `Lifecycle` does before it runs the callback
+        self.block_number = block_number
+        self.eth.getBlock(f"0x{block_number:064x}")
+
+
+class TestBlockScheduler:
+    def test_should_pass_block_fetched_by_lifecycle_to_callback(self):
+        # given
+        web3 = FakeWeb3()
+        blocks = []
+        block_scheduler = BlockScheduler(web3, lambda block: blocks.append(block))
+
+        # when
+        web3.new_block(1)
+        block_scheduler.on_block()
+
+        # then
+        assert blocks == [{'number': 1, 'hash': f"0x{1:064x}"}]
+        assert web3.calls == 1
+
+    def test_should_fetch_latest_block_if_none_seen_yet(self):
+        # given
+        web3 = FakeWeb3()
+        blocks = []
+        block_scheduler = BlockScheduler(web3, lambda block: blocks.append(block['number']))
+
+        # when
+        block_scheduler.on_block()
+
+        # then
+        assert blocks == [1]
+        assert web3.calls == 1
+
+    def test_should_not_process_the_same_block_twice(self):
+        # given
+        web3 = FakeWeb3()
+        blocks = []
+        block_scheduler = BlockScheduler(web3, lambda block: blocks.append(block['number']))
+
+        # when
+        web3.new_block(1)
+        block_scheduler.on_block()
+        block_scheduler.on_block()
+        web3.new_block(2)
+        block_scheduler.on_block()
+
+        # then
+        assert blocks == [1, 2]
+
+    def test_should_pass_the_newest_block_and_ignore_pending_ones(self):
+        # given
+        web3 = FakeWeb3()
+        blocks = []
+        block_scheduler = BlockScheduler(web3, lambda block: blocks.append(block['number']))
+
+        # when
+        web3.new_block(1)
+        web3.new_block(4)
+        web3.eth.getBlock('pending')
+        block_scheduler.on_block()
+
+        # then
+        assert blocks == [4]
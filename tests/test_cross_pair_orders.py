@@ -0,0 +1,111 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+from market_maker_keeper.cross_pair_orders import CrossPairOrderCache
+from pymaker.numeric import Wad
+
+
+class FakeOrder:
+    def __init__(self, is_sell: bool, amount: int):
+        self.is_sell = is_sell
+        self.remaining_sell_amount = Wad.from_number(amount)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestCrossPairOrderCache:
+    def test_should_total_orders_of_pairs_sharing_tokens(self):
+        # given
+        orders = {'WETH-USDC': [FakeOrder(True, 1), FakeOrder(False, 10)],
+                  'DAI-USDC': [FakeOrder(True, 2), FakeOrder(False, 20)],
+                  'WETH-DAI': [FakeOrder(True, 4), FakeOrder(False, 40)]}
+
+        # when
+        cache = CrossPairOrderCache(lambda pair: orders[pair], list(orders.keys()), buy_token='usdc', sell_token='weth',
+                                    refresh_frequency=1)
+
+        # then
+        assert cache.locked_amounts() == (Wad.from_number(30), Wad.from_number(5))
+
+    def test_should_fetch_pairs_concurrently(self):
+        # given
+        barrier = threading.Barrier(3, timeout=5)
+
+        def get_orders(pair):
+            barrier.wait()
+            return [FakeOrder(False, 1)]
+
+        # when
+        cache = CrossPairOrderCache(get_orders, ['A-USDC', 'B-USDC', 'C-USDC'], buy_token='usdc', sell_token='weth',
+                                    refresh_frequency=1)
+
+        # then
+        assert cache.locked_amounts() == (Wad.from_number(3), Wad(0))
+
+    def test_should_update_totals_incrementally(self):
+        # given
+        orders = {'WETH-USDC': [FakeOrder(False, 10)], 'DAI-USDC': [FakeOrder(False, 20)]}
+        cache = CrossPairOrderCache(lambda pair: orders[pair], list(orders.keys()), buy_token='usdc', sell_token='weth',
+                                    refresh_frequency=0)
+        assert cache.locked_amounts() == (Wad.from_number(30), Wad(0))
+
+        # when
+        orders['DAI-USDC'] = []
+
+        # then
+        wait_for(lambda: cache.locked_amounts() == (Wad.from_number(10), Wad(0)))
+        assert cache.locked_amounts() == (Wad.from_number(10), Wad(0))
+
+    def test_should_keep_last_known_orders_if_fetching_fails(self):
+        # given
+        orders = {'WETH-USDC': [FakeOrder(False, 10)]}
+        cache = CrossPairOrderCache(lambda pair: orders[pair], list(orders.keys()), buy_token='usdc', sell_token='weth',
+                                    refresh_frequency=0)
+        assert cache.locked_amounts() == (Wad.from_number(10), Wad(0))
+
+        # when
+        del orders['WETH-USDC']
+        time.sleep(0.1)
+
+        # then
+        assert cache.locked_amounts() == (Wad.from_number(10), Wad(0))
+
+    def test_should_give_up_waiting_for_pairs_which_never_become_available(self):
+        # given
+        def get_orders(pair):
+            if pair == 'DAI-USDC':
+                raise Exception("Pair unavailable")
+
+            return [FakeOrder(False, 10)]
+
+        cache = CrossPairOrderCache(get_orders, ['WETH-USDC', 'DAI-USDC'], buy_token='usdc', sell_token='weth',
+                                    refresh_frequency=0)
+
+        # when
+        started = time.time()
+        locked_amounts = cache.locked_amounts(timeout=0.2)
+
+        # then
+        assert locked_amounts is None
+        assert time.time() - started < 1.0
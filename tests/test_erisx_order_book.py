@@ -0,0 +1,118 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+from market_maker_keeper.erisx_market_maker_keeper import ErisXOrderBookManager
+
+
+class FakeOrder:
+    def __init__(self, order_id: str):
+        self.order_id = order_id
+
+
+class FakeFixSession:
+    def __init__(self):
+        self.orders = []
+        self.threads = set()
+        self.active_requests = 0
+        self.max_active_requests = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.lock = threading.Lock()
+
+    def _request(self, function):
+        with self.lock:
+            self.threads.add(threading.get_ident())
+            self.active_requests += 1
+            self.max_active_requests = max(self.max_active_requests, self.active_requests)
+
+        try:
+            self.release.wait()
+            return function()
+        finally:
+            with self.lock:
+                self.active_requests -= 1
+
+    def get_orders(self):
+        return self._request(lambda: list(self.orders))
+
+    def place_order(self, order_id: str):
+        def place():
+            order = FakeOrder(order_id)
+            self.orders.append(order)
+            return order
+
+        return self._request(place)
+
+    def cancel_order(self, order: FakeOrder):
+        def cancel():
+            self.orders = [existing for existing in self.orders if existing.order_id != order.order_id]
+            return True
+
+        return self._request(cancel)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestErisXOrderBookManager:
+    def setup_method(self):
+        self.fix_session = FakeFixSession()
+        self.order_book_manager = ErisXOrderBookManager(refresh_frequency=1)
+        self.order_book_manager.get_orders_with(self.fix_session.get_orders)
+        self.order_book_manager.cancel_orders_with(self.fix_session.cancel_order)
+        self.order_book_manager.start()
+        self.order_book_manager.get_order_book()
+
+    def test_should_not_block_readers_while_request_is_in_progress(self):
+        # given
+        self.fix_session.release.clear()
+
+        # when
+        self.order_book_manager.place_order(lambda: self.fix_session.place_order('1'))
+
+        # then
+        order_book = self.order_book_manager.get_order_book()
+        assert order_book.orders_being_placed
+
+        # when
+        self.fix_session.release.set()
+        self.order_book_manager.wait_for_stable_order_book()
+
+        # then
+        assert [order.order_id for order in self.order_book_manager.get_order_book().orders] == ['1']
+
+    def test_should_send_all_requests_from_one_thread(self):
+        # when
+        for order_id in ['1', '2', '3']:
+            self.order_book_manager.place_order(lambda order_id=order_id: self.fix_session.place_order(order_id))
+
+        self.order_book_manager.wait_for_stable_order_book()
+        self.order_book_manager.cancel_orders(self.order_book_manager.get_order_book().orders)
+        self.order_book_manager.wait_for_stable_order_book()
+        self.order_book_manager.wait_for_order_book_refresh()
+
+        # then
+        assert self.fix_session.orders == []
+        assert self.order_book_manager.get_order_book().orders == []
+        assert len(self.fix_session.threads) == 1
+        assert self.fix_session.max_active_requests == 1
@@ -0,0 +1,108 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import time
+
+from market_maker_keeper.etherdelta_publisher import EtherDeltaPublisher
+from pymaker.etherdelta import Order
+
+
+class FakeOrder(Order):
+    def __init__(self, nonce: int):
+        self.nonce = nonce
+
+    def to_json(self) -> dict:
+        return {'nonce': self.nonce}
+
+    def __repr__(self):
+        return f"FakeOrder({self.nonce})"
+
+
+class FakeWebSocket:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.messages = []
+
+    def send(self, message: str):
+        if self.fail:
+            raise Exception("Connection lost")
+
+        self.messages.append(message)
+
+
+class OfflineEtherDeltaPublisher(EtherDeltaPublisher):
+    def _connection_run(self):
+        pass
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestEtherDeltaPublisher:
+    def test_should_build_socket_url(self):
+        assert EtherDeltaPublisher.socket_url("https://socket.etherdelta.com") == \
+               "wss://socket.etherdelta.com/socket.io/?EIO=3&transport=websocket"
+        assert EtherDeltaPublisher.socket_url("http://localhost:8080/") == \
+               "ws://localhost:8080/socket.io/?EIO=3&transport=websocket"
+
+    def test_should_publish_all_orders_over_one_connection(self):
+        # given
+        publisher = OfflineEtherDeltaPublisher("https://socket.etherdelta.com", number_of_attempts=3, retry_interval=1, timeout=10)
+        publisher._ws = FakeWebSocket()
+        publisher._on_message(publisher._ws, '0{"sid":"abc","pingInterval":25000,"pingTimeout":60000}')
+        publisher._on_message(publisher._ws, '40')
+
+        # when
+        publisher.publish_orders([FakeOrder(1), FakeOrder(2), FakeOrder(3)])
+
+        # then
+        wait_for(lambda: len(publisher._ws.messages) == 3)
+        assert publisher._ws.messages == ['42' + json.dumps(['message', {'nonce': nonce}]) for nonce in [1, 2, 3]]
+
+    def test_should_retry_until_connected(self):
+        # given
+        publisher = OfflineEtherDeltaPublisher("https://socket.etherdelta.com", number_of_attempts=3, retry_interval=1, timeout=10)
+        publisher._ws = FakeWebSocket(fail=True)
+        publisher._on_message(publisher._ws, '40')
+
+        # when
+        publisher.publish_order(FakeOrder(1))
+        time.sleep(0.1)
+
+        # and
+        publisher._ws = FakeWebSocket()
+        publisher._on_message(publisher._ws, '40')
+
+        # then
+        wait_for(lambda: len(publisher._ws.messages) > 0)
+        assert publisher._ws.messages == ['42' + json.dumps(['message', {'nonce': 1}])]
+
+    def test_should_drop_orders_after_number_of_attempts(self):
+        # given
+        publisher = OfflineEtherDeltaPublisher("https://socket.etherdelta.com", number_of_attempts=2, retry_interval=0, timeout=10)
+
+        # when
+        publisher.publish_order(FakeOrder(1))
+
+        # then
+        wait_for(lambda: publisher._queue.empty())
+        time.sleep(0.1)
+        assert publisher._queue.empty()
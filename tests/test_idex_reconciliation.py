@@ -0,0 +1,146 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from eth_abi import encode_abi
+from web3 import Web3
+
+from market_maker_keeper.idex_reconciliation import IdexBalanceReconciliation
+from pymaker import Address
+from pymaker.numeric import Wad
+
+IDEX_ADDRESS = Address('0x2a0c0dbecc7e4d658f48e01e3fa353f44050c208')
+OUR_ADDRESS = Address('0x0000000000000000000000000000000000000001')
+OTHER_ADDRESS = Address('0x0000000000000000000000000000000000000002')
+
+
+class FakeEventFilter:
+    def __init__(self):
+        self.new_entries = []
+
+    def get_new_entries(self):
+        result, self.new_entries = self.new_entries, []
+        return result
+
+
+class FakeWeb3:
+    def __init__(self, event_filter: FakeEventFilter):
+        class FakeEth:
+            def filter(self, filter_params):
+                assert(filter_params['address'] == IDEX_ADDRESS.address)
+                return event_filter
+
+        self.eth = FakeEth()
+
+
+class ContractBalances:
+    def __init__(self, balances: tuple):
+        self.balances = balances
+        self.calls = 0
+
+    def __call__(self) -> tuple:
+        self.calls += 1
+        return self.balances
+
+
+def deposit_log(user: Address, topic: str = IdexBalanceReconciliation.DEPOSIT_TOPIC) -> dict:
+    data = encode_abi(['address', 'address', 'uint256', 'uint256'], ['0x' + '00' * 20, user.address, 1, 1])
+    return {'topics': [topic], 'data': Web3.toHex(data)}
+
+
+# keccak256 of `Withdraw(address,address,uint256,uint256)`, as emitted by the IDEX contract
+WITHDRAW_TOPIC = '0xf341246adaac6f497bc2a656f546ab9e182111d630394f0c57c710a59a2cb567'
+
+
+def withdraw_log(user: Address) -> dict:
+    return deposit_log(user, WITHDRAW_TOPIC)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestIdexBalanceReconciliation:
+    def setup_method(self):
+        self.event_filter = FakeEventFilter()
+        self.contract_balances = ContractBalances((Wad.from_number(1), Wad.from_number(2)))
+        self.reconciliation = IdexBalanceReconciliation(web3=FakeWeb3(self.event_filter),
+                                                        idex_address=IDEX_ADDRESS,
+                                                        our_address=OUR_ADDRESS,
+                                                        contract_balances_function=self.contract_balances,
+                                                        poll_interval=0.01)
+        wait_for(lambda: self.reconciliation._watching)
+
+    def test_should_not_check_contract_again_if_nothing_changed(self):
+        # when
+        assert self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(2)))
+        assert self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(2)))
+
+        # then
+        assert self.contract_balances.calls == 1
+
+    def test_should_check_contract_again_if_api_balances_changed(self):
+        # when
+        assert self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(2)))
+        assert not self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(3)))
+        assert not self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(3)))
+
+        # then
+        assert self.contract_balances.calls == 3
+
+    def test_should_check_contract_again_after_our_deposit(self):
+        # given
+        assert self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(2)))
+
+        # when
+        self.event_filter.new_entries = [deposit_log(OUR_ADDRESS)]
+        wait_for(lambda: self.reconciliation._verified_api_balances is None)
+
+        # then
+        assert self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(2)))
+        assert self.contract_balances.calls == 2
+
+    def test_should_watch_for_the_withdraw_event_emitted_by_idex(self):
+        # expect
+        assert IdexBalanceReconciliation.WITHDRAW_TOPIC == WITHDRAW_TOPIC
+
+    def test_should_check_contract_again_after_our_withdrawal(self):
+        # given
+        assert self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(2)))
+
+        # when
+        self.event_filter.new_entries = [withdraw_log(OUR_ADDRESS)]
+        wait_for(lambda: self.reconciliation._verified_api_balances is None)
+
+        # then
+        assert self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(2)))
+        assert self.contract_balances.calls == 2
+
+    def test_should_ignore_deposits_of_other_users(self):
+        # given
+        assert self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(2)))
+
+        # when
+        self.event_filter.new_entries = [deposit_log(OTHER_ADDRESS)]
+        wait_for(lambda: len(self.event_filter.new_entries) == 0)
+
+        # then
+        assert self.reconciliation.balances_match((Wad.from_number(1), Wad.from_number(2)))
+        assert self.contract_balances.calls == 1
@@ -0,0 +1,132 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import time
+
+import pytest
+
+from market_maker_keeper.imtoken_quote_store import InProcessQuoteStore, SqliteQuoteStore
+
+
+def put_quote_in_another_process(filename: str, quote_id: str):
+    SqliteQuoteStore(filename, maxsize=100, ttl=10).put(quote_id, {'uniqId': 'abc', 'price': 1.5, 'amount': '2'})
+
+
+class TestInProcessQuoteStore:
+    def test_should_pop_stored_quote(self):
+        # given
+        store = InProcessQuoteStore(maxsize=100, ttl=10)
+        store.put('quote-1', {'price': 1.5})
+
+        # expect
+        assert store.pop('quote-1') == {'price': 1.5}
+
+        # and
+        with pytest.raises(KeyError):
+            store.pop('quote-1')
+
+
+class TestSqliteQuoteStore:
+    def test_should_pop_stored_quote_only_once(self, tmpdir):
+        # given
+        store = SqliteQuoteStore(str(tmpdir.join("quotes.sqlite")), maxsize=100, ttl=10)
+        store.put('quote-1', {'uniqId': 'abc', 'price': 1.5, 'amount': '2'})
+
+        # expect
+        assert store.pop('quote-1') == {'uniqId': 'abc', 'price': 1.5, 'amount': '2'}
+
+        # and
+        with pytest.raises(KeyError):
+            store.pop('quote-1')
+
+    def test_should_raise_key_error_for_unknown_quote(self, tmpdir):
+        # given
+        store = SqliteQuoteStore(str(tmpdir.join("quotes.sqlite")), maxsize=100, ttl=10)
+
+        # expect
+        with pytest.raises(KeyError):
+            store.pop('unknown')
+
+    def test_should_not_return_expired_quotes(self, tmpdir):
+        # given
+        store = SqliteQuoteStore(str(tmpdir.join("quotes.sqlite")), maxsize=100, ttl=0)
+        store.put('quote-1', {'price': 1.5})
+
+        # when
+        time.sleep(0.01)
+
+        # then
+        with pytest.raises(KeyError):
+            store.pop('quote-1')
+
+    def test_should_evict_oldest_quotes_above_maxsize(self, tmpdir):
+        # given
+        store = SqliteQuoteStore(str(tmpdir.join("quotes.sqlite")), maxsize=2, ttl=10)
+        store.put('quote-1', {'price': 1.0})
+        time.sleep(0.01)
+        store.put('quote-2', {'price': 2.0})
+        time.sleep(0.01)
+
+        # when
+        store._last_purge = 0.0
+        store.put('quote-3', {'price': 3.0})
+
+        # then
+        with pytest.raises(KeyError):
+            store.pop('quote-1')
+        assert store.pop('quote-2') == {'price': 2.0}
+        assert store.pop('quote-3') == {'price': 3.0}
+
+    def test_should_share_quotes_between_processes(self, tmpdir):
+        # given
+        filename = str(tmpdir.join("quotes.sqlite"))
+        store = SqliteQuoteStore(filename, maxsize=100, ttl=10)
+
+        # when
+        process = multiprocessing.Process(target=put_quote_in_another_process, args=(filename, 'quote-1'))
+        process.start()
+        process.join()
+
+        # then
+        assert store.pop('quote-1') == {'uniqId': 'abc', 'price': 1.5, 'amount': '2'}
+
+    def test_should_remove_database_files(self, tmpdir):
+        # given
+        filename = str(tmpdir.join("quotes.sqlite"))
+        store = SqliteQuoteStore(filename, maxsize=100, ttl=10)
+        store.put('quote-1', {'price': 1.0})
+
+        # when
+        store.remove()
+
+        # then
+        assert tmpdir.listdir() == []
+
+    def test_should_not_keep_connection_open_until_first_used(self, tmpdir):
+        # when
+        store = SqliteQuoteStore(str(tmpdir.join("quotes.sqlite")), maxsize=100, ttl=10)
+
+        # then
+        assert store._connection is None
+
+        # when
+        store.put('quote-1', {'price': 1.0})
+
+        # then
+        assert store._connection is not None
+        assert store.pop('quote-1') == {'price': 1.0}
@@ -0,0 +1,133 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from market_maker_keeper.feed import FixedFeed
+from market_maker_keeper.imtoken_quotes import ImtokenQuoteTable
+from market_maker_keeper.imtoken_utils import ImtokenPair
+from market_maker_keeper.limit import History
+from market_maker_keeper.price_feed import Price, PriceFeed
+from market_maker_keeper.reloadable_config import ReloadableConfig
+from tests.band_config import BandConfig
+from pymaker.numeric import Wad
+
+
+class FakePriceFeed(PriceFeed):
+    def __init__(self, price: Wad):
+        self.price = price
+
+    def get_price(self) -> Price:
+        return Price(buy_price=self.price, sell_price=self.price)
+
+
+class CountingQuoteTable(ImtokenQuoteTable):
+    def __init__(self, *args, **kwargs):
+        self.builds = 0
+        super().__init__(*args, **kwargs)
+
+    def _build_quotes(self, pair, config: dict, target_price):
+        self.builds += 1
+        return super()._build_quotes(pair, config, target_price)
+
+
+class TestImtokenQuoteTable:
+    @staticmethod
+    def create_table(tmpdir, price_feed: PriceFeed, control_feed_value: dict = None):
+        pair = ImtokenPair('ETH/DAI')
+        config = {
+            'bands_config': ReloadableConfig(str(BandConfig.sample_config(tmpdir))),
+            'price_feed': price_feed,
+            'spread_feed': FixedFeed({}),
+            'control_feed': FixedFeed(control_feed_value if control_feed_value is not None else {'canBuy': True, 'canSell': True}),
+            'history': History()
+        }
+
+        return CountingQuoteTable([pair], {pair.base_pair: config, pair.counter_pair: config}, refresh_interval=3600.0)
+
+    def test_should_calculate_quotes_from_the_first_bands(self, tmpdir):
+        # when
+        table = self.create_table(tmpdir, FakePriceFeed(Wad.from_number(100)))
+
+        # then
+        assert table.get_quote('DAI/ETH', 'BUY').price == Wad.from_number(96)
+        assert table.get_quote('DAI/ETH', 'BUY').max_amount == Wad.from_number(100)
+        assert table.get_quote('DAI/ETH', 'SELL').price == Wad.from_number(104)
+        assert table.get_quote('DAI/ETH', 'SELL').max_amount == Wad.from_number(10)
+
+        # and
+        assert table.get_quote('ETH/DAI', 'SELL').price == Wad.from_number(1) / Wad.from_number(96)
+        assert table.get_quote('ETH/DAI', 'SELL').max_amount == Wad.from_number(100)
+        assert table.get_quote('ETH/DAI', 'BUY').price == Wad.from_number(1) / Wad.from_number(104)
+        assert table.get_quote('ETH/DAI', 'BUY').max_amount == Wad.from_number(10)
+
+    def test_should_support_both_directions_of_configured_pairs_only(self, tmpdir):
+        # when
+        table = self.create_table(tmpdir, FakePriceFeed(Wad.from_number(100)))
+
+        # then
+        assert table.supports('ETH/DAI')
+        assert table.supports('DAI/ETH')
+        assert not table.supports('MKR/DAI')
+
+    def test_should_not_rebuild_quotes_if_nothing_changed(self, tmpdir):
+        # given
+        table = self.create_table(tmpdir, FakePriceFeed(Wad.from_number(100)))
+        assert table.builds == 1
+
+        # when
+        table.refresh()
+        table.refresh()
+
+        # then
+        assert table.builds == 1
+
+    def test_should_rebuild_quotes_when_price_changes(self, tmpdir):
+        # given
+        price_feed = FakePriceFeed(Wad.from_number(100))
+        table = self.create_table(tmpdir, price_feed)
+
+        # when
+        price_feed.price = Wad.from_number(200)
+        table.refresh()
+
+        # then
+        assert table.builds == 2
+        assert table.get_quote('DAI/ETH', 'BUY').price == Wad.from_number(192)
+
+    def test_should_not_quote_if_price_not_available(self, tmpdir):
+        # given
+        price_feed = FakePriceFeed(Wad.from_number(100))
+        table = self.create_table(tmpdir, price_feed)
+
+        # when
+        price_feed.price = None
+        table.refresh()
+
+        # then
+        assert table.get_quote('DAI/ETH', 'BUY') is None
+        assert table.get_quote('DAI/ETH', 'SELL') is None
+        assert table.get_quote('ETH/DAI', 'BUY') is None
+        assert table.get_quote('ETH/DAI', 'SELL') is None
+
+    def test_should_not_quote_sides_disabled_by_the_control_feed(self, tmpdir):
+        # when
+        table = self.create_table(tmpdir, FakePriceFeed(Wad.from_number(100)), {'canBuy': True, 'canSell': False})
+
+        # then
+        assert table.get_quote('DAI/ETH', 'BUY') is not None
+        assert table.get_quote('DAI/ETH', 'SELL') is None
+        assert table.get_quote('ETH/DAI', 'SELL') is not None
+        assert table.get_quote('ETH/DAI', 'BUY') is None
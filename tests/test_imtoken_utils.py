@@ -0,0 +1,96 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+import tornado.web
+from tornado.testing import AsyncHTTPTestCase
+
+from market_maker_keeper.balance_ledger import BalanceLedger
+from market_maker_keeper.imtoken_quote_store import InProcessQuoteStore
+from market_maker_keeper.imtoken_quotes import ImtokenQuote
+from market_maker_keeper.imtoken_pricing_server import deal_schema
+from market_maker_keeper.imtoken_utils import PriceHandler, IndicativePriceHandler, DealHandler
+from pymaker.numeric import Wad
+
+
+class FakeQuoteTable:
+    def supports(self, query_pair: str) -> bool:
+        return query_pair in ['DAI/ETH', 'ETH/DAI']
+
+    def get_quote(self, query_pair: str, our_side: str):
+        return ImtokenQuote(price=Wad.from_number(100), min_amount=Wad.from_number(1), max_amount=Wad.from_number(10))
+
+
+class TestImtokenPricingHandlers(AsyncHTTPTestCase):
+    def get_app(self):
+        self.cache = InProcessQuoteStore(maxsize=100, ttl=60)
+        self.balance_ledger = BalanceLedger({'ETH': lambda: Wad.from_number(5), 'DAI': lambda: Wad.from_number(1000)},
+                                            refresh_interval=3600, expiry=60, reservation_ttl=60)
+
+        return tornado.web.Application([
+            (r"/indicativePrice", IndicativePriceHandler, dict(quote_table=FakeQuoteTable(),
+                                                               cache=self.cache,
+                                                               balance_ledger=self.balance_ledger)),
+            (r"/price", PriceHandler, dict(quote_table=FakeQuoteTable(),
+                                           cache=self.cache,
+                                           balance_ledger=self.balance_ledger)),
+            (r"/deal", DealHandler, dict(cache=self.cache,
+                                         schema=deal_schema(),
+                                         balance_ledger=self.balance_ledger))
+        ])
+
+    def price(self, side: str, amount: float) -> dict:
+        return json.loads(self.fetch(f"/price?base=ETH&quote=DAI&side={side}&amount={amount}&uniqId=abc").body)
+
+    def test_should_reserve_payout_of_firm_quotes(self):
+        # when
+        response = self.price('BUY', 3)
+
+        # then
+        assert response['exchangeable']
+        assert self.balance_ledger.available('ETH') == Wad.from_number(2)
+
+        # and
+        assert not self.price('BUY', 3)['exchangeable']
+
+    def test_should_reserve_quote_token_if_taker_sells(self):
+        # when
+        response = self.price('SELL', 4)
+
+        # then
+        assert response['exchangeable']
+        assert self.balance_ledger.available('DAI') == Wad.from_number(600)
+
+    def test_should_not_reserve_on_indicative_quotes(self):
+        # when
+        response = json.loads(self.fetch("/indicativePrice?base=ETH&quote=DAI&side=BUY&amount=3").body)
+
+        # then
+        assert response['exchangeable']
+        assert self.balance_ledger.available('ETH') == Wad.from_number(5)
+
+    def test_should_release_reservation_on_deal(self):
+        # given
+        quote_id = self.price('BUY', 3)['quoteId']
+
+        # when
+        response = self.fetch("/deal", method='POST', body=json.dumps({'quoteId': quote_id}))
+
+        # then
+        assert json.loads(response.body)['result']
+        assert self.balance_ledger.available('ETH') == Wad.from_number(5)
@@ -0,0 +1,76 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from market_maker_keeper.oasis_order_index import OasisOrderIndex
+from pymaker.approval import directly
+from pymaker.deployment import Deployment
+from pymaker.numeric import Wad
+from pymaker.token import DSToken
+
+
+class TestOasisOrderIndex:
+    @staticmethod
+    def make_orders(deployment: Deployment):
+        DSToken(web3=deployment.web3, address=deployment.gem.address).mint(Wad.from_number(1000)).transact()
+        DSToken(web3=deployment.web3, address=deployment.sai.address).mint(Wad.from_number(1000)).transact()
+
+        deployment.otc.approve([deployment.gem, deployment.sai], directly())
+        deployment.otc.make(deployment.gem.address, Wad.from_number(10), deployment.sai.address, Wad.from_number(5)).transact()
+        deployment.otc.make(deployment.sai.address, Wad.from_number(5), deployment.gem.address, Wad.from_number(12)).transact()
+
+    @staticmethod
+    def order_index(deployment: Deployment) -> OasisOrderIndex:
+        return OasisOrderIndex(otc=deployment.otc,
+                               our_address=deployment.our_address,
+                               full_scan_function=lambda: deployment.otc.get_orders())
+
+    def test_should_find_our_orders_with_a_full_scan(self, deployment: Deployment):
+        # given
+        self.make_orders(deployment)
+        order_index = self.order_index(deployment)
+
+        # expect
+        assert len(order_index.get_orders()) == 2
+
+    def test_should_track_new_and_killed_orders_from_events(self, deployment: Deployment):
+        # given
+        order_index = self.order_index(deployment)
+        assert len(order_index.get_orders()) == 0
+
+        # when
+        self.make_orders(deployment)
+
+        # then
+        assert len(order_index.get_orders()) == 2
+
+        # when
+        deployment.otc.kill(order_index.get_orders()[0].order_id).transact()
+
+        # then
+        assert len(order_index.get_orders()) == 1
+        assert len(order_index.get_orders()) == len(deployment.otc.get_orders())
+
+    def test_should_seed_from_events(self, deployment: Deployment):
+        # given
+        self.make_orders(deployment)
+        order_index = self.order_index(deployment)
+
+        # when
+        order_index.seed_from_events(100)
+
+        # then
+        assert len(order_index.get_orders()) == 2
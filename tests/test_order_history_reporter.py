@@ -0,0 +1,253 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import gzip
+import json
+import os
+import time
+
+from market_maker_keeper.order_history_reporter import OrderHistoryReporter, create_order_history_reporter
+from pymaker.numeric import Wad
+
+
+class FakeOrder:
+    def __init__(self, amount: Wad, price: Wad):
+        self.remaining_buy_amount = amount
+        self.remaining_sell_amount = amount
+        self.sell_to_buy_price = price
+        self.buy_to_sell_price = price
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = ''
+
+
+class FakeSession:
+    def __init__(self):
+        self.available = True
+        self.status_code = 200
+        self.requests = []
+        self.delay = 0.0
+
+    def post(self, url, data, headers, timeout):
+        time.sleep(self.delay)
+
+        if not self.available:
+            raise Exception("Connection refused")
+
+        if headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+
+        if self.status_code < 400:
+            self.requests.append(json.loads(data.decode('utf-8')))
+
+        return FakeResponse(self.status_code)
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert condition()
+
+
+class TestOrderHistoryReporter:
+    @staticmethod
+    def create_reporter(**kwargs) -> (OrderHistoryReporter, FakeSession):
+        reporter = OrderHistoryReporter("http://localhost:8080/orders", 0, **kwargs)
+        reporter._session = FakeSession()
+        return reporter, reporter._session
+
+    def test_should_report_orders(self):
+        # given
+        reporter, session = self.create_reporter()
+
+        # when
+        reporter.report_orders([FakeOrder(Wad.from_number(1), Wad.from_number(100))],
+                               [FakeOrder(Wad.from_number(2), Wad.from_number(110))])
+
+        # then
+        wait_until(lambda: len(session.requests) == 1)
+        assert session.requests[0]['orders'] == [{"amount": "1.000000000000000000", "price": "100.000000000000000000", "type": "buy"},
+                                                 {"amount": "2.000000000000000000", "price": "110.000000000000000000", "type": "sell"}]
+
+    def test_should_report_orders_gzip_compressed(self):
+        # given
+        reporter, session = self.create_reporter(gzip=True)
+
+        # when
+        reporter.report_orders([FakeOrder(Wad.from_number(1), Wad.from_number(100))], [])
+
+        # then
+        wait_until(lambda: len(session.requests) == 1)
+        assert session.requests[0]['orders'][0]['type'] == 'buy'
+
+    def test_should_not_report_more_often_than_frequency(self):
+        # given
+        reporter, session = self.create_reporter()
+        reporter.frequency = 3600
+
+        # when
+        reporter.report_orders([], [])
+        reporter.report_orders([], [])
+
+        # then
+        wait_until(lambda: len(session.requests) == 1)
+        time.sleep(0.1)
+        assert len(session.requests) == 1
+
+    def test_should_keep_the_queue_bounded(self):
+        # given
+        reporter, session = self.create_reporter(queue_size=2)
+        session.delay = 0.2
+
+        # when
+        for amount in range(1, 11):
+            reporter.report_orders([FakeOrder(Wad.from_number(amount), Wad.from_number(100))], [])
+
+        # then
+        assert len(reporter._queue) <= 2
+
+        # and
+        wait_until(lambda: len(session.requests) > 0 and session.requests[-1]['orders'][0]['amount'] == "10.000000000000000000")
+        assert len(session.requests) <= 3
+
+    def test_should_spool_and_replay_reports_in_order_after_outage(self, tmpdir):
+        # given
+        reporter, session = self.create_reporter(spool_directory=str(tmpdir))
+        session.available = False
+
+        # when
+        for amount in range(1, 4):
+            reporter.report_orders([FakeOrder(Wad.from_number(amount), Wad.from_number(100))], [])
+            time.sleep(0.05)
+
+        # then
+        wait_until(lambda: len(os.listdir(str(tmpdir))) == 3)
+
+        # when
+        session.available = True
+        reporter.report_orders([FakeOrder(Wad.from_number(4), Wad.from_number(100))], [])
+
+        # then
+        wait_until(lambda: len(session.requests) == 4)
+        assert [request['orders'][0]['amount'] for request in session.requests] == \
+               ["1.000000000000000000", "2.000000000000000000", "3.000000000000000000", "4.000000000000000000"]
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_should_keep_the_spool_bounded(self, tmpdir):
+        # given
+        reporter, session = self.create_reporter(spool_directory=str(tmpdir), spool_size=2)
+        session.available = False
+
+        # when
+        for amount in range(1, 6):
+            reporter.report_orders([FakeOrder(Wad.from_number(amount), Wad.from_number(100))], [])
+            time.sleep(0.05)
+
+        # then
+        time.sleep(0.1)
+        assert len(os.listdir(str(tmpdir))) == 2
+
+    def test_should_not_retry_reports_rejected_by_the_endpoint(self, tmpdir):
+        # given
+        reporter, session = self.create_reporter(spool_directory=str(tmpdir))
+        session.status_code = 400
+
+        # when
+        reporter.report_orders([], [])
+
+        # then
+        time.sleep(0.1)
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_should_report_only_changes_in_delta_mode(self):
+        # given
+        reporter, session = self.create_reporter(full_every=3600)
+        order_1 = FakeOrder(Wad.from_number(1), Wad.from_number(100))
+        order_2 = FakeOrder(Wad.from_number(2), Wad.from_number(101))
+        order_3 = FakeOrder(Wad.from_number(3), Wad.from_number(102))
+
+        # when
+        reporter.report_orders([order_1, order_2], [])
+        wait_until(lambda: len(session.requests) == 1)
+        reporter.report_orders([order_2, order_3], [])
+        wait_until(lambda: len(session.requests) == 2)
+
+        # then
+        assert session.requests[0]['type'] == 'full'
+        assert len(session.requests[0]['orders']) == 2
+
+        # and
+        assert session.requests[1]['type'] == 'delta'
+        assert session.requests[1]['since'] == session.requests[0]['timestamp']
+        assert session.requests[1]['added'] == [{"amount": "3.000000000000000000", "price": "102.000000000000000000", "type": "buy"}]
+        assert session.requests[1]['removed'] == [{"amount": "1.000000000000000000", "price": "100.000000000000000000", "type": "buy"}]
+
+    def test_should_send_full_snapshot_periodically_in_delta_mode(self):
+        # given
+        reporter, session = self.create_reporter(full_every=3600)
+        reporter.report_orders([], [])
+        wait_until(lambda: len(session.requests) == 1)
+
+        # when
+        reporter._last_full_timestamp = 0.0
+        reporter.report_orders([], [])
+        wait_until(lambda: len(session.requests) == 2)
+
+        # then
+        assert session.requests[1]['type'] == 'full'
+
+    def test_should_send_full_snapshot_after_unacknowledged_report(self):
+        # given
+        reporter, session = self.create_reporter(full_every=3600)
+        reporter.report_orders([], [])
+        wait_until(lambda: len(session.requests) == 1)
+
+        # when
+        session.status_code = 400
+        reporter.report_orders([FakeOrder(Wad.from_number(1), Wad.from_number(100))], [])
+        time.sleep(0.1)
+        session.status_code = 200
+        reporter.report_orders([FakeOrder(Wad.from_number(1), Wad.from_number(100))], [])
+        wait_until(lambda: len(session.requests) == 2)
+
+        # then
+        assert session.requests[1]['type'] == 'full'
+        assert len(session.requests[1]['orders']) == 1
+
+
+class TestCreateOrderHistoryReporter:
+    def test_should_honour_order_history_every(self):
+        # given
+        arguments = argparse.Namespace(order_history="http://localhost:8080/orders", order_history_every=7)
+
+        # when
+        reporter = create_order_history_reporter(arguments)
+
+        # then
+        assert reporter.frequency == 7
+        assert reporter.full_every == 0
+
+    def test_should_not_create_reporter_without_endpoint(self):
+        # expect
+        assert create_order_history_reporter(argparse.Namespace(order_history=None, order_history_every=30)) is None
@@ -15,13 +15,17 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import argparse
+import threading
 import time
 from typing import Optional
 from typing import Tuple
 
 from market_maker_keeper.feed import Feed
+from market_maker_keeper.setzer import Setzer, SetzerWorker
 from market_maker_keeper.price_feed import PriceFeed, BackupPriceFeed, AveragePriceFeed, Price, WebSocketPriceFeed, \
-    ReversePriceFeed
+    ReversePriceFeed, CachedPriceFeed, BlockCachedPriceFeed, SetzerPriceFeed, AggregatedPriceFeed, \
+    PriceFeedFactory
 from pymaker.numeric import Wad
 
 
@@ -45,6 +49,77 @@ class FakePriceFeed(PriceFeed):
         self.price = price
 
 
+class BlockingPriceFeed(PriceFeed):
+    def __init__(self, price: Wad):
+        self.price = price
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+
+    def get_price(self) -> Price:
+        self.unblocked.wait()
+        return Price(buy_price=self.price, sell_price=self.price)
+
+    def block(self):
+        self.unblocked.clear()
+
+    def unblock(self):
+        self.unblocked.set()
+
+
+class CountingPriceFeed(FakePriceFeed):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def get_price(self) -> Price:
+        self.calls += 1
+        return super().get_price()
+
+
+class FakeBlockFilter:
+    def __init__(self):
+        self.new_entries = []
+
+    def get_new_entries(self):
+        result, self.new_entries = self.new_entries, []
+        return result
+
+
+class FakeWeb3:
+    def __init__(self, block_filter: FakeBlockFilter):
+        class FakeEth:
+            def filter(self, filter_params):
+                assert(filter_params == 'latest')
+                return block_filter
+
+        self.eth = FakeEth()
+
+
+class FakeSetzer(Setzer):
+    def __init__(self, prices: dict):
+        super().__init__()
+        self.prices = prices
+
+    def price(self, source: str) -> Wad:
+        return self.prices[source]
+
+
+class FailingPriceFeed(PriceFeed):
+    def get_price(self) -> Price:
+        raise Exception("Price feed unavailable")
+
+
+def close_to(price: Optional[Wad], expected: Wad) -> bool:
+    # aggregated means depend slightly on the age of each of the prices
+    return price is not None and abs(price - expected) < Wad.from_number(0.001)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
 class TestWebSocketPriceFeed:
     def test_should_handle_no_price(self):
         # when
@@ -223,3 +298,305 @@ class TestBackupPriceFeed:
         # then
         assert backup_price_feed.get_price().buy_price is None
         assert backup_price_feed.get_price().sell_price is None
+
+
+class TestCachedPriceFeed:
+    def test_should_serve_latest_price_of_underlying_feed(self):
+        # given
+        price_feed = FakePriceFeed()
+        price_feed.set_price(Wad.from_number(10))
+
+        # when
+        cached_price_feed = CachedPriceFeed(price_feed, refresh_interval=0.01, expiry=60)
+
+        # then
+        wait_for(lambda: cached_price_feed.get_price().buy_price is not None)
+        assert cached_price_feed.get_price().buy_price == Wad.from_number(10)
+        assert cached_price_feed.get_price().sell_price == Wad.from_number(10)
+
+        # when
+        price_feed.set_price(Wad.from_number(20))
+
+        # then
+        wait_for(lambda: cached_price_feed.get_price().buy_price == Wad.from_number(20))
+        assert cached_price_feed.get_price().buy_price == Wad.from_number(20)
+        assert cached_price_feed.get_price().sell_price == Wad.from_number(20)
+
+    def test_should_expire_if_underlying_feed_keeps_failing(self):
+        # when
+        cached_price_feed = CachedPriceFeed(FailingPriceFeed(), refresh_interval=0.01, expiry=0)
+        time.sleep(0.05)
+
+        # then
+        assert cached_price_feed.get_price().buy_price is None
+        assert cached_price_feed.get_price().sell_price is None
+
+    def test_can_be_used_in_backup_price_feed(self):
+        # given
+        price_feed_1 = FakePriceFeed()
+        price_feed_2 = FakePriceFeed()
+        cached_price_feed_1 = CachedPriceFeed(price_feed_1, refresh_interval=0.01, expiry=60)
+        cached_price_feed_2 = CachedPriceFeed(price_feed_2, refresh_interval=0.01, expiry=60)
+        backup_price_feed = BackupPriceFeed([cached_price_feed_1, cached_price_feed_2])
+
+        # when
+        price_feed_2.set_price(Wad.from_number(20))
+
+        # then
+        wait_for(lambda: backup_price_feed.get_price().buy_price is not None)
+        assert backup_price_feed.get_price().buy_price == Wad.from_number(20)
+
+
+class TestBlockCachedPriceFeed:
+    def test_should_only_refresh_on_new_blocks(self):
+        # given
+        block_filter = FakeBlockFilter()
+        price_feed = CountingPriceFeed()
+        price_feed.set_price(Wad.from_number(10))
+
+        # when
+        cached_price_feed = BlockCachedPriceFeed(price_feed, web3=FakeWeb3(block_filter), ttl=3600, expiry=3600, poll_interval=0.01)
+
+        # then
+        wait_for(lambda: cached_price_feed.get_price().buy_price is not None)
+        assert cached_price_feed.get_price().buy_price == Wad.from_number(10)
+
+        # when
+        price_feed.set_price(Wad.from_number(20))
+        time.sleep(0.1)
+
+        # then
+        assert price_feed.calls == 1
+        assert cached_price_feed.get_price().buy_price == Wad.from_number(10)
+
+        # when
+        block_filter.new_entries = ['0x01']
+
+        # then
+        wait_for(lambda: cached_price_feed.get_price().buy_price == Wad.from_number(20))
+        assert cached_price_feed.get_price().buy_price == Wad.from_number(20)
+        assert price_feed.calls == 2
+
+    def test_should_refresh_after_ttl_even_if_no_new_blocks(self):
+        # given
+        price_feed = CountingPriceFeed()
+        price_feed.set_price(Wad.from_number(10))
+        cached_price_feed = BlockCachedPriceFeed(price_feed, web3=FakeWeb3(FakeBlockFilter()), ttl=0, expiry=3600, poll_interval=0.01)
+
+        # when
+        price_feed.set_price(Wad.from_number(20))
+
+        # then
+        wait_for(lambda: cached_price_feed.get_price().buy_price == Wad.from_number(20))
+        assert cached_price_feed.get_price().buy_price == Wad.from_number(20)
+
+
+class TestSetzerPriceFeed:
+    def test_should_fetch_all_sources_in_one_worker(self):
+        # given
+        worker = SetzerWorker(interval=3600, jitter=0, setzer=FakeSetzer({'source1': Wad.from_number(100),
+                                                                          'source2': Wad.from_number(200)}))
+
+        # when
+        price_feed_1 = SetzerPriceFeed('source1', expiry=60, worker=worker)
+        price_feed_2 = SetzerPriceFeed('source2', expiry=60, worker=worker)
+
+        # then
+        wait_for(lambda: price_feed_2.get_price().buy_price is not None)
+        assert price_feed_1.get_price().buy_price == Wad.from_number(100)
+        assert price_feed_1.get_price().sell_price == Wad.from_number(100)
+        assert price_feed_2.get_price().buy_price == Wad.from_number(200)
+        assert price_feed_2.get_price().sell_price == Wad.from_number(200)
+
+    def test_should_expire_if_source_unavailable(self):
+        # given
+        worker = SetzerWorker(interval=3600, jitter=0, setzer=FakeSetzer({}))
+
+        # when
+        price_feed = SetzerPriceFeed('source1', expiry=60, worker=worker)
+        time.sleep(0.05)
+
+        # then
+        assert price_feed.get_price().buy_price is None
+        assert price_feed.get_price().sell_price is None
+
+
+class TestAggregatedPriceFeed:
+    @staticmethod
+    def price_feeds(*prices) -> list:
+        result = []
+        for price in prices:
+            price_feed = FakePriceFeed()
+            price_feed.set_price(Wad.from_number(price) if price is not None else None)
+            result.append(price_feed)
+
+        return result
+
+    def test_no_values(self):
+        # given
+        aggregated_price_feed = AggregatedPriceFeed(self.price_feeds(None, None), 'median', 0.05, expiry=60, refresh_interval=0.01)
+        time.sleep(0.05)
+
+        # expect
+        assert aggregated_price_feed.get_price().buy_price is None
+        assert aggregated_price_feed.get_price().sell_price is None
+
+    def test_median(self):
+        # given
+        aggregated_price_feed = AggregatedPriceFeed(self.price_feeds(100, 101, 103), 'median', 0.05, expiry=60, refresh_interval=0.01)
+
+        # expect
+        wait_for(lambda: aggregated_price_feed.get_price().buy_price is not None)
+        assert aggregated_price_feed.get_price().buy_price == Wad.from_number(101)
+        assert aggregated_price_feed.get_price().sell_price == Wad.from_number(101)
+
+    def test_trimmed_mean_should_reject_outliers(self):
+        # given
+        aggregated_price_feed = AggregatedPriceFeed(self.price_feeds(100, 102, 150), 'trimmed-mean', 0.05, expiry=60, refresh_interval=0.01)
+
+        # expect
+        wait_for(lambda: close_to(aggregated_price_feed.get_price().buy_price, Wad.from_number(101)))
+        assert close_to(aggregated_price_feed.get_price().buy_price, Wad.from_number(101))
+        assert close_to(aggregated_price_feed.get_price().sell_price, Wad.from_number(101))
+
+    def test_vwap_should_weight_by_volume(self):
+        # given
+        aggregated_price_feed = AggregatedPriceFeed(self.price_feeds(100, 104), 'vwap', 0.05, expiry=60,
+                                                    volumes=[3.0, 1.0], refresh_interval=0.01)
+
+        # expect
+        wait_for(lambda: close_to(aggregated_price_feed.get_price().buy_price, Wad.from_number(101)))
+        assert close_to(aggregated_price_feed.get_price().buy_price, Wad.from_number(101))
+        assert close_to(aggregated_price_feed.get_price().sell_price, Wad.from_number(101))
+
+    def test_should_follow_price_updates(self):
+        # given
+        price_feeds = self.price_feeds(100, 100)
+        aggregated_price_feed = AggregatedPriceFeed(price_feeds, 'trimmed-mean', 0.05, expiry=60, refresh_interval=0.01)
+        wait_for(lambda: aggregated_price_feed.get_price().buy_price is not None)
+
+        # when
+        price_feeds[0].set_price(Wad.from_number(102))
+        price_feeds[1].set_price(Wad.from_number(102))
+
+        # then
+        wait_for(lambda: aggregated_price_feed.get_price().buy_price == Wad.from_number(102))
+        assert aggregated_price_feed.get_price().buy_price == Wad.from_number(102)
+
+    def test_should_forget_prices_of_blocked_price_feeds_after_expiry(self):
+        # given
+        price_feeds = self.price_feeds(100)
+        blocking_price_feed = BlockingPriceFeed(Wad.from_number(104))
+        aggregated_price_feed = AggregatedPriceFeed(price_feeds + [blocking_price_feed], 'trimmed-mean', 0.05, expiry=1, refresh_interval=0.01)
+        wait_for(lambda: aggregated_price_feed.get_price().buy_price is not None
+                         and aggregated_price_feed.get_price().buy_price > Wad.from_number(101))
+
+        # when
+        blocking_price_feed.block()
+
+        # then
+        wait_for(lambda: aggregated_price_feed.get_price().buy_price == Wad.from_number(100))
+        assert aggregated_price_feed.get_price().buy_price == Wad.from_number(100)
+        blocking_price_feed.unblock()
+
+    def test_should_decrease_weight_of_prices_with_their_age(self):
+        # given
+        aggregated_price_feed = AggregatedPriceFeed(self.price_feeds(None, None, None, None), 'trimmed-mean', 0.05, expiry=10, refresh_interval=60)
+
+        # when
+        weighted_prices = aggregated_price_feed._weighted_prices([(Wad.from_number(100), 1000.0),
+                                                                  (Wad.from_number(101), 995.0),
+                                                                  (Wad.from_number(102), 990.0),
+                                                                  (None, 0.0)], 1000.0)
+
+        # then
+        assert weighted_prices == [(Wad.from_number(100), 1.0), (Wad.from_number(101), 0.5)]
+
+    def test_should_drop_price_as_soon_as_price_feed_stops_returning_it(self):
+        # given
+        price_feeds = self.price_feeds(100, 104)
+        aggregated_price_feed = AggregatedPriceFeed(price_feeds, 'trimmed-mean', 0.05, expiry=60, refresh_interval=0.01)
+        wait_for(lambda: close_to(aggregated_price_feed.get_price().buy_price, Wad.from_number(102)))
+
+        # when
+        price_feeds[1].set_price(None)
+
+        # then
+        wait_for(lambda: aggregated_price_feed.get_price().buy_price == Wad.from_number(100))
+        assert aggregated_price_feed.get_price().buy_price == Wad.from_number(100)
+
+        # when
+        price_feeds[0].set_price(None)
+
+        # then
+        wait_for(lambda: aggregated_price_feed.get_price().buy_price is None)
+        assert aggregated_price_feed.get_price().buy_price is None
+
+    def test_should_be_created_by_factory(self):
+        # when
+        price_feed = PriceFeedFactory._create_price_feed("vwap(0.1):fixed:100*3|fixed:104", 60, None)
+
+        # then
+        assert isinstance(price_feed, AggregatedPriceFeed)
+        assert price_feed.method == 'vwap'
+        assert price_feed.max_deviation == 0.1
+        assert price_feed.volumes == [3.0, 1.0]
+        assert len(price_feed.feeds) == 2
+
+
+class TestPriceFeedFactory:
+    def test_should_pass_setzer_arguments_to_the_shared_worker(self):
+        # given
+        default_worker = SetzerPriceFeed._default_worker
+        SetzerPriceFeed._default_worker = SetzerWorker(interval=60, jitter=5.0, setzer=FakeSetzer({}))
+        arguments = argparse.Namespace(price_feed="fixed:240", price_feed_expiry=60, setzer_interval=15, setzer_jitter=0.5)
+
+        try:
+            # when
+            PriceFeedFactory.create_price_feed(arguments)
+
+            # then
+            assert SetzerPriceFeed._default_worker.interval == 15
+            assert SetzerPriceFeed._default_worker.jitter == 0.5
+
+        finally:
+            SetzerPriceFeed._default_worker = default_worker
+            SetzerPriceFeed.configure_default_worker(interval=60, jitter=5.0)
+
+    def test_should_share_identical_price_feeds(self):
+        # when
+        price_feed_1 = PriceFeedFactory._create_price_feed("fixed:250", 60, None)
+        price_feed_2 = PriceFeedFactory._create_price_feed("fixed:250", 60, None)
+        price_feed_3 = PriceFeedFactory._create_price_feed("fixed:250", 120, None)
+
+        # then
+        assert price_feed_1 is price_feed_2
+        assert price_feed_1 is not price_feed_3
+
+    def test_should_share_price_feeds_underlying_aggregated_ones(self):
+        # when
+        price_feed = PriceFeedFactory._create_price_feed("fixed:260", 60, None)
+        aggregated_price_feed = PriceFeedFactory._create_price_feed("median:fixed:260|fixed:270", 60, None)
+
+        # then
+        assert aggregated_price_feed.feeds[0] is price_feed
+
+    def test_should_create_price_feed_only_once_when_requested_concurrently(self):
+        # given
+        barrier = threading.Barrier(10)
+        price_feeds = []
+
+        def create_price_feed():
+            barrier.wait()
+            price_feeds.append(PriceFeedFactory._create_price_feed("fixed:280", 60, None))
+
+        # when
+        threads = [threading.Thread(target=create_price_feed) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # then
+        assert len(price_feeds) == 10
+        assert all(price_feed is price_feeds[0] for price_feed in price_feeds)
@@ -0,0 +1,90 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from web3 import Web3
+
+from market_maker_keeper.state_reader import StateReader, StateCall
+from pymaker import Address
+from pymaker.deployment import Deployment
+from pymaker.numeric import Wad
+from pymaker.token import DSToken
+from pymaker.util import eth_balance
+
+
+class TestStateReader:
+    def test_should_read_balances_and_contract_state_in_one_batch(self, deployment: Deployment):
+        # given
+        DSToken(web3=deployment.web3, address=deployment.tub.sai()).mint(Wad.from_number(1000)).transact()
+        state_reader = StateReader(web3=deployment.web3)
+
+        # when
+        state = state_reader.read({'is_closed': StateCall.call(deployment.otc.address, 'isClosed()', 'bool'),
+                                   'eth_balance': StateCall.eth_balance(deployment.our_address),
+                                   'sai_balance': StateCall.balance_of(deployment.sai.address, deployment.our_address),
+                                   'gem_balance': StateCall.balance_of(deployment.gem.address, deployment.our_address)})
+
+        # then
+        assert state['is_closed'] == deployment.otc.is_closed()
+        assert state['eth_balance'] == eth_balance(deployment.web3, deployment.our_address)
+        assert state['sai_balance'] == deployment.sai.balance_of(deployment.our_address)
+        assert state['gem_balance'] == deployment.gem.balance_of(deployment.our_address)
+        assert state.block_number == deployment.web3.eth.blockNumber
+
+    def test_should_read_values_from_the_current_block(self, deployment: Deployment):
+        # given
+        state_reader = StateReader(web3=deployment.web3)
+        first_state = state_reader.read({'sai_balance': StateCall.balance_of(deployment.sai.address, deployment.our_address)})
+
+        # and
+        DSToken(web3=deployment.web3, address=deployment.tub.sai()).mint(Wad.from_number(1000)).transact()
+
+        # when
+        second_state = state_reader.read({'sai_balance': StateCall.balance_of(deployment.sai.address, deployment.our_address)})
+
+        # then
+        assert second_state.block_number == deployment.web3.eth.blockNumber
+        assert second_state.block_number > first_state.block_number
+        assert second_state['sai_balance'] == deployment.sai.balance_of(deployment.our_address)
+        assert second_state['sai_balance'] == first_state['sai_balance'] + Wad.from_number(1000)
+
+
+class TestMulticallCalldata:
+    def test_should_encode_aggregate_call(self):
+        # given
+        owner = Address('0x' + '22' * 20)
+        entries = [('0x' + '11' * 20, StateCall.balance_of(Address('0x' + '11' * 20), owner).calldata()),
+                   ('0x' + '33' * 20, StateCall(Address('0x' + '33' * 20), 'getEthBalance(address)', [owner], 'uint256').calldata())]
+
+        # when
+        calldata = StateReader._aggregate_calldata(entries)
+
+        # then
+        assert Web3.toHex(calldata) == '0x252dba42' \
+                                       '0000000000000000000000000000000000000000000000000000000000000020' \
+                                       '0000000000000000000000000000000000000000000000000000000000000002' \
+                                       '0000000000000000000000000000000000000000000000000000000000000040' \
+                                       '00000000000000000000000000000000000000000000000000000000000000e0' \
+                                       '0000000000000000000000001111111111111111111111111111111111111111' \
+                                       '0000000000000000000000000000000000000000000000000000000000000040' \
+                                       '0000000000000000000000000000000000000000000000000000000000000024' \
+                                       '70a0823100000000000000000000000022222222222222222222222222222222' \
+                                       '2222222200000000000000000000000000000000000000000000000000000000' \
+                                       '0000000000000000000000003333333333333333333333333333333333333333' \
+                                       '0000000000000000000000000000000000000000000000000000000000000040' \
+                                       '0000000000000000000000000000000000000000000000000000000000000024' \
+                                       '4d2301cc00000000000000000000000022222222222222222222222222222222' \
+                                       '2222222200000000000000000000000000000000000000000000000000000000'
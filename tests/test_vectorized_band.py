@@ -0,0 +1,154 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import random
+
+import pytest
+
+from market_maker_keeper.band import Bands, BuyBand, SellBand, VectorizedBands
+from market_maker_keeper.feed import EmptyFeed, FixedFeed
+from market_maker_keeper.limit import History, SideLimits
+from market_maker_keeper.price_feed import Price
+from market_maker_keeper.reloadable_config import ReloadableConfig
+from pymaker.numeric import Wad
+
+numpy = pytest.importorskip('numpy')
+
+
+class FakeOrder:
+    def __init__(self, order_id: int, amount: Wad, price: Wad):
+        self.order_id = order_id
+        self.amount = amount
+        self.price = price
+
+    @property
+    def sell_to_buy_price(self) -> Wad:
+        return self.price
+
+    @property
+    def buy_to_sell_price(self) -> Wad:
+        return self.price
+
+    @property
+    def remaining_sell_amount(self) -> Wad:
+        return self.amount
+
+
+def random_band_configs(rand: random.Random, amount: float) -> list:
+    """Adjacent bands, sometimes with gaps in between, in random order."""
+    configs = []
+    margin = rand.choice([0.0, 0.005])
+    for _ in range(rand.randint(1, 60)):
+        width = rand.choice([0.001, 0.0025, 0.01])
+        min_amount = rand.choice([0.0, amount * 0.1, amount])
+        configs.append({'minMargin': round(margin, 6),
+                        'avgMargin': round(margin + width / 2, 6),
+                        'maxMargin': round(margin + width, 6),
+                        'minAmount': min_amount,
+                        'avgAmount': min_amount * 2,
+                        'maxAmount': min_amount * 3 + rand.choice([0.0, amount]),
+                        'dustCutoff': rand.choice([0.0, amount * 0.01])})
+        margin += width + rand.choice([0.0, 0.0, 0.002])
+
+    rand.shuffle(configs)
+    return configs
+
+
+def random_orders(rand: random.Random, target_price: Wad, is_sell: bool, max_margin: float, amount: float) -> list:
+    def price():
+        # some orders sit exactly on band boundaries
+        margin = rand.choice([rand.uniform(-0.01, max_margin + 0.01), round(rand.uniform(0, max_margin), 3)])
+        return target_price * Wad.from_number(1 + margin if is_sell else 1 - margin)
+
+    return [FakeOrder(order_id, Wad.from_number(round(rand.uniform(0.0001, 1.0) * amount, 8)), price())
+            for order_id in range(rand.randint(0, 400))]
+
+
+def both_bands(buy_bands: list, sell_bands: list):
+    history = History()
+    return Bands(buy_bands, SideLimits([], history.buy_history), sell_bands, SideLimits([], history.sell_history)), \
+           VectorizedBands(buy_bands, SideLimits([], history.buy_history), sell_bands, SideLimits([], history.sell_history))
+
+
+def describe(new_orders: list) -> list:
+    return [(order.is_sell, order.price, order.amount, order.pay_amount, order.buy_amount, id(order.band)) for order in new_orders]
+
+
+class TestVectorizedBands:
+    @pytest.mark.parametrize('seed', range(100))
+    def test_should_produce_the_same_results_as_the_reference_implementation(self, seed):
+        # given
+        rand = random.Random(seed)
+        buy_bands = list(map(BuyBand, random_band_configs(rand, 50.0)))
+        sell_bands = list(map(SellBand, random_band_configs(rand, 0.5)))
+        reference, vectorized = both_bands(buy_bands, sell_bands)
+
+        # and
+        buy_price = Wad.from_number(rand.choice([0.0035, 99.5, 12345.678]))
+        sell_price = buy_price * Wad.from_number(1.01)
+        max_buy_margin = max(band.max_margin for band in buy_bands)
+        max_sell_margin = max(band.max_margin for band in sell_bands)
+        buy_orders = random_orders(rand, buy_price, False, max_buy_margin, 50.0)
+        sell_orders = random_orders(rand, sell_price, True, max_sell_margin, 0.5)
+
+        # and
+        buy_balance = Wad.from_number(rand.choice([0, 10, 1000000]))
+        sell_balance = Wad.from_number(rand.choice([0, 0.1, 1000000]))
+
+        for price in [Price(buy_price=buy_price, sell_price=sell_price),
+                      Price(buy_price=buy_price, sell_price=None),
+                      Price(buy_price=None, sell_price=sell_price)]:
+            # when
+            cancellable_orders = vectorized.cancellable_orders(buy_orders, sell_orders, price)
+            new_orders, missing_buy_amount, missing_sell_amount = vectorized.new_orders(buy_orders, sell_orders, buy_balance, sell_balance, price)
+
+            # then
+            expected_new_orders, expected_missing_buy_amount, expected_missing_sell_amount = reference.new_orders(buy_orders, sell_orders, buy_balance, sell_balance, price)
+            assert([id(order) for order in cancellable_orders] == [id(order) for order in reference.cancellable_orders(buy_orders, sell_orders, price)])
+            assert(describe(new_orders) == describe(expected_new_orders))
+            assert(missing_buy_amount == expected_missing_buy_amount)
+            assert(missing_sell_amount == expected_missing_sell_amount)
+
+    def test_should_sum_amounts_exactly(self):
+        # given
+        band = BuyBand({'minMargin': 0.0, 'avgMargin': 0.01, 'maxMargin': 0.02,
+                        'minAmount': 0.0, 'avgAmount': 0.0, 'maxAmount': 0.0, 'dustCutoff': 0.0})
+        orders = [FakeOrder(1, Wad(2**200 + 1), Wad.from_number(99.5)),
+                  FakeOrder(2, Wad(2**60 - 1), Wad.from_number(99.5)),
+                  FakeOrder(3, Wad(1), Wad.from_number(99))]
+
+        # when
+        vectorized = both_bands([band], [])[1]
+
+        # then
+        assert(vectorized._band_totals(orders, [band], Wad.from_number(100)) == [Wad(2**200 + 2**60 + 1)])
+
+    def test_should_be_enabled_in_the_config_file(self, tmpdir):
+        # given
+        file = tmpdir.join("vectorized_config.json")
+        file.write(json.dumps({"vectorized": True,
+                               "buyBands": [{"minMargin": 0.02, "avgMargin": 0.04, "maxMargin": 0.06,
+                                             "minAmount": 50.0, "avgAmount": 75.0, "maxAmount": 100.0, "dustCutoff": 0.0}],
+                               "sellBands": []}))
+
+        # when
+        bands = Bands.read(ReloadableConfig(str(file)), EmptyFeed(), FixedFeed({'canBuy': True, 'canSell': True}), History())
+
+        # then
+        assert(isinstance(bands, VectorizedBands))
+        assert(len(bands.buy_bands) == 1)
@@ -0,0 +1,186 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from market_maker_keeper.state_reader import StateReader, State
+from market_maker_keeper.zrx_exchange import BatchedFillStatus, BatchedZrxExchangeV2
+from pymaker import Address
+from pymaker.numeric import Wad
+
+
+class FakeOrder:
+    def __init__(self, order_hash: str, buy_amount: Wad):
+        self.order_hash = order_hash
+        self.buy_amount = buy_amount
+
+
+class FakeOrderV2:
+    def __init__(self, pay_amount: Wad, buy_amount: Wad, expiration: int, salt: int):
+        self.maker = Address('0x0000000000000000000000000000000000000001')
+        self.sender = Address('0x0000000000000000000000000000000000000000')
+        self.pay_amount = pay_amount
+        self.buy_amount = buy_amount
+        self.expiration = expiration
+        self.salt = salt
+
+
+class FakeStateReader(StateReader):
+    def __init__(self, unavailable_amounts: dict):
+        self.unavailable_amounts = unavailable_amounts
+        self.reads = []
+
+    def read(self, calls: dict) -> State:
+        self.reads.append(calls)
+        return State(block_number=1, values={key: self.unavailable_amounts[call] for key, call in calls.items()})
+
+
+class FakeExchange:
+    def __init__(self):
+        self.calls = 0
+        self.hash_calls = 0
+
+    def get_order_hash(self, order) -> str:
+        self.hash_calls += 1
+        return order.order_hash
+
+    def get_unavailable_buy_amount(self, order) -> Wad:
+        self.calls += 1
+        return Wad(0)
+
+
+class FakeBatchedExchange(BatchedFillStatus, FakeExchange):
+    def __init__(self, state_reader: StateReader):
+        super().__init__()
+        self._init_fill_status(state_reader)
+
+    def _fill_status_calls(self, order, order_hash: bytes) -> dict:
+        return {'unavailable': order_hash}
+
+    def _unavailable_buy_amount_from(self, state, order) -> Wad:
+        return state['unavailable']
+
+
+class TestBatchedFillStatus:
+    def test_should_check_all_orders_in_one_batch(self):
+        # given
+        order_1 = FakeOrder('0x01', Wad.from_number(10))
+        order_2 = FakeOrder('0x02', Wad.from_number(10))
+        state_reader = FakeStateReader({b'\x01': Wad.from_number(3), b'\x02': Wad.from_number(0)})
+        exchange = FakeBatchedExchange(state_reader)
+
+        # when
+        exchange.refresh_unavailable_buy_amounts([order_1, order_2])
+
+        # then
+        assert len(state_reader.reads) == 1
+        assert exchange.get_unavailable_buy_amount(order_1) == Wad.from_number(3)
+        assert exchange.get_unavailable_buy_amount(order_2) == Wad.from_number(0)
+        assert exchange.calls == 0
+
+    def test_should_never_query_unavailable_orders_again(self):
+        # given
+        order_1 = FakeOrder('0x01', Wad.from_number(10))
+        order_2 = FakeOrder('0x02', Wad.from_number(10))
+        state_reader = FakeStateReader({b'\x01': Wad.from_number(10), b'\x02': Wad.from_number(0)})
+        exchange = FakeBatchedExchange(state_reader)
+
+        # when
+        exchange.refresh_unavailable_buy_amounts([order_1, order_2])
+        exchange.refresh_unavailable_buy_amounts([order_1, order_2])
+
+        # then
+        assert len(state_reader.reads) == 2
+        assert list(state_reader.reads[1].values()) == [b'\x02']
+        assert exchange.get_unavailable_buy_amount(order_1) == Wad.from_number(10)
+
+    def test_should_fall_back_to_exchange_for_unknown_orders(self):
+        # given
+        exchange = FakeBatchedExchange(FakeStateReader({}))
+
+        # when
+        exchange.refresh_unavailable_buy_amounts([])
+
+        # then
+        assert exchange.get_unavailable_buy_amount(FakeOrder('0x03', Wad.from_number(10))) == Wad(0)
+        assert exchange.calls == 1
+
+    def test_should_calculate_each_order_hash_only_once(self):
+        # given
+        order_1 = FakeOrder('0x01', Wad.from_number(10))
+        order_2 = FakeOrder('0x02', Wad.from_number(10))
+        exchange = FakeBatchedExchange(FakeStateReader({b'\x01': Wad.from_number(3), b'\x02': Wad.from_number(0)}))
+
+        # when
+        assert exchange.get_order_hash(order_1) == '0x01'
+        exchange.refresh_unavailable_buy_amounts([order_1, order_2])
+        exchange.refresh_unavailable_buy_amounts([order_1, order_2])
+
+        # then
+        assert exchange.get_order_hash(order_1) == '0x01'
+        assert exchange.get_order_hash(order_2) == '0x02'
+        assert exchange.hash_calls == 2
+
+    def test_should_forget_unavailable_orders_no_longer_tracked(self):
+        # given
+        order_1 = FakeOrder('0x01', Wad.from_number(10))
+        order_2 = FakeOrder('0x02', Wad.from_number(10))
+        exchange = FakeBatchedExchange(FakeStateReader({b'\x01': Wad.from_number(10), b'\x02': Wad.from_number(10)}))
+        exchange.refresh_unavailable_buy_amounts([order_1, order_2])
+
+        # when
+        exchange.refresh_unavailable_buy_amounts([order_2])
+
+        # then
+        assert exchange._unavailable_order_hashes == {b'\x02'}
+
+
+class TestBatchedZrxExchangeV2:
+    def setup_method(self):
+        self.exchange = BatchedZrxExchangeV2.__new__(BatchedZrxExchangeV2)
+        self.order = FakeOrderV2(pay_amount=Wad.from_number(5),
+                                 buy_amount=Wad.from_number(10),
+                                 expiration=int(time.time()) + 3600,
+                                 salt=100)
+
+    @staticmethod
+    def state(filled: Wad = Wad(0), cancelled: bool = False, epoch: Wad = Wad(0)) -> dict:
+        return {'filled': filled, 'cancelled': cancelled, 'epoch': epoch}
+
+    def test_should_return_filled_amount_of_fillable_orders(self):
+        assert self.exchange._unavailable_buy_amount_from(self.state(filled=Wad.from_number(3)), self.order) == Wad.from_number(3)
+
+    def test_should_treat_cancelled_orders_as_unavailable(self):
+        assert self.exchange._unavailable_buy_amount_from(self.state(cancelled=True), self.order) == Wad.from_number(10)
+
+    def test_should_treat_orders_cancelled_up_to_order_epoch_as_unavailable(self):
+        assert self.exchange._unavailable_buy_amount_from(self.state(epoch=Wad(101)), self.order) == Wad.from_number(10)
+        assert self.exchange._unavailable_buy_amount_from(self.state(epoch=Wad(100)), self.order) == Wad(0)
+
+    def test_should_treat_expired_orders_as_unavailable(self):
+        # given
+        self.order.expiration = int(time.time()) - 1
+
+        # expect
+        assert self.exchange._unavailable_buy_amount_from(self.state(filled=Wad.from_number(3)), self.order) == Wad.from_number(10)
+
+    def test_should_treat_invalid_orders_as_unavailable(self):
+        # given
+        self.order.pay_amount = Wad(0)
+
+        # expect
+        assert self.exchange._unavailable_buy_amount_from(self.state(), self.order) == Wad.from_number(10)
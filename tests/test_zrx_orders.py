@@ -0,0 +1,161 @@
+# This file is part of Maker Keeper Framework.
+#
+# Copyright (C) 2017-2018 reverendus
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from market_maker_keeper.zrx_orders import ZrxOrderStore, ZrxRelayerOrderSync
+from pymaker import Address
+
+
+class FakeOrder:
+    def __init__(self, order_hash: str):
+        self.order_hash = order_hash
+
+    @staticmethod
+    def from_json(exchange, data: dict):
+        return FakeOrder(data['orderHash'])
+
+    def to_json(self) -> dict:
+        return {'orderHash': self.order_hash}
+
+
+class FakeExchange:
+    address = Address('0x0000000000000000000000000000000000000001')
+
+    def get_order_hash(self, order) -> str:
+        return order.order_hash
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, data=None, etag=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = ''
+        self.headers = {'ETag': etag} if etag is not None else {}
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.requests = []
+
+    def get(self, url: str, headers: dict, timeout: float):
+        page = int(url.split('&page=')[1].split('&')[0])
+        etag, orders = self.pages.get(page, ('empty', []))
+        self.requests.append((page, headers))
+
+        if headers.get('If-None-Match') == etag:
+            return FakeResponse(304)
+
+        return FakeResponse(200, [order.to_json() for order in orders], etag)
+
+
+class FakeOrderSync(ZrxRelayerOrderSync):
+    def _parse(self, data) -> list:
+        return list(map(lambda item: FakeOrder.from_json(self.exchange, item), data))
+
+
+class TestZrxOrderStore:
+    def test_should_index_orders_by_hash(self):
+        # given
+        store = ZrxOrderStore(FakeExchange(), FakeOrder)
+
+        # when
+        store.add(FakeOrder('0x01'))
+        store.add(FakeOrder('0x02'))
+        store.add(FakeOrder('0x01'))
+
+        # then
+        assert sorted(order.order_hash for order in store.orders()) == ['0x01', '0x02']
+        assert sorted(store.orders_by_hash().keys()) == ['0x01', '0x02']
+
+        # when
+        store.remove({'0x01', '0x03'})
+
+        # then
+        assert [order.order_hash for order in store.orders()] == ['0x02']
+
+    def test_should_persist_orders(self, tmpdir):
+        # given
+        filename = str(tmpdir.join('orders.json'))
+        store = ZrxOrderStore(FakeExchange(), FakeOrder, filename)
+
+        # when
+        store.add(FakeOrder('0x01'))
+        store.add(FakeOrder('0x02'))
+        store.remove({'0x02'})
+
+        # then
+        assert [order.order_hash for order in ZrxOrderStore(FakeExchange(), FakeOrder, filename).orders()] == ['0x01']
+
+    def test_should_start_empty_if_file_is_corrupted(self, tmpdir):
+        # given
+        file = tmpdir.join('orders.json')
+        file.write('{corrupted')
+
+        # expect
+        assert ZrxOrderStore(FakeExchange(), FakeOrder, str(file)).orders() == []
+
+
+class TestZrxRelayerOrderSync:
+    def orders(self, start: int, count: int) -> list:
+        return [FakeOrder(hex(number)) for number in range(start, start + count)]
+
+    def test_should_fetch_all_pages(self):
+        # given
+        sync = FakeOrderSync(FakeExchange(), 'http://relayer', Address('0x0000000000000000000000000000000000000002'), 2)
+        sync._session = FakeSession({1: ('a', self.orders(0, 2)), 2: ('b', self.orders(2, 2)), 3: ('c', self.orders(4, 1))})
+
+        # when
+        orders = sync.get_orders()
+
+        # then
+        assert [order.order_hash for order in orders] == [hex(number) for number in range(0, 5)]
+
+        # and
+        assert {order_hash: order.order_hash for order_hash, order in sync.get_orders_by_hash().items()} == \
+               {hex(number): hex(number) for number in range(0, 5)}
+
+    def test_should_reuse_unchanged_pages(self):
+        # given
+        session = FakeSession({1: ('a', self.orders(0, 2)), 2: ('b', self.orders(2, 1))})
+        sync = FakeOrderSync(FakeExchange(), 'http://relayer', Address('0x0000000000000000000000000000000000000002'), 2)
+        sync._session = session
+        sync.get_orders()
+
+        # when
+        session.pages[2] = ('c', [])
+        orders = sync.get_orders()
+
+        # then
+        assert session.requests[2:] == [(1, {'If-None-Match': 'a'}), (2, {'If-None-Match': 'b'})]
+        assert [order.order_hash for order in orders] == ['0x0', '0x1']
+
+    def test_should_stop_if_relayer_ignores_paging(self):
+        # given
+        session = FakeSession({})
+        session.get = lambda url, headers, timeout: FakeResponse(200, [order.to_json() for order in self.orders(0, 2)])
+        sync = FakeOrderSync(FakeExchange(), 'http://relayer', Address('0x0000000000000000000000000000000000000002'), 2)
+        sync._session = session
+
+        # when
+        orders = sync.get_orders()
+
+        # then
+        assert [order.order_hash for order in orders] == ['0x0', '0x1']